@@ -0,0 +1,414 @@
+"""
+大量の回答を取り込むための一括ロード
+受け付けた送信を gzip 圧縮した CSV としてローカルのステージングディレクトリに書き、
+サイズまたは時間でファイルを切り替えて、バッチごとにまとめてロードする
+（Snowflake では PUT + COPY INTO、ローカルのバックエンドでは複数行 INSERT）
+何度ロードしても失敗するバッチは quarantine/ に移し、後続のバッチのロードを止めない
+
+送信ごとにファイルを OS まで書き出し（プロセスが落ちても失われない）、確定時にデータファイルを
+fsync してからマニフェストを置く。起動時にマニフェストの無いバッチ（前回書き込み中だったもの）が
+あれば、読める行を新しいバッチとして確定し直す
+"""
+
+import csv
+import gzip
+import io
+import json
+import os
+import threading
+import time
+import uuid
+import zlib
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from writer import Submission
+
+DEFAULT_STAGING_DIR = Path(__file__).parent / "staging"
+MANIFEST_SUFFIX = ".json"
+QUARANTINE_DIR = "quarantine"  # ステージングディレクトリの下
+DATA_SUFFIX = ".csv.gz"
+QUESTIONS_SUFFIX = ".questions.jsonl"  # 書き込み中のバッチの問題（確定するとマニフェストに移る）
+
+
+def _fsync_path(path: Path) -> None:
+    """ファイル・ディレクトリを fsync"""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _read_complete_rows(path: Path) -> List[List[str]]:
+    """
+    gzip CSV の読める行を返す（途中で切れたファイルは最後の完全な行まで）
+    """
+    data = []
+    try:
+        with gzip.open(path, "rb") as f:
+            while True:
+                chunk = f.read1(1 << 16)  # 1回の読み込みごとに受け取り、切れた位置の手前までを残す
+                if not chunk:
+                    break
+                data.append(chunk)
+    except FileNotFoundError:
+        return []
+    except (EOFError, OSError, zlib.error):
+        pass  # 末尾が書き込み途中で切れている
+    text = b"".join(data).decode("utf-8", errors="ignore")
+    text = text[:text.rfind("\n") + 1]
+    return list(csv.reader(io.StringIO(text, newline="")))
+
+
+class _StagedBatch:
+    """書き込み中のバッチ（テーブルごとの gzip CSV と、含まれる問題）"""
+
+    def __init__(self, directory: Path, tables: List[str]):
+        self.batch_id = time.strftime("%Y%m%d%H%M%S") + "-" + uuid.uuid4().hex[:12]
+        self.opened_at = time.monotonic()
+        self.names = {table: f"{self.batch_id}.{table.lower()}{DATA_SUFFIX}" for table in tables}
+        self.files = {table: gzip.open(directory / name, "wt", encoding="utf-8", newline="")
+                      for table, name in self.names.items()}
+        self.questions_path = directory / f"{self.batch_id}{QUESTIONS_SUFFIX}"
+        self.questions_file = open(self.questions_path, "a", encoding="utf-8")
+        self.rows = {table: 0 for table in tables}
+        self.bytes = 0  # 圧縮前のおおよそのバイト数
+        self.questions: Dict[tuple, str] = {}  # (question_id, content_hash) -> 問題文
+        self.session_ids = set()  # 再送された送信を同じバッチに2回書かないため
+
+    def add_question(self, key: tuple, text: str) -> None:
+        if key in self.questions:
+            return
+        self.questions[key] = text
+        self.questions_file.write(json.dumps([*key, text], ensure_ascii=False) + "\n")
+        self.questions_file.flush()
+
+    def close(self) -> None:
+        for f in self.files.values():
+            f.close()
+        self.questions_file.close()
+
+
+class StagingWriter:
+    """
+    送信をステージングファイルに書き、一定サイズ・一定時間ごとにバッチとして確定する
+    確定したバッチはマニフェスト（バッチID.json）が置かれたもの
+
+    Args:
+        directory: ステージングディレクトリ
+        to_rows: 送信を {テーブル: 行のリスト} に変換する関数
+        question_key: 回答から (question_id, content_hash) を求める関数
+        tables: ステージングするテーブル（to_rows が返すキー）
+        max_bytes: この大きさ（圧縮前）を超えたらバッチを確定する
+        max_age: 最初の書き込みからこの秒数が経ったらバッチを確定する
+    """
+
+    def __init__(
+        self,
+        directory: Path,
+        to_rows: Callable[[Submission], Dict[str, List[tuple]]],
+        question_key: Callable[[Dict[str, Any]], tuple],
+        tables: List[str],
+        max_bytes: int = 64 * 1024 * 1024,
+        max_age: float = 60.0
+    ):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._to_rows = to_rows
+        self._question_key = question_key
+        self.tables = list(tables)
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._batch: Optional[_StagedBatch] = None
+        self._stats = {"staged": 0, "duplicates": 0, "batches": 0, "quarantined": 0, "recovered": 0}
+        self._recover_orphans()
+
+    def append(self, submission: Submission) -> bool:
+        """
+        送信をステージングファイルに追記（大きさが上限に達したらバッチを確定）
+        同じバッチに同じ session_id が既にあれば書かない（別のバッチとの重複はロード時に除く）
+
+        Returns:
+            bool: 書いた場合 True、同じバッチ内の重複で書かなかった場合 False
+        """
+        rows = self._to_rows(submission)
+        session, answers = submission
+        with self._lock:
+            if self._batch is None:
+                self._batch = _StagedBatch(self.directory, self.tables)
+            batch = self._batch
+            if session["session_id"] in batch.session_ids:
+                self._stats["duplicates"] += 1
+                return False
+            batch.session_ids.add(session["session_id"])
+            for answer in answers:
+                batch.add_question(self._question_key(answer), answer["question_text"])
+            self._write_rows(batch, rows)
+            self._stats["staged"] += 1
+            if batch.bytes >= self.max_bytes:
+                self._seal_locked()
+        return True
+
+    def _write_rows(self, batch: _StagedBatch, rows: Dict[str, List[tuple]]) -> None:
+        """
+        送信1件分の行を書いて OS まで書き出す
+        先頭のテーブル（セッション）は最後に書く: セッションの行があれば、その回答は書き終わっている
+        """
+        for table in self.tables[1:] + self.tables[:1]:
+            buffer = io.StringIO()
+            csv.writer(buffer).writerows(rows.get(table, []))
+            data = buffer.getvalue()
+            f = batch.files[table]
+            f.write(data)
+            f.flush()  # gzip の同期フラッシュ（途中で切れてもここまでは読める）
+            batch.rows[table] += len(rows.get(table, []))
+            batch.bytes += len(data)
+
+    def _recover_orphans(self) -> None:
+        """
+        マニフェストの無いバッチ（前回のプロセスが書き込み中に止まった）を確定し直す
+        読める行だけを新しいバッチに書き直し、元のファイルは削除する（回答だけ残ったセッションは捨てる）
+        """
+        sealed = {path.name[:-len(MANIFEST_SUFFIX)] for path in self.ready_batches()}
+        batch_ids = {path.name.split(".", 1)[0] for path in self.directory.glob(f"*{DATA_SUFFIX}")}
+        batch_ids |= {path.name.split(".", 1)[0] for path in self.directory.glob(f"*{QUESTIONS_SUFFIX}")}
+        for batch_id in sorted(batch_ids):
+            if batch_id in sealed:
+                # 確定後に消し損ねた問題ファイル
+                (self.directory / f"{batch_id}{QUESTIONS_SUFFIX}").unlink(missing_ok=True)
+                continue
+            rows = {
+                table: _read_complete_rows(self.directory / f"{batch_id}.{table.lower()}{DATA_SUFFIX}")
+                for table in self.tables
+            }
+            # 各テーブルの先頭列は session_id
+            session_rows = {row[0]: row for row in rows[self.tables[0]]}
+            if session_rows:
+                batch = self._batch = _StagedBatch(self.directory, self.tables)
+                batch.session_ids = set(session_rows)
+                try:
+                    with open(self.directory / f"{batch_id}{QUESTIONS_SUFFIX}", encoding="utf-8") as f:
+                        for line in f:
+                            try:
+                                question_id, digest, text = json.loads(line)
+                            except ValueError:
+                                continue  # 書き込み途中の行
+                            batch.add_question((question_id, digest), text)
+                except FileNotFoundError:
+                    pass
+                recovered = {self.tables[0]: list(session_rows.values())}
+                for table in self.tables[1:]:
+                    recovered[table] = [row for row in rows[table] if row[0] in session_rows]
+                self._write_rows(batch, recovered)
+                self._seal_locked()
+                self._stats["recovered"] += len(session_rows)
+            print(
+                f"[BULK] Recovered {len(session_rows)} sessions from unsealed batch {batch_id}"
+                if session_rows else f"[BULK] Removing unsealed batch {batch_id} with no complete sessions"
+            )
+            for path in self.directory.glob(f"{batch_id}.*"):
+                path.unlink()
+
+    def _seal_locked(self) -> Optional[Path]:
+        batch, self._batch = self._batch, None
+        if batch is None:
+            return None
+        batch.close()
+        # データファイルをディスクに書いてからマニフェストを置く
+        for name in batch.names.values():
+            _fsync_path(self.directory / name)
+        manifest = {
+            "batch_id": batch.batch_id,
+            "files": batch.names,
+            "rows": batch.rows,
+            "questions": [[question_id, digest, text] for (question_id, digest), text in batch.questions.items()],
+        }
+        # マニフェストは最後に置く（途中で止まったバッチはロード対象にならない）
+        path = self.directory / f"{batch.batch_id}{MANIFEST_SUFFIX}"
+        tmp = path.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+        _fsync_path(self.directory)
+        batch.questions_path.unlink()  # 問題はマニフェストに入った
+        self._stats["batches"] += 1
+        return path
+
+    def seal(self, force: bool = True) -> Optional[Path]:
+        """
+        書き込み中のバッチを確定する
+
+        Args:
+            force: False なら max_age を過ぎている場合だけ確定する
+
+        Returns:
+            Path: 確定したバッチのマニフェスト（確定しなかった場合は None）
+        """
+        with self._lock:
+            if self._batch is None:
+                return None
+            if not force and time.monotonic() - self._batch.opened_at < self.max_age:
+                return None
+            return self._seal_locked()
+
+    def ready_batches(self) -> List[Path]:
+        """確定済みでロード待ちのバッチのマニフェスト（古い順）"""
+        return sorted(self.directory.glob(f"*{MANIFEST_SUFFIX}"))
+
+    @staticmethod
+    def read_manifest(path: Path) -> Dict[str, Any]:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def remove(self, path: Path, manifest: Dict[str, Any]) -> None:
+        """ロードが終わったバッチのファイルを削除（マニフェストは最後に消す）"""
+        for name in manifest["files"].values():
+            try:
+                (self.directory / name).unlink()
+            except FileNotFoundError:
+                pass
+        path.unlink()
+
+    def quarantine(self, path: Path) -> Path:
+        """
+        ロードできないバッチのファイルを quarantine/ に移す（マニフェストが壊れていても移せるよう、
+        バッチIDで始まるファイルをまとめて移す。マニフェストは最初に移してロード対象から外す）
+
+        Returns:
+            Path: 移動先のディレクトリ
+        """
+        target = self.directory / QUARANTINE_DIR
+        target.mkdir(exist_ok=True)
+        os.replace(path, target / path.name)
+        batch_id = path.name[:-len(MANIFEST_SUFFIX)]
+        for data in self.directory.glob(f"{batch_id}.*"):
+            os.replace(data, target / data.name)
+        with self._lock:
+            self._stats["quarantined"] += 1
+        return target
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            current = self._batch
+            return {
+                **self._stats,
+                "current_rows": dict(current.rows) if current else None,
+                "current_bytes": current.bytes if current else 0,
+            }
+
+
+class BulkLoader:
+    """
+    確定したバッチを順にロードするバックグラウンドスレッド
+
+    ロードに失敗したバッチは残して次のバッチに進む。他のバッチはロードできているのに
+    max_attempts 回失敗したバッチと、マニフェストが読めないバッチは quarantine/ に移す
+    （どのバッチもロードできないときは DB 側の障害とみなし、失敗回数に数えない）
+
+    Args:
+        staging: ステージングの書き込み側
+        load: バッチをロードする関数（ステージングディレクトリ, マニフェスト）-> ロードしたら True、ロード済みなら False
+        interval: バッチの確定・ロードを確認する間隔（秒）
+        max_backoff: ロード失敗が続いたときの最大待ち時間（秒）
+        max_attempts: quarantine/ に移すまでの失敗回数
+    """
+
+    def __init__(
+        self,
+        staging: StagingWriter,
+        load: Callable[[Path, Dict[str, Any]], bool],
+        interval: float = 5.0,
+        max_backoff: float = 300.0,
+        max_attempts: int = 5
+    ):
+        self.staging = staging
+        self._load = load
+        self.interval = interval
+        self.max_backoff = max_backoff
+        self.max_attempts = max(max_attempts, 1)
+        self._attempts: Dict[str, int] = {}  # マニフェストのファイル名 -> 他のバッチがロードできた中での失敗回数
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._failures_in_row = 0
+        self._stats = {"loaded": 0, "skipped": 0, "failures": 0, "last_load_ms": None}
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="quiz-bulk-loader", daemon=True)
+            self._thread.start()
+
+    def load_ready(self) -> bool:
+        """
+        確定済みのバッチを古い順にロードする
+
+        Returns:
+            bool: すべて成功した場合 True（失敗したバッチは残して次回やり直す）
+        """
+        failed: List[Path] = []
+        reached_db = False  # 1つでもロード（またはロード済みの確認）ができたか
+        for path in self.staging.ready_batches():
+            try:
+                manifest = self.staging.read_manifest(path)
+            except (OSError, ValueError) as e:
+                print(f"[BULK] Quarantining batch {path.name} with unreadable manifest: {e}")
+                self.staging.quarantine(path)
+                continue
+            started = time.perf_counter()
+            try:
+                loaded = self._load(self.staging.directory, manifest)
+            except Exception as e:
+                print(f"[BULK] Failed to load batch {path.name}: {e}")
+                self._stats["failures"] += 1
+                failed.append(path)
+                continue
+            reached_db = True
+            self._attempts.pop(path.name, None)
+            self._stats["loaded" if loaded else "skipped"] += 1
+            self._stats["last_load_ms"] = round((time.perf_counter() - started) * 1000, 3)
+            self.staging.remove(path, manifest)
+
+        if reached_db:
+            # 他のバッチはロードできた: 失敗したバッチ自体に問題がある可能性が高い
+            for path in failed:
+                attempts = self._attempts.get(path.name, 0) + 1
+                if attempts < self.max_attempts:
+                    self._attempts[path.name] = attempts
+                    continue
+                self._attempts.pop(path.name, None)
+                print(f"[BULK] Quarantining batch {path.name} after {attempts} failed loads")
+                self.staging.quarantine(path)
+        return not failed
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self.staging.seal(force=False)
+            if self.load_ready():
+                self._failures_in_row = 0
+                wait = self.interval
+            else:
+                self._failures_in_row += 1
+                wait = min(self.interval * (2 ** self._failures_in_row), self.max_backoff)
+            self._stop.wait(wait)
+
+    def stop(self) -> None:
+        """
+        スレッドを止め、書き込み中のバッチを確定してロードを1回試みる（失敗した分は次回起動時にロード）
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.staging.seal()
+        self.load_ready()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self._stats,
+            "failures_in_row": self._failures_in_row,
+            "pending_batches": len(self.staging.ready_batches()),
+            "staging": self.staging.stats(),
+        }
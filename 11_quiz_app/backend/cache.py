@@ -0,0 +1,86 @@
+"""
+セッション一覧の最新ページを短時間キャッシュする
+ダッシュボードのポーリングのたびに Snowflake へ問い合わせないようにし、
+このプロセスで保存が行われたときは無効化する
+"""
+
+import hashlib
+import json
+import threading
+import time
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+
+def make_etag(payload: Any) -> str:
+    """
+    レスポンス内容から ETag を作成
+
+    Args:
+        payload: JSON に変換できる値（jsonable_encoder 済みであること）
+    """
+    body = json.dumps(payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return '"' + hashlib.sha1(body.encode("utf-8")).hexdigest() + '"'
+
+
+class PageCache:
+    """
+    TTL 付きのページキャッシュ
+
+    Args:
+        ttl: キャッシュの有効期間（秒）。0 以下で無効
+        max_entries: 保持するページ数の上限
+    """
+
+    def __init__(self, ttl: float = 5.0, max_entries: int = 32):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: Dict[Hashable, Tuple[float, str, Any]] = {}  # key -> (期限, ETag, 内容)
+        self._generation = 0  # invalidate() のたびに増える
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "invalidations": 0}
+
+    @property
+    def generation(self) -> int:
+        """
+        現在の世代（問い合わせ前に取得して put() に渡すと、問い合わせ中に無効化された結果を保存しない）
+        """
+        return self._generation
+
+    def get(self, key: Hashable) -> Optional[Tuple[str, Any]]:
+        """
+        有効なキャッシュがあれば (ETag, 内容) を返す
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= now:
+                self._stats["misses"] += 1
+                return None
+            self._stats["hits"] += 1
+            return entry[1], entry[2]
+
+    def put(self, key: Hashable, payload: Any, generation: int) -> str:
+        """
+        内容をキャッシュして ETag を返す（generation が古ければ保存しない）
+        """
+        etag = make_etag(payload)
+        if self.ttl <= 0:
+            return etag
+        with self._lock:
+            if generation == self._generation:
+                if key not in self._entries and len(self._entries) >= self.max_entries:
+                    self._entries.pop(next(iter(self._entries)))
+                self._entries[key] = (time.monotonic() + self.ttl, etag, payload)
+        return etag
+
+    def invalidate(self) -> None:
+        """すべてのページを無効化"""
+        with self._lock:
+            self._entries.clear()
+            self._generation += 1
+            self._stats["invalidations"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """モニタリング用の統計情報"""
+        with self._lock:
+            return {**self._stats, "entries": len(self._entries), "ttl": self.ttl}
@@ -0,0 +1,130 @@
+"""
+Snowflake 接続設定と秘密鍵のプロセス共通キャッシュ
+connection.toml と秘密鍵を一度だけ読み込み、ファイルの更新（鍵のローテーション等）を
+mtime で検知したときだけ読み直す
+"""
+
+import threading
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+import tomli
+from cryptography.hazmat.backends import default_backend
+from cryptography.hazmat.primitives import serialization
+
+DEFAULT_CONFIG_PATH = Path(__file__).parent.parent / "connection.toml"
+
+
+def _mtime(path: Path) -> float:
+    return path.stat().st_mtime
+
+
+def read_private_key(private_key_path: str) -> bytes:
+    """
+    秘密鍵ファイルを読み込み、PKCS8 (DER) 形式にシリアライズ
+
+    Args:
+        private_key_path: 秘密鍵ファイルのパス
+
+    Returns:
+        bytes: PKCS8 形式の秘密鍵
+    """
+    with open(private_key_path, "rb") as key_file:
+        private_key = serialization.load_pem_private_key(
+            key_file.read(),
+            password=None,  # パスワード保護されていない場合
+            backend=default_backend()
+        )
+
+    # PKCS8 形式にシリアライズ
+    return private_key.private_bytes(
+        encoding=serialization.Encoding.DER,
+        format=serialization.PrivateFormat.PKCS8,
+        encryption_algorithm=serialization.NoEncryption()
+    )
+
+
+class CredentialProvider:
+    """
+    接続設定と秘密鍵（DER バイト列）を保持するプロバイダー
+
+    Args:
+        config_path: connection.toml のパス
+    """
+
+    def __init__(self, config_path: Path = DEFAULT_CONFIG_PATH):
+        self.config_path = Path(config_path)
+        self._lock = threading.Lock()
+        self._config: Optional[Tuple[float, Dict[str, Any]]] = None  # (mtime, [snowflake] セクション)
+        self._keys: Dict[str, Tuple[float, bytes]] = {}  # 鍵パス -> (mtime, DER)
+        self.reloads = 0
+
+    def config(self) -> Dict[str, Any]:
+        """
+        connection.toml の [snowflake] セクション（ファイルが更新されていれば読み直す）
+
+        Returns:
+            dict: Snowflake 接続設定（共有オブジェクトのため変更しないこと）
+        """
+        mtime = _mtime(self.config_path)
+        with self._lock:
+            if self._config is None or self._config[0] != mtime:
+                with open(self.config_path, "rb") as f:
+                    section = tomli.load(f)["snowflake"]
+                if self._config is not None:
+                    self.reloads += 1
+                    print(f"[CONFIG] Reloaded {self.config_path}")
+                self._config = (mtime, section)
+            return self._config[1]
+
+    def private_key(self, private_key_path: Optional[str] = None) -> bytes:
+        """
+        秘密鍵の DER バイト列（鍵ファイルが更新されていれば読み直す）
+
+        Args:
+            private_key_path: 鍵のパス（省略時は設定の private_key_path）
+
+        Returns:
+            bytes: PKCS8 形式の秘密鍵
+        """
+        path = private_key_path or self.config()["private_key_path"]
+        mtime = _mtime(Path(path))
+        with self._lock:
+            cached = self._keys.get(path)
+            if cached is not None and cached[0] == mtime:
+                return cached[1]
+            der = read_private_key(path)
+            if cached is not None:
+                self.reloads += 1
+                print(f"[CONFIG] Reloaded private key {path}")
+            self._keys[path] = (mtime, der)
+            return der
+
+    def connect_params(self) -> Dict[str, Any]:
+        """
+        snowflake.connector.connect() に渡す引数
+
+        Returns:
+            dict: 接続パラメーター（秘密鍵は DER バイト列）
+        """
+        config = self.config()
+        return {
+            "account": config["account"],
+            "user": config["user"],
+            "private_key": self.private_key(config["private_key_path"]),
+            "warehouse": config["warehouse"],
+            "database": config["database"],
+            "schema": config["schema"],
+            "role": config["role"],
+        }
+
+
+# プロセス全体で共有するプロバイダー
+_provider = CredentialProvider()
+
+
+def get_provider() -> CredentialProvider:
+    """
+    プロセス共通の CredentialProvider を取得
+    """
+    return _provider
@@ -1,33 +1,100 @@
 """
 Snowflake データベース接続モジュール
 connection.toml を使用して Snowflake に接続し、データ操作を行う
+QUIZ_STORAGE=sqlite でローカルの SQLite に切り替えられる（storage.py）
 """
 
-import tomli
-import snowflake.connector
-from pathlib import Path
+import base64
+import functools
+import hashlib
+import json
+import os
+import threading
+import time
 from contextlib import contextmanager
-from cryptography.hazmat.backends import default_backend
-from cryptography.hazmat.primitives import serialization
-from typing import Dict, Any, List
+from pathlib import Path
+from typing import Callable, Dict, Any, Iterator, List, Optional, Tuple
+
+from credentials import get_provider
+from pool import ConnectionPool
+from storage import StorageBackend, create_backend
+
+
+# 保存先: "snowflake"（既定）または "sqlite"（オフラインでの動作確認・ベンチマーク用）
+STORAGE = os.environ.get("QUIZ_STORAGE", "snowflake")
+SQLITE_PATH = os.environ.get("QUIZ_SQLITE_PATH", "quiz.sqlite3")
+_backend: StorageBackend = create_backend(STORAGE, SQLITE_PATH)
+
+# 接続プールの設定（環境変数で上書き可能）
+POOL_MIN_SIZE = int(os.environ.get("QUIZ_DB_POOL_MIN_SIZE", "1"))
+POOL_MAX_SIZE = int(os.environ.get("QUIZ_DB_POOL_MAX_SIZE", "5"))
+POOL_MAX_LIFETIME = float(os.environ.get("QUIZ_DB_POOL_MAX_LIFETIME", "3600"))  # 秒
+POOL_VALIDATE_AFTER = float(os.environ.get("QUIZ_DB_POOL_VALIDATE_AFTER", "60"))  # 秒
+POOL_WAIT_TIMEOUT = float(os.environ.get("QUIZ_DB_POOL_WAIT_TIMEOUT", "10"))  # 秒
+
+# 1文の複数行 INSERT に入れる最大行数（Snowflake の VALUES 上限 16,384 行より十分小さく）
+INSERT_CHUNK_ROWS = 1000
+
+SESSION_COLUMNS = ("session_id", "user_id", "score", "total_questions", "correct_rate")
+# 回答には問題文を持たせず、QUIZ_QUESTIONS の (question_id, content_hash) で参照する
+ANSWER_COLUMNS = (
+    "session_id", "question_id", "question_hash", "selected_answer", "correct_answer", "is_correct"
+)
+QUESTION_COLUMNS = ("question_id", "content_hash", "question_text")
+QUESTION_STATS_COLUMNS = ("question_id", "attempts", "correct")
+SCORE_STATS_COLUMNS = ("total_questions", "score", "sessions")
+
+# 一括ロードでステージングファイルに書く列（テーブル -> 列）
+STAGED_COLUMNS = {
+    "QUIZ_SESSIONS": SESSION_COLUMNS,
+    "QUIZ_ANSWERS": ANSWER_COLUMNS,
+}
+
+# エクスポート: 名前 -> (テーブル, 列, 期間で絞り込む列)
+EXPORT_TABLES = {
+    "sessions": (
+        "QUIZ_SESSIONS",
+        SESSION_COLUMNS + ("completed_at", "created_at"),
+        "completed_at",
+    ),
+    "answers": (
+        "QUIZ_ANSWERS",
+        ("answer_id",) + ANSWER_COLUMNS + ("answered_at",),
+        "answered_at",
+    ),
+    "questions": (
+        "QUIZ_QUESTIONS",
+        QUESTION_COLUMNS + ("created_at",),
+        "created_at",
+    ),
+}
+EXPORT_FETCH_ROWS = int(os.environ.get("QUIZ_EXPORT_FETCH_ROWS", "5000"))  # fetchmany 1回の行数
+
+# FastAPI 起動時に init_pool() で作成される（スクリプト実行時は None のまま）
+_pool: Optional[ConnectionPool] = None
+
+# QUIZ_QUESTIONS に登録済みと分かっている (question_id, content_hash)
+_known_questions: set = set()
+_questions_lock = threading.Lock()
+
+# 送信1件ごとの保存レイテンシ（ミリ秒）
+_submit_stats = {"count": 0, "errors": 0, "total_ms": 0.0, "max_ms": 0.0, "last_ms": None}
+_submit_stats_lock = threading.Lock()
 
 
 def load_config() -> Dict[str, Any]:
     """
-    connection.toml から Snowflake 設定を読み込む
+    connection.toml から Snowflake 設定を読み込む（プロセス内でキャッシュ済み）
 
     Returns:
         dict: Snowflake 接続設定
     """
-    config_path = Path(__file__).parent.parent / "connection.toml"
-    with open(config_path, "rb") as f:
-        config = tomli.load(f)
-    return config["snowflake"]
+    return get_provider().config()
 
 
 def load_private_key(private_key_path: str) -> bytes:
     """
-    秘密鍵ファイルを読み込み、PKCS8 形式にシリアライズ
+    秘密鍵を PKCS8 形式で取得（プロセス内でキャッシュ済み、鍵ファイル更新時のみ読み直す）
 
     Args:
         private_key_path: 秘密鍵ファイルのパス
@@ -35,27 +102,87 @@ def load_private_key(private_key_path: str) -> bytes:
     Returns:
         bytes: PKCS8 形式の秘密鍵
     """
-    with open(private_key_path, "rb") as key_file:
-        private_key = serialization.load_pem_private_key(
-            key_file.read(),
-            password=None,
-            backend=default_backend()
+    return get_provider().private_key(private_key_path)
+
+
+def get_backend() -> StorageBackend:
+    """
+    現在の保存先バックエンド
+    """
+    return _backend
+
+
+def create_connection():
+    """
+    保存先に新しく接続する
+
+    Returns:
+        snowflake.connector.connection: Snowflake 接続オブジェクト（sqlite の場合は互換ラッパー）
+    """
+    return _backend.connect()
+
+
+def is_connection_alive(conn) -> bool:
+    """
+    接続が使えるかを確認（アイドルが長かった接続の取得時に呼ばれる）
+
+    Returns:
+        bool: SELECT 1 が成功すれば True
+    """
+    return _backend.is_alive(conn)
+
+
+def init_pool() -> ConnectionPool:
+    """
+    接続プールを作成し、最小接続数まで接続しておく（FastAPI 起動時に呼ぶ）
+
+    Returns:
+        ConnectionPool: 作成したプール
+    """
+    global _pool
+    if _pool is None:
+        pool = ConnectionPool(
+            connect=create_connection,
+            min_size=POOL_MIN_SIZE,
+            max_size=POOL_MAX_SIZE,
+            max_lifetime=POOL_MAX_LIFETIME,
+            validate_after=POOL_VALIDATE_AFTER,
+            wait_timeout=POOL_WAIT_TIMEOUT,
+            validate=is_connection_alive
         )
+        _pool = pool
+        try:
+            pool.open()
+            print(f"[DB] Connection pool ready ({_backend.name}, min={POOL_MIN_SIZE}, max={POOL_MAX_SIZE})")
+        except Exception as e:
+            # 起動は続け、接続はリクエスト時に作成する
+            print(f"[ERROR] Failed to pre-open connections: {e}")
+    return _pool
 
-    # PKCS8 形式にシリアライズ
-    pkb = private_key.private_bytes(
-        encoding=serialization.Encoding.DER,
-        format=serialization.PrivateFormat.PKCS8,
-        encryption_algorithm=serialization.NoEncryption()
-    )
-    return pkb
+
+def close_pool() -> None:
+    """
+    接続プールを閉じる（FastAPI 終了時に呼ぶ）
+    """
+    global _pool
+    if _pool is not None:
+        _pool.close()
+        print(f"[DB] Connection pool closed: {_pool.stats()}")
+        _pool = None
+
+
+def get_pool_stats() -> Optional[Dict[str, Any]]:
+    """
+    接続プールの統計情報（プール未作成なら None）
+    """
+    return _pool.stats() if _pool is not None else None
 
 
 @contextmanager
 def get_connection():
     """
     Snowflake 接続を取得するコンテキストマネージャー
-    with 文で使用することで、自動的に接続をクローズする
+    接続プールがあればプールから借りて返却し、なければ接続して自動的にクローズする
 
     Usage:
         with get_connection() as conn:
@@ -65,25 +192,444 @@ def get_connection():
     Yields:
         snowflake.connector.connection: Snowflake 接続オブジェクト
     """
-    config = load_config()
-    private_key_bytes = load_private_key(config["private_key_path"])
-
-    conn = snowflake.connector.connect(
-        account=config["account"],
-        user=config["user"],
-        private_key=private_key_bytes,
-        warehouse=config["warehouse"],
-        database=config["database"],
-        schema=config["schema"],
-        role=config["role"]
-    )
+    if _pool is not None:
+        with _pool.connection() as conn:
+            yield conn
+        return
 
+    conn = create_connection()
     try:
         yield conn
     finally:
         conn.close()
 
 
+def insert_rows(cursor, table: str, columns: tuple, rows: List[tuple]) -> None:
+    """
+    複数行 VALUES の INSERT 文で行をまとめて挿入（INSERT_CHUNK_ROWS 行ごとに1文）
+
+    Args:
+        cursor: Snowflake カーソル
+        table: テーブル名
+        columns: 列名
+        rows: 挿入する値のタプルのリスト
+    """
+    placeholders = "(" + ", ".join(["%s"] * len(columns)) + ")"
+    for start in range(0, len(rows), INSERT_CHUNK_ROWS):
+        chunk = rows[start:start + INSERT_CHUNK_ROWS]
+        sql = (
+            f"INSERT INTO {table} ({', '.join(columns)}) VALUES "
+            + ", ".join([placeholders] * len(chunk))
+        )
+        cursor.execute(sql, [value for row in chunk for value in row])
+
+
+def session_row(session: Dict[str, Any]) -> tuple:
+    """セッション情報の辞書を QUIZ_SESSIONS の行に変換"""
+    return tuple(session.get(column) for column in SESSION_COLUMNS)
+
+
+@functools.lru_cache(maxsize=4096)
+def question_hash(question_text: str) -> str:
+    """問題文のハッシュ（SHA-256 の先頭16文字。同じ問題文は何度来ても計算は1回）"""
+    return hashlib.sha256(question_text.encode("utf-8")).hexdigest()[:16]
+
+
+def answer_row(answer: Dict[str, Any]) -> tuple:
+    """回答データの辞書を QUIZ_ANSWERS の行に変換（問題文はハッシュにする）"""
+    return (
+        answer["session_id"],
+        answer["question_id"],
+        question_hash(answer["question_text"]),
+        answer["selected_answer"],
+        answer["correct_answer"],
+        answer["is_correct"],
+    )
+
+
+def question_key(answer: Dict[str, Any]) -> Tuple[int, str]:
+    """回答が参照する QUIZ_QUESTIONS のキー (question_id, content_hash)"""
+    return answer["question_id"], question_hash(answer["question_text"])
+
+
+def staged_rows(submission: Tuple[Dict[str, Any], List[Dict[str, Any]]]) -> Dict[str, List[tuple]]:
+    """
+    一括ロード用に送信をテーブルごとの行にする（列は STAGED_COLUMNS、真偽値は 1/0）
+    """
+    session, answers = submission
+    return {
+        "QUIZ_SESSIONS": [session_row(session)],
+        "QUIZ_ANSWERS": [answer_row(answer)[:-1] + (int(bool(answer["is_correct"])),) for answer in answers],
+    }
+
+
+def ensure_questions(conn, answers: List[Dict[str, Any]]) -> int:
+    """
+    回答に含まれる問題のうち、このプロセスでまだ見ていないものだけ QUIZ_QUESTIONS に登録する
+    （既知の問題だけなら DB には問い合わせない）
+
+    Args:
+        conn: 接続（登録する場合はこの接続で別トランザクションとしてコミットする）
+        answers: 回答データのリスト（question_id と question_text を持つ）
+
+    Returns:
+        int: 新しく登録した問題数
+    """
+    new = {}
+    for answer in answers:
+        key = (answer["question_id"], question_hash(answer["question_text"]))
+        if key not in _known_questions:
+            new.setdefault(key, answer["question_text"])
+    if not new:
+        return 0
+
+    # 同じ問題を複数のスレッドが同時に登録しないようにする
+    with _questions_lock:
+        new = {key: text for key, text in new.items() if key not in _known_questions}
+        if not new:
+            return 0
+        cursor = conn.cursor()
+        try:
+            question_ids = sorted({question_id for question_id, _ in new})
+            cursor.execute(
+                "SELECT question_id, content_hash FROM QUIZ_QUESTIONS WHERE question_id IN ("
+                + ", ".join(["%s"] * len(question_ids)) + ")",
+                question_ids
+            )
+            existing = {(row[0], row[1]) for row in cursor.fetchall()}
+            rows = [(question_id, digest, text) for (question_id, digest), text in new.items()
+                    if (question_id, digest) not in existing]
+            if rows:
+                cursor.execute("BEGIN")
+                insert_rows(cursor, "QUIZ_QUESTIONS", QUESTION_COLUMNS, rows)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
+        _known_questions.update(new)
+        return len(rows)
+
+
+def _record_submit(latency_ms: Optional[float]) -> None:
+    """保存レイテンシを統計に記録（None は失敗）"""
+    with _submit_stats_lock:
+        if latency_ms is None:
+            _submit_stats["errors"] += 1
+            return
+        _submit_stats["count"] += 1
+        _submit_stats["total_ms"] += latency_ms
+        _submit_stats["max_ms"] = max(_submit_stats["max_ms"], latency_ms)
+        _submit_stats["last_ms"] = latency_ms
+
+
+def get_submit_stats() -> Dict[str, Any]:
+    """
+    クイズ結果保存のレイテンシ統計
+    """
+    with _submit_stats_lock:
+        count = _submit_stats["count"]
+        return {
+            "count": count,
+            "errors": _submit_stats["errors"],
+            "avg_ms": round(_submit_stats["total_ms"] / count, 3) if count else 0.0,
+            "max_ms": round(_submit_stats["max_ms"], 3),
+            "last_ms": round(_submit_stats["last_ms"], 3) if _submit_stats["last_ms"] is not None else None,
+        }
+
+
+def existing_session_ids(cursor, session_ids: List[str]) -> set:
+    """
+    QUIZ_SESSIONS に既に保存されている session_id を返す（INSERT_CHUNK_ROWS 件ごとに1クエリ）
+
+    Args:
+        cursor: Snowflake カーソル
+        session_ids: 確認する session_id のリスト
+    """
+    existing = set()
+    for start in range(0, len(session_ids), INSERT_CHUNK_ROWS):
+        chunk = session_ids[start:start + INSERT_CHUNK_ROWS]
+        cursor.execute(
+            "SELECT session_id FROM QUIZ_SESSIONS WHERE session_id IN (" + ", ".join(["%s"] * len(chunk)) + ")",
+            chunk
+        )
+        existing.update(row[0] for row in cursor.fetchall())
+    return existing
+
+
+def _write_submissions(
+    submissions: List[Tuple[Dict[str, Any], List[Dict[str, Any]]]],
+    skip_existing: bool = False
+) -> List[Tuple[Dict[str, Any], List[Dict[str, Any]]]]:
+    """
+    複数のクイズ結果を1つの接続・1つのトランザクションで保存（失敗時はロールバックして例外）
+
+    Args:
+        submissions: (セッション情報, 回答データのリスト) のリスト
+        skip_existing: True なら保存済み・重複した session_id を除いて挿入する（再送用）
+
+    Returns:
+        list: 実際に挿入した (セッション情報, 回答データのリスト)
+    """
+    with get_connection() as conn:
+        ensure_questions(conn, [answer for _, answers in submissions for answer in answers])
+        cursor = conn.cursor()
+        try:
+            cursor.execute("BEGIN")
+            if skip_existing:
+                # セッションと回答は同じトランザクションで入るため、セッションの有無で判定できる
+                unique: Dict[str, Tuple[Dict[str, Any], List[Dict[str, Any]]]] = {}
+                for session, answers in submissions:
+                    unique.setdefault(session["session_id"], (session, answers))
+                existing = existing_session_ids(cursor, list(unique))
+                submissions = [item for session_id, item in unique.items() if session_id not in existing]
+                if not submissions:
+                    conn.commit()
+                    return []
+            sessions = [session_row(session) for session, _ in submissions]
+            answers = [answer_row(answer) for _, session_answers in submissions for answer in session_answers]
+            insert_rows(cursor, "QUIZ_SESSIONS", SESSION_COLUMNS, sessions)
+            if answers:
+                insert_rows(cursor, "QUIZ_ANSWERS", ANSWER_COLUMNS, answers)
+            conn.commit()
+            return submissions
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
+
+
+def save_quiz_submission(session: Dict[str, Any], answers: List[Dict[str, Any]]) -> Optional[float]:
+    """
+    セッション情報と全回答を1つの接続・1つのトランザクションで保存
+    回答は複数行 VALUES の INSERT 1文で挿入するため、途中で失敗しても孤立したセッションは残らない
+
+    Args:
+        session: セッション情報（session_id, user_id, score, total_questions, correct_rate）
+        answers: 回答データのリスト（insert_quiz_answers と同じ形式）
+
+    Returns:
+        float: 保存にかかった時間（ミリ秒）。失敗時は None
+    """
+    started = time.perf_counter()
+    try:
+        _write_submissions([(session, answers)])
+    except Exception as e:
+        print(f"[ERROR] Error saving quiz submission {session.get('session_id')}: {e}")
+        import traceback
+        traceback.print_exc()
+        _record_submit(None)
+        return None
+
+    latency_ms = (time.perf_counter() - started) * 1000
+    _record_submit(latency_ms)
+    print(f"[DEBUG] Submission {session['session_id']} saved ({len(answers)} answers, {latency_ms:.1f} ms)")
+    return latency_ms
+
+
+def save_quiz_batch(
+    submissions: List[Tuple[Dict[str, Any], List[Dict[str, Any]]]],
+    skip_existing: bool = False,
+    on_saved: Optional[Callable[[List[Tuple[Dict[str, Any], List[Dict[str, Any]]]]], None]] = None
+) -> bool:
+    """
+    複数のクイズ結果をまとめて保存（書き込みキューのフラッシュ・スプールの再送用）
+    全セッションと全回答をそれぞれ複数行 INSERT にまとめ、1トランザクションで挿入する
+
+    Args:
+        submissions: (セッション情報, 回答データのリスト) のリスト
+        skip_existing: True なら保存済みの session_id を飛ばす（同じバッチを何度送っても重複しない）
+        on_saved: コミット後に、実際に挿入した送信のリストを渡して呼ぶ関数（集計の更新用）
+
+    Returns:
+        bool: 保存成功時 True、失敗時 False（何も保存されていない）
+    """
+    if not submissions:
+        return True
+    try:
+        started = time.perf_counter()
+        inserted = _write_submissions(submissions, skip_existing=skip_existing)
+        print(
+            f"[DEBUG] Flushed {len(inserted)}/{len(submissions)} submissions "
+            f"in {(time.perf_counter() - started) * 1000:.1f} ms"
+        )
+    except Exception as e:
+        print(f"[ERROR] Error saving {len(submissions)} quiz submissions: {e}")
+        return False
+    if on_saved is not None and inserted:
+        on_saved(inserted)
+    return True
+
+
+def aggregate_quiz_stats() -> Tuple[List[tuple], List[tuple]]:
+    """
+    QUIZ_ANSWERS / QUIZ_SESSIONS 全体から集計をやり直す（起動時の再構築用、例外はそのまま送出）
+
+    Returns:
+        tuple: (問題別 (question_id, attempts, correct) のリスト, スコア分布 (total_questions, score, sessions) のリスト)
+    """
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute("""
+                SELECT question_id, COUNT(*), SUM(CASE WHEN is_correct THEN 1 ELSE 0 END)
+                FROM QUIZ_ANSWERS
+                GROUP BY question_id
+            """)
+            questions = [tuple(row) for row in cursor.fetchall()]
+            cursor.execute("""
+                SELECT total_questions, score, COUNT(*)
+                FROM QUIZ_SESSIONS
+                GROUP BY total_questions, score
+            """)
+            scores = [tuple(row) for row in cursor.fetchall()]
+            return questions, scores
+        finally:
+            cursor.close()
+
+
+def load_quiz_stats() -> Tuple[List[tuple], List[tuple]]:
+    """
+    前回書き出した集計を集計テーブルから読み込む（例外はそのまま送出）
+
+    Returns:
+        tuple: aggregate_quiz_stats() と同じ形式
+    """
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute(f"SELECT {', '.join(QUESTION_STATS_COLUMNS)} FROM QUIZ_QUESTION_STATS")
+            questions = [tuple(row) for row in cursor.fetchall()]
+            cursor.execute(f"SELECT {', '.join(SCORE_STATS_COLUMNS)} FROM QUIZ_SCORE_STATS")
+            scores = [tuple(row) for row in cursor.fetchall()]
+            return questions, scores
+        finally:
+            cursor.close()
+
+
+def save_quiz_stats(questions: List[tuple], scores: List[tuple]) -> None:
+    """
+    集計テーブルの内容を1トランザクションで置き換える（例外はそのまま送出）
+
+    Args:
+        questions: (question_id, attempts, correct) のリスト
+        scores: (total_questions, score, sessions) のリスト
+    """
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute("BEGIN")
+            cursor.execute("DELETE FROM QUIZ_QUESTION_STATS")
+            cursor.execute("DELETE FROM QUIZ_SCORE_STATS")
+            if questions:
+                insert_rows(cursor, "QUIZ_QUESTION_STATS", QUESTION_STATS_COLUMNS, questions)
+            if scores:
+                insert_rows(cursor, "QUIZ_SCORE_STATS", SCORE_STATS_COLUMNS, scores)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
+
+
+def _load_table(table: str) -> str:
+    """一括ロードでファイルを先に取り込む一時テーブルの名前"""
+    return f"{table}_LOAD"
+
+
+def load_staged_batch(
+    directory: Path,
+    manifest: Dict[str, Any],
+    on_saved: Optional[Callable[[List[Tuple[Dict[str, Any], List[Dict[str, Any]]]]], None]] = None
+) -> bool:
+    """
+    ステージングしたバッチ（gzip 圧縮 CSV）をテーブルごとに1回のロードで取り込む
+    QUIZ_LOAD_BATCHES にバッチIDを記録し、ロード済みのバッチは取り込まない（例外はそのまま送出）
+    ファイルは一時テーブルに取り込んでから、保存済みの session_id を除いて本テーブルに入れる
+    （Snowflake は主キーを強制しないため、再送されたセッションを COPY で直接入れると重複する）
+
+    Args:
+        directory: ステージングディレクトリ
+        manifest: バッチのマニフェスト（bulkload.StagingWriter が作成）
+        on_saved: コミット後に、実際に挿入したセッションと回答（集計に使う列のみ）を渡して呼ぶ関数
+
+    Returns:
+        bool: ロードした場合 True、ロード済みだった場合 False
+    """
+    batch_id = manifest["batch_id"]
+    files = [(table, directory / name) for table, name in manifest["files"].items()]
+    with get_connection() as conn:
+        # 回答は問題をハッシュで参照するため、先に問題を登録しておく
+        ensure_questions(conn, [
+            {"question_id": question_id, "question_text": text}
+            for question_id, _, text in manifest["questions"]
+        ])
+        cursor = conn.cursor()
+        try:
+            cursor.execute("SELECT batch_id FROM QUIZ_LOAD_BATCHES WHERE batch_id = %s", [batch_id])
+            if cursor.fetchone() is not None:
+                return False
+            for table, path in files:
+                _backend.stage_file(cursor, table, path)
+                # プールの接続に前回の一時テーブルが残っていれば作り直す（DDL なのでトランザクションの外で）
+                cursor.execute(f"DROP TABLE IF EXISTS {_load_table(table)}")
+                cursor.execute(
+                    f"CREATE TEMPORARY TABLE {_load_table(table)} AS "
+                    f"SELECT {', '.join(STAGED_COLUMNS[table])} FROM {table} WHERE 1 = 0"
+                )
+            cursor.execute("BEGIN")
+            for table, path in files:
+                _backend.copy_file(
+                    cursor, table, STAGED_COLUMNS[table], path, INSERT_CHUNK_ROWS, into=_load_table(table)
+                )
+            sessions = _load_table("QUIZ_SESSIONS")
+            cursor.execute(f"DELETE FROM {sessions} WHERE session_id IN (SELECT session_id FROM QUIZ_SESSIONS)")
+            cursor.execute(
+                f"INSERT INTO QUIZ_SESSIONS ({', '.join(SESSION_COLUMNS)}) "
+                f"SELECT {', '.join(SESSION_COLUMNS)} FROM {sessions}"
+            )
+            loaded_sessions = cursor.rowcount
+            cursor.execute(
+                f"INSERT INTO QUIZ_ANSWERS ({', '.join(ANSWER_COLUMNS)}) "
+                f"SELECT {', '.join(ANSWER_COLUMNS)} FROM {_load_table('QUIZ_ANSWERS')} "
+                f"WHERE session_id IN (SELECT session_id FROM {sessions})"
+            )
+            loaded_answers = cursor.rowcount
+            cursor.execute(
+                "INSERT INTO QUIZ_LOAD_BATCHES (batch_id, sessions, answers) VALUES (%s, %s, %s)",
+                [batch_id, loaded_sessions, loaded_answers]
+            )
+            saved = _loaded_submissions(cursor, sessions, _load_table("QUIZ_ANSWERS")) if on_saved else []
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
+    if saved:
+        on_saved(saved)
+    return True
+
+
+def _loaded_submissions(cursor, sessions: str, answers: str) -> List[Tuple[Dict[str, Any], List[Dict[str, Any]]]]:
+    """一括ロードで挿入したセッションと回答を (セッション情報, 回答データのリスト) の形で読み出す"""
+    cursor.execute(f"SELECT session_id, score, total_questions FROM {sessions}")
+    saved = {
+        session_id: ({"session_id": session_id, "score": score, "total_questions": total_questions}, [])
+        for session_id, score, total_questions in cursor.fetchall()
+    }
+    cursor.execute(
+        f"SELECT session_id, question_id, is_correct FROM {answers} "
+        f"WHERE session_id IN (SELECT session_id FROM {sessions})"
+    )
+    for session_id, question_id, is_correct in cursor.fetchall():
+        saved[session_id][1].append({"question_id": question_id, "is_correct": bool(is_correct)})
+    return list(saved.values())
+
+
 def insert_quiz_session(
     session_id: str,
     score: int,
@@ -163,13 +709,15 @@ def insert_quiz_answers(answers: List[Dict[str, Any]]) -> bool:
     try:
         print(f"[DEBUG] Inserting {len(answers)} answers")
         with get_connection() as conn:
+            # 問題文は QUIZ_QUESTIONS に1回だけ登録し、回答にはハッシュだけを入れる
+            ensure_questions(conn, answers)
             cursor = conn.cursor()
 
             sql = """
                 INSERT INTO QUIZ_ANSWERS (
                     session_id,
                     question_id,
-                    question_text,
+                    question_hash,
                     selected_answer,
                     correct_answer,
                     is_correct
@@ -178,17 +726,7 @@ def insert_quiz_answers(answers: List[Dict[str, Any]]) -> bool:
             """
 
             # バルクインサート用のデータを準備
-            values = [
-                (
-                    answer["session_id"],
-                    answer["question_id"],
-                    answer["question_text"],
-                    answer["selected_answer"],
-                    answer["correct_answer"],
-                    answer["is_correct"]
-                )
-                for answer in answers
-            ]
+            values = [answer_row(answer) for answer in answers]
 
             # executemany でバルクインサート
             cursor.executemany(sql, values)
@@ -204,46 +742,146 @@ def insert_quiz_answers(answers: List[Dict[str, Any]]) -> bool:
         return False
 
 
-def get_quiz_sessions(limit: int = 10) -> List[Dict[str, Any]]:
+def encode_cursor(session: Dict[str, Any]) -> str:
+    """
+    セッション一覧の次ページ用カーソル（最後の行の completed_at と session_id）を作成
+
+    Args:
+        session: get_quiz_sessions() が返した最後の行
+
+    Returns:
+        str: URL に載せられる不透明な文字列
+    """
+    completed_at = session["COMPLETED_AT"]
+    if hasattr(completed_at, "isoformat"):
+        completed_at = completed_at.isoformat()
+    raw = json.dumps([str(completed_at), session["SESSION_ID"]], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[str, str]:
+    """
+    encode_cursor() の逆変換
+
+    Raises:
+        ValueError: 不正なカーソル
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        completed_at, session_id = json.loads(raw)
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if not isinstance(completed_at, str) or not isinstance(session_id, str):
+        raise ValueError("Invalid cursor")
+    return completed_at, session_id
+
+
+def get_quiz_sessions(limit: int = 10, after: Optional[Tuple[str, str]] = None) -> List[Dict[str, Any]]:
     """
-    クイズセッション一覧を取得
+    クイズセッション一覧を新しい順に取得
+    (completed_at, session_id) のキーセットでページングする（OFFSET を使わないため深いページも速い）
 
     Args:
         limit: 取得件数（デフォルト: 10）
+        after: 前ページ最後の行の (completed_at, session_id)。None なら最新ページ
 
     Returns:
         list: セッション情報のリスト
+
+    Raises:
+        Exception: 取得に失敗した場合（空のページとして返さず、呼び出し側でエラーにする）
     """
+    where = ""
+    params: List[Any] = []
+    if after is not None:
+        where = "WHERE completed_at < %s OR (completed_at = %s AND session_id < %s)"
+        params = [after[0], after[0], after[1]]
+
+    sql = f"""
+        SELECT
+            session_id,
+            user_id,
+            score,
+            total_questions,
+            correct_rate,
+            completed_at,
+            created_at
+        FROM QUIZ_SESSIONS
+        {where}
+        ORDER BY completed_at DESC, session_id DESC
+        LIMIT %s
+    """
+
     try:
         with get_connection() as conn:
             cursor = conn.cursor()
+            try:
+                cursor.execute(sql, params + [limit])
+                rows = cursor.fetchall()
+                # 列名を取得
+                columns = [desc[0] for desc in cursor.description]
+            finally:
+                cursor.close()
+    except Exception as e:
+        print(f"[ERROR] Error fetching quiz sessions: {e}")
+        raise
 
-            sql = """
-                SELECT
-                    session_id,
-                    user_id,
-                    score,
-                    total_questions,
-                    correct_rate,
-                    completed_at,
-                    created_at
-                FROM QUIZ_SESSIONS
-                ORDER BY completed_at DESC
-                LIMIT %s
-            """
+    # 辞書形式に変換
+    return [dict(zip(columns, row)) for row in rows]
 
-            cursor.execute(sql, (limit,))
-            rows = cursor.fetchall()
 
-            # 列名を取得
-            columns = [desc[0] for desc in cursor.description]
+def iter_export(
+    table: str,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    arrow: bool = False,
+    fetch_rows: int = EXPORT_FETCH_ROWS,
+    cancelled: Optional[threading.Event] = None
+) -> Iterator[Any]:
+    """
+    テーブルの行を少しずつ取り出すジェネレーター（結果全体をメモリに載せない）
+    最初に列名のリストを返し、続けて fetchmany の行のリストを返す
+    arrow=True で接続が Arrow のバッチ取得に対応していれば（Snowflake）、行の代わりに pyarrow.Table を返す
 
-            # 辞書形式に変換
-            sessions = [dict(zip(columns, row)) for row in rows]
+    Args:
+        table: EXPORT_TABLES のキー
+        start: この日時以降（含む）
+        end: この日時より前（含まない）
+        arrow: Arrow のバッチで取り出す
+        fetch_rows: fetchmany 1回の行数
+        cancelled: セットされたら次の取り出しの前に打ち切って接続を返す（クライアントの切断時）
 
+    Yields:
+        list: 列名、その後は行のリスト（または pyarrow.Table）
+    """
+    name, columns, time_column = EXPORT_TABLES[table]
+    conditions = []
+    params: List[Any] = []
+    if start is not None:
+        conditions.append(f"{time_column} >= %s")
+        params.append(start)
+    if end is not None:
+        conditions.append(f"{time_column} < %s")
+        params.append(end)
+    where = ("WHERE " + " AND ".join(conditions)) if conditions else ""
+    sql = f"SELECT {', '.join(columns)} FROM {name} {where} ORDER BY {time_column}, {columns[0]}"
+
+    # ジェネレーターが最後まで読まれるか閉じられるまで接続を借りたままにする
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute(sql, params)
+            yield [desc[0] for desc in cursor.description]
+            if arrow and hasattr(cursor, "fetch_arrow_batches"):
+                for batch in cursor.fetch_arrow_batches():
+                    if cancelled is not None and cancelled.is_set():
+                        return
+                    yield batch
+                return
+            while cancelled is None or not cancelled.is_set():
+                rows = cursor.fetchmany(fetch_rows)
+                if not rows:
+                    break
+                yield rows
+        finally:
             cursor.close()
-            return sessions
-
-    except Exception as e:
-        print(f"Error fetching quiz sessions: {e}")
-        return []
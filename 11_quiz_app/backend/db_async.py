@@ -0,0 +1,133 @@
+"""
+DB 操作を非同期ハンドラーから呼ぶための専用スレッドプール
+ブロッキングする Snowflake の処理を接続プールと同じ数のスレッドで実行し、
+操作の種類ごとに同時実行数とタイムアウトを制限する
+"""
+
+import asyncio
+import functools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+
+class OperationBusy(Exception):
+    """同時実行数の上限に達していて、時間内に実行を開始できなかった"""
+
+
+class OperationTimeout(Exception):
+    """実行がタイムアウトした（スレッド上の処理は完了まで続く）"""
+
+
+class DBExecutor:
+    """
+    DB 操作を await できるようにする実行器
+
+    Args:
+        max_workers: スレッド数（接続プールの max_size に合わせる）
+        limits: 操作名 -> 同時実行数の上限（未指定の操作は max_workers）
+        timeouts: 操作名 -> タイムアウト（秒）。実行開始待ちの時間を含む
+        default_timeout: timeouts にない操作のタイムアウト（秒）
+    """
+
+    def __init__(
+        self,
+        max_workers: int,
+        limits: Optional[Dict[str, int]] = None,
+        timeouts: Optional[Dict[str, float]] = None,
+        default_timeout: float = 30.0
+    ):
+        self.max_workers = max(max_workers, 1)
+        self.limits = dict(limits or {})
+        self.timeouts = dict(timeouts or {})
+        self.default_timeout = default_timeout
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="quiz-db")
+        # イベントループ上で初めて使う時に作る
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._stats_lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, Any]] = {}
+
+    def _semaphore(self, op: str) -> asyncio.Semaphore:
+        if op not in self._semaphores:
+            limit = self.limits.get(op, self.max_workers)
+            self._semaphores[op] = asyncio.Semaphore(max(1, min(limit, self.max_workers)))
+        return self._semaphores[op]
+
+    def _record(self, op: str, key: str, elapsed_ms: Optional[float] = None) -> None:
+        with self._stats_lock:
+            stats = self._stats.setdefault(
+                op, {"completed": 0, "errors": 0, "busy": 0, "timeouts": 0, "running": 0, "max_ms": 0.0}
+            )
+            stats[key] += 1
+            if elapsed_ms is not None:
+                stats["max_ms"] = max(stats["max_ms"], elapsed_ms)
+
+    def _finished(self, op: str, semaphore: asyncio.Semaphore, future: "asyncio.Future") -> None:
+        """スレッド上の処理が終わったら枠を返す（タイムアウト後でも実際に終わるまで枠は埋まったまま）"""
+        semaphore.release()
+        with self._stats_lock:
+            self._stats[op]["running"] -= 1
+
+    async def run(self, op: str, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """
+        fn(*args, **kwargs) を専用スレッドで実行して結果を返す
+
+        Args:
+            op: 操作名（同時実行数とタイムアウトの単位）
+
+        Raises:
+            OperationBusy: タイムアウトまでに実行を開始できなかった
+            OperationTimeout: 実行がタイムアウトした
+        """
+        loop = asyncio.get_running_loop()
+        timeout = self.timeouts.get(op, self.default_timeout)
+        started = time.perf_counter()
+        deadline = loop.time() + timeout
+        semaphore = self._semaphore(op)
+
+        try:
+            await asyncio.wait_for(semaphore.acquire(), timeout)
+        except asyncio.TimeoutError:
+            self._record(op, "busy")
+            raise OperationBusy(f"Too many concurrent '{op}' operations (waited {timeout:g}s)")
+
+        try:
+            future = loop.run_in_executor(self._executor, functools.partial(fn, *args, **kwargs))
+        except BaseException:
+            semaphore.release()
+            raise
+        self._record(op, "running")
+        future.add_done_callback(functools.partial(self._finished, op, semaphore))
+
+        try:
+            # shield: タイムアウトしてもスレッド側の処理は取り消せないため、完了の通知だけは受け取る
+            result = await asyncio.wait_for(asyncio.shield(future), max(deadline - loop.time(), 0))
+        except asyncio.TimeoutError:
+            self._record(op, "timeouts")
+            raise OperationTimeout(f"'{op}' did not finish within {timeout:g}s")
+        except Exception:
+            self._record(op, "errors")
+            raise
+        self._record(op, "completed", (time.perf_counter() - started) * 1000)
+        return result
+
+    def shutdown(self) -> None:
+        """実行中の処理が終わるのを待ってスレッドを止める"""
+        self._executor.shutdown(wait=True)
+
+    def stats(self) -> Dict[str, Any]:
+        """モニタリング用の統計情報"""
+        with self._stats_lock:
+            return {
+                "max_workers": self.max_workers,
+                "operations": {
+                    op: {
+                        **stats,
+                        "max_ms": round(stats["max_ms"], 3),
+                        "limit": min(self.limits.get(op, self.max_workers), self.max_workers),
+                        "timeout": self.timeouts.get(op, self.default_timeout),
+                    }
+                    for op, stats in self._stats.items()
+                },
+            }
@@ -0,0 +1,108 @@
+"""
+エクスポートの出力形式（NDJSON / CSV / Arrow IPC ストリーム）
+db.iter_export() が返すバッチを1つずつバイト列に変換する（全体をメモリに載せない）
+"""
+
+import csv
+import io
+import json
+from typing import Any, Iterable, Iterator, List
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+except ImportError:  # Arrow 形式は pyarrow がある場合のみ
+    pyarrow = None
+
+MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+    "arrow": "application/vnd.apache.arrow.stream",
+}
+
+
+def arrow_available() -> bool:
+    return pyarrow is not None
+
+
+def _rows(batch: Any) -> List[tuple]:
+    """行のリスト、または pyarrow.Table のバッチを行のリストにする"""
+    if pyarrow is not None and isinstance(batch, (pyarrow.Table, pyarrow.RecordBatch)):
+        return list(zip(*(column.to_pylist() for column in batch.columns)))
+    return batch
+
+
+def encode_ndjson(columns: List[str], batches: Iterable[Any]) -> Iterator[bytes]:
+    """1行1 JSON オブジェクト（日時などは文字列）"""
+    for batch in batches:
+        yield "".join(
+            json.dumps(dict(zip(columns, row)), ensure_ascii=False, default=str) + "\n"
+            for row in _rows(batch)
+        ).encode("utf-8")
+
+
+def encode_csv(columns: List[str], batches: Iterable[Any]) -> Iterator[bytes]:
+    """ヘッダー付き CSV"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for batch in batches:
+        writer.writerows(_rows(batch))
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")  # 行が無い場合のヘッダー
+
+
+def _arrow_table(columns: List[str], rows: List[tuple], schema: Any) -> Any:
+    """行のリストを Arrow のテーブルにする（schema が None なら型を推測）"""
+    values = list(zip(*rows)) if rows else [[] for _ in columns]
+    if schema is None:
+        arrays = [pyarrow.array(list(column_values)) for column_values in values]
+        # 最初のバッチで全て NULL だった列は文字列として扱う
+        arrays = [array.cast(pyarrow.string()) if pyarrow.types.is_null(array.type) else array for array in arrays]
+        return pyarrow.Table.from_arrays(arrays, names=columns)
+    return pyarrow.Table.from_arrays(
+        [pyarrow.array(list(column_values), type=field.type) for column_values, field in zip(values, schema)],
+        schema=schema
+    )
+
+
+def encode_arrow(columns: List[str], batches: Iterable[Any]) -> Iterator[bytes]:
+    """
+    Arrow IPC ストリーム形式（スキーマは最初のバッチから決める）
+    """
+    sink = io.BytesIO()
+    writer = None
+    schema = None
+
+    def drain() -> bytes:
+        data = sink.getvalue()
+        sink.seek(0)
+        sink.truncate()
+        return data
+
+    for batch in batches:
+        if isinstance(batch, pyarrow.Table):
+            table = batch if schema is None else batch.cast(schema)
+        else:
+            table = _arrow_table(columns, batch, schema)
+        if writer is None:
+            schema = table.schema
+            writer = pyarrow.ipc.new_stream(sink, schema)
+        writer.write_table(table)
+        yield drain()
+
+    if writer is None:
+        # 行が無い場合は列名だけのスキーマを書く
+        writer = pyarrow.ipc.new_stream(sink, pyarrow.schema([(name, pyarrow.string()) for name in columns]))
+    writer.close()
+    yield drain()
+
+
+ENCODERS = {
+    "ndjson": encode_ndjson,
+    "csv": encode_csv,
+    "arrow": encode_arrow,
+}
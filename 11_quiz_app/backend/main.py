@@ -3,14 +3,132 @@ FastAPI Backend for Quiz Application
 クイズアプリケーション用のバックエンドAPI
 """
 
-from fastapi import FastAPI, HTTPException
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.encoders import jsonable_encoder
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from pydantic import BaseModel
-from typing import List, Optional
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import anyio
+import asyncio
+import itertools
+import os
+import threading
 import uuid
 
 # ローカルモジュール
-from db import insert_quiz_session, insert_quiz_answers, get_quiz_sessions
+from db import (
+    save_quiz_submission,
+    save_quiz_batch,
+    get_quiz_sessions,
+    encode_cursor,
+    decode_cursor,
+    iter_export,
+    EXPORT_TABLES,
+    init_pool,
+    close_pool,
+    get_pool_stats,
+    get_submit_stats,
+    get_backend,
+    aggregate_quiz_stats,
+    load_quiz_stats,
+    save_quiz_stats,
+    load_staged_batch,
+    staged_rows,
+    question_key,
+    STAGED_COLUMNS,
+    POOL_MAX_SIZE,
+)
+from bulkload import DEFAULT_STAGING_DIR, BulkLoader, StagingWriter
+from cache import PageCache, make_etag
+from db_async import DBExecutor, OperationBusy, OperationTimeout
+from export import ENCODERS, MEDIA_TYPES, arrow_available
+from stats import QuizStats
+from spool import DEFAULT_SPOOL_DIR, Spool, SpoolReplayer
+from writer import QueueFull, WriteBehindQueue
+
+# 書き込みモード:
+#   "sync"         送信ごとに保存してから応答
+#   "write_behind" キューに入れて即応答し、まとめて保存
+#   "spool"        ローカルのスプールファイルに追記してから応答し、再送スレッドがまとめて保存
+#   "bulk"         gzip CSV にステージングして応答し、ファイル単位で一括ロード（大規模イベント向け）
+WRITE_MODE = os.environ.get("QUIZ_WRITE_MODE", "sync")
+writer: Optional[WriteBehindQueue] = None
+spool: Optional[Spool] = None
+replayer: Optional[SpoolReplayer] = None
+staging: Optional[StagingWriter] = None
+bulk_loader: Optional[BulkLoader] = None
+
+# DB 操作用のスレッドプール（接続プールと同じ数のスレッド）と、操作ごとの同時実行数・タイムアウト
+DB_LIMITS = {
+    "submit": int(os.environ.get("QUIZ_DB_SUBMIT_CONCURRENCY", POOL_MAX_SIZE)),
+    # 一覧の取得で接続を使い切って保存が待たされないよう、既定では半分まで
+    "sessions": int(os.environ.get("QUIZ_DB_SESSIONS_CONCURRENCY", max(1, POOL_MAX_SIZE // 2))),
+}
+DB_TIMEOUTS = {
+    "submit": float(os.environ.get("QUIZ_DB_SUBMIT_TIMEOUT", "30")),
+    "sessions": float(os.environ.get("QUIZ_DB_SESSIONS_TIMEOUT", "10")),
+}
+db_executor: Optional[DBExecutor] = None
+
+# 問題別・スコア別の集計（起動時に再構築し、受け付けた送信ごとに更新）
+quiz_stats: Optional[QuizStats] = None
+
+# セッション一覧の最新ページのキャッシュ（このプロセスで保存が確定したら無効化）
+sessions_cache = PageCache(ttl=float(os.environ.get("QUIZ_SESSIONS_CACHE_TTL", "5")))
+sessions_cache_lock = asyncio.Lock()
+
+
+# 同時に実行できるエクスポートの数（エクスポート中は接続を1本借りたままになる）
+EXPORT_CONCURRENCY = int(os.environ.get("QUIZ_EXPORT_CONCURRENCY", "2"))
+export_slots = asyncio.Semaphore(EXPORT_CONCURRENCY)
+
+
+def save_batch_and_invalidate(
+    batch: List[Tuple[Dict[str, Any], List[Dict[str, Any]]]],
+    skip_existing: bool = False,
+    on_saved: Optional[Callable[[List[Tuple[Dict[str, Any], List[Dict[str, Any]]]]], None]] = None
+) -> bool:
+    """書き込みキュー・スプールのフラッシュ用（保存できたらセッション一覧のキャッシュを無効化）"""
+    ok = save_quiz_batch(batch, skip_existing=skip_existing, on_saved=on_saved)
+    if ok:
+        sessions_cache.invalidate()
+    return ok
+
+
+def record_saved(batch: List[Tuple[Dict[str, Any], List[Dict[str, Any]]]]) -> None:
+    """書き込みキュー・スプールの再送・一括ロードで実際に保存された送信だけを集計に加える"""
+    if quiz_stats is not None:
+        for session, answers in batch:
+            quiz_stats.record(session, answers)
+
+
+def load_batch_and_invalidate(directory, manifest: Dict[str, Any]) -> bool:
+    """一括ロード用（ロードできたらセッション一覧のキャッシュを無効化し、挿入した送信を集計する）"""
+    loaded = load_staged_batch(directory, manifest, on_saved=record_saved)
+    if loaded:
+        sessions_cache.invalidate()
+    return loaded
+
+
+async def run_db(op: str, fn: Callable[..., Any], **kwargs: Any) -> Any:
+    """
+    DB 操作を専用スレッドで実行（イベントループを止めない）
+
+    Raises:
+        HTTPException: 同時実行数の上限で開始できない場合は 503、タイムアウトは 504
+    """
+    if db_executor is None:
+        return await run_in_threadpool(fn, **kwargs)
+    try:
+        return await db_executor.run(op, fn, **kwargs)
+    except OperationBusy as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+    except OperationTimeout as e:
+        raise HTTPException(status_code=504, detail=str(e))
 
 
 # Pydantic モデル定義
@@ -39,11 +157,83 @@ class QuizSubmissionResponse(BaseModel):
     session_id: str
 
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    起動時に Snowflake 接続プールを作成し、終了時に全接続をクローズする
+    write_behind モードでは書き込みキューを起動し、終了時に残りをフラッシュしてから接続を閉じる
+    spool モードでは前回までに残ったスプールも含めて再送スレッドが書き込む
+    """
+    global writer, spool, replayer, db_executor, quiz_stats, staging, bulk_loader
+    await run_in_threadpool(init_pool)
+    db_executor = DBExecutor(POOL_MAX_SIZE, limits=DB_LIMITS, timeouts=DB_TIMEOUTS)
+    quiz_stats = QuizStats(
+        aggregate_quiz_stats,
+        load_quiz_stats,
+        save_quiz_stats,
+        persist_interval=float(os.environ.get("QUIZ_STATS_PERSIST_INTERVAL", "60"))
+    )
+    await run_in_threadpool(quiz_stats.start)
+    if WRITE_MODE == "write_behind":
+        # 再送された session_id は飛ばし、保存できた送信だけを集計する
+        writer = WriteBehindQueue(
+            lambda batch: save_batch_and_invalidate(batch, skip_existing=True, on_saved=record_saved),
+            max_batch=int(os.environ.get("QUIZ_WRITE_BATCH_SIZE", 500)),
+            flush_interval=float(os.environ.get("QUIZ_WRITE_FLUSH_INTERVAL", 1.0)),
+            max_queue=int(os.environ.get("QUIZ_WRITE_QUEUE_SIZE", 10000))
+        )
+        writer.start()
+        print(f"[API] Write-behind mode (batch={writer.max_batch}, interval={writer.flush_interval}s)")
+    elif WRITE_MODE == "spool":
+        spool = Spool(os.environ.get("QUIZ_SPOOL_DIR", DEFAULT_SPOOL_DIR))
+        replayer = SpoolReplayer(
+            spool,
+            lambda batch: save_batch_and_invalidate(batch, skip_existing=True, on_saved=record_saved),
+            max_batch=int(os.environ.get("QUIZ_SPOOL_BATCH_SIZE", 1000)),
+            interval=float(os.environ.get("QUIZ_SPOOL_REPLAY_INTERVAL", 1.0))
+        )
+        replayer.start()
+        print(f"[API] Spool mode ({spool.directory}, {len(spool.segments()) - 1} segments pending)")
+    elif WRITE_MODE == "bulk":
+        staging = StagingWriter(
+            os.environ.get("QUIZ_STAGING_DIR", DEFAULT_STAGING_DIR),
+            staged_rows,
+            question_key,
+            list(STAGED_COLUMNS),
+            max_bytes=int(os.environ.get("QUIZ_STAGING_MAX_BYTES", 64 * 1024 * 1024)),
+            max_age=float(os.environ.get("QUIZ_STAGING_MAX_AGE", "60"))
+        )
+        bulk_loader = BulkLoader(
+            staging,
+            load_batch_and_invalidate,
+            interval=float(os.environ.get("QUIZ_BULK_LOAD_INTERVAL", "5"))
+        )
+        bulk_loader.start()
+        print(f"[API] Bulk mode ({staging.directory}, {len(staging.ready_batches())} batches pending)")
+    yield
+    if writer is not None:
+        await run_in_threadpool(writer.stop)
+        writer = None
+    if replayer is not None:
+        await run_in_threadpool(replayer.stop)
+        spool.close()
+        replayer = spool = None
+    if bulk_loader is not None:
+        await run_in_threadpool(bulk_loader.stop)
+        bulk_loader = staging = None
+    await run_in_threadpool(quiz_stats.stop)
+    quiz_stats = None
+    await run_in_threadpool(db_executor.shutdown)
+    db_executor = None
+    await run_in_threadpool(close_pool)
+
+
 # FastAPIアプリケーションのインスタンスを作成
 app = FastAPI(
     title="Quiz API",
     description="クイズ結果をSnowflakeに保存するAPI",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # CORS設定（Reactアプリからのリクエストを許可）
@@ -82,6 +272,38 @@ async def health_check():
     }
 
 
+# 接続プールの状態を確認するエンドポイント
+@app.get("/api/db/pool")
+async def pool_stats():
+    """
+    Snowflake 接続プールの統計情報を取得（モニタリング用）
+    """
+    return {
+        "enabled": get_pool_stats() is not None,
+        "pool": get_pool_stats()
+    }
+
+
+# DB 関連の統計情報を確認するエンドポイント
+@app.get("/api/db/stats")
+async def db_stats():
+    """
+    接続プールとクイズ結果保存レイテンシの統計情報を取得（モニタリング用）
+    """
+    return {
+        "storage": get_backend().name,
+        "pool": get_pool_stats(),
+        "submit": get_submit_stats(),
+        "executor": db_executor.stats() if db_executor is not None else None,
+        "sessions_cache": sessions_cache.stats(),
+        "quiz_stats": quiz_stats.stats() if quiz_stats is not None else None,
+        "write_mode": WRITE_MODE,
+        "writer": writer.stats() if writer is not None else None,
+        "spool": replayer.stats() if replayer is not None else None,
+        "bulk": bulk_loader.stats() if bulk_loader is not None else None
+    }
+
+
 # クイズ結果を保存するエンドポイント
 @app.post("/api/quiz/submit", response_model=QuizSubmissionResponse)
 async def submit_quiz(submission: QuizSubmission):
@@ -106,22 +328,7 @@ async def submit_quiz(submission: QuizSubmission):
         correct_rate = (submission.score / submission.total_questions) * 100 if submission.total_questions > 0 else 0
         print(f"[API] Correct rate: {correct_rate}%")
 
-        # セッション情報を保存
-        session_saved = insert_quiz_session(
-            session_id=session_id,
-            score=submission.score,
-            total_questions=submission.total_questions,
-            correct_rate=correct_rate,
-            user_id=submission.user_id
-        )
-
-        if not session_saved:
-            raise HTTPException(
-                status_code=500,
-                detail="Failed to save quiz session"
-            )
-
-        # 回答詳細を保存
+        # 回答詳細
         answers_data = [
             {
                 "session_id": session_id,
@@ -134,13 +341,70 @@ async def submit_quiz(submission: QuizSubmission):
             for answer in submission.answers
         ]
 
-        answers_saved = insert_quiz_answers(answers_data)
+        session = {
+            "session_id": session_id,
+            "user_id": submission.user_id,
+            "score": submission.score,
+            "total_questions": submission.total_questions,
+            "correct_rate": correct_rate
+        }
+
+        # write_behind モード: キューに入れた時点で受け付け完了とする（保存はバックグラウンドでまとめて行い、
+        # 集計は保存できた時点で record_saved が更新する）
+        if writer is not None:
+            try:
+                writer.submit((session, answers_data))
+            except QueueFull as e:
+                raise HTTPException(
+                    status_code=503,
+                    detail=f"Server is busy, try again later: {e}",
+                    headers={"Retry-After": "1"}
+                )
+            return QuizSubmissionResponse(
+                success=True,
+                message="クイズ結果を受け付けました",
+                session_id=session_id
+            )
 
-        if not answers_saved:
+        # spool モード: ローカルに書き込めた時点で受け付け完了とする（Snowflake の状態に左右されない）
+        # 集計は再送で保存できた時点で record_saved が更新する
+        if spool is not None:
+            try:
+                await run_in_threadpool(spool.append, (session, answers_data))
+            except OSError as e:
+                raise HTTPException(
+                    status_code=503,
+                    detail=f"Failed to spool quiz result: {e}",
+                    headers={"Retry-After": "1"}
+                )
+            return QuizSubmissionResponse(
+                success=True,
+                message="クイズ結果を受け付けました",
+                session_id=session_id
+            )
+
+        # bulk モード: ステージングファイルに書いた時点で受け付け完了とする（ロードはファイル単位、
+        # 集計はロードで挿入できた時点で record_saved が更新する）
+        if staging is not None:
+            await run_in_threadpool(staging.append, (session, answers_data))
+            return QuizSubmissionResponse(
+                success=True,
+                message="クイズ結果を受け付けました",
+                session_id=session_id
+            )
+
+        # セッション情報と回答詳細を1トランザクションで保存
+        latency_ms = await run_db("submit", save_quiz_submission, session=session, answers=answers_data)
+
+        if latency_ms is None:
             raise HTTPException(
                 status_code=500,
-                detail="Failed to save quiz answers"
+                detail="Failed to save quiz result"
             )
+        print(f"[API] Saved in {latency_ms:.1f} ms")
+        sessions_cache.invalidate()
+        if quiz_stats is not None:
+            quiz_stats.record(session, answers_data)
 
         return QuizSubmissionResponse(
             success=True,
@@ -157,27 +421,167 @@ async def submit_quiz(submission: QuizSubmission):
         )
 
 
+# 問題別の正答率とスコア分布を取得するエンドポイント
+@app.get("/api/quiz/stats")
+async def get_stats():
+    """
+    問題別の回答数・正答率とスコア分布を取得（メモリ上の集計を返すだけで DB には問い合わせない）
+
+    Returns:
+        dict: 集計結果
+    """
+    if quiz_stats is None:
+        raise HTTPException(status_code=503, detail="Stats are not available")
+    return {
+        "success": True,
+        "stats": quiz_stats.snapshot()
+    }
+
+
+def sessions_response(request: Request, payload: Dict[str, Any], etag: str) -> Response:
+    """If-None-Match が一致すれば 304、それ以外は ETag 付きの JSON を返す"""
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(payload, headers=headers)
+
+
+async def fetch_sessions_page(limit: int, after: Optional[Tuple[str, str]]) -> Dict[str, Any]:
+    """1ページ分のセッションと次ページのカーソル（取得に失敗したら例外のまま返し、キャッシュには入れない）"""
+    sessions = await run_db("sessions", get_quiz_sessions, limit=limit, after=after)
+    return jsonable_encoder({
+        "success": True,
+        "count": len(sessions),
+        "sessions": sessions,
+        "next_cursor": encode_cursor(sessions[-1]) if len(sessions) == limit else None
+    })
+
+
 # セッション一覧を取得するエンドポイント
 @app.get("/api/quiz/sessions")
-async def get_sessions(limit: int = 10):
+async def get_sessions(
+    request: Request,
+    limit: int = Query(10, ge=1, le=1000),
+    cursor: Optional[str] = None
+):
     """
-    クイズセッション一覧を取得
+    クイズセッション一覧を新しい順に取得
+    最新ページは短時間キャッシュし、ETag が一致すれば 304 を返す
 
     Args:
         limit: 取得件数（デフォルト: 10）
+        cursor: 前のレスポンスの next_cursor（省略時は最新ページ）
 
     Returns:
-        list: セッション情報のリスト
+        dict: セッション情報のリストと次ページのカーソル
     """
     try:
-        sessions = get_quiz_sessions(limit=limit)
-        return {
-            "success": True,
-            "count": len(sessions),
-            "sessions": sessions
-        }
+        if cursor is not None:
+            try:
+                after = decode_cursor(cursor)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+            payload = await fetch_sessions_page(limit, after)
+            return sessions_response(request, payload, make_etag(payload))
+
+        cached = sessions_cache.get(limit)
+        if cached is None:
+            # ポーリングが同時に来ても問い合わせは1回だけにする
+            async with sessions_cache_lock:
+                cached = sessions_cache.get(limit)
+                if cached is None:
+                    generation = sessions_cache.generation
+                    payload = await fetch_sessions_page(limit, None)
+                    cached = (sessions_cache.put(limit, payload, generation), payload)
+        etag, payload = cached
+        return sessions_response(request, payload, etag)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=500,
             detail=f"Failed to fetch sessions: {str(e)}"
         )
+
+
+# テーブルをストリーミングでエクスポートするエンドポイント
+@app.get("/api/export/{table}")
+async def export_table(
+    table: str,
+    format: str = "ndjson",
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None
+):
+    """
+    QUIZ_SESSIONS / QUIZ_ANSWERS / QUIZ_QUESTIONS を少しずつ読み出しながら返す（メモリ使用量はテーブルの大きさに依存しない）
+
+    Args:
+        table: "sessions" / "answers" / "questions"（db.EXPORT_TABLES のキー）
+        format: "ndjson" / "csv" / "arrow"（Arrow IPC ストリーム、pyarrow が必要）
+        start: この日時以降（completed_at / answered_at / created_at）
+        end: この日時より前
+
+    Returns:
+        StreamingResponse: チャンク転送のレスポンス
+    """
+    if table not in EXPORT_TABLES:
+        raise HTTPException(status_code=404, detail=f"Unknown table: {table} (expected one of {sorted(EXPORT_TABLES)})")
+    if format not in ENCODERS:
+        raise HTTPException(status_code=400, detail=f"Unknown format: {format} (expected one of {sorted(ENCODERS)})")
+    if format == "arrow" and not arrow_available():
+        raise HTTPException(status_code=400, detail="Arrow export requires pyarrow to be installed")
+    if export_slots.locked():
+        raise HTTPException(status_code=503, detail="Too many exports running", headers={"Retry-After": "5"})
+
+    await export_slots.acquire()
+    cancelled = threading.Event()
+    rows = iter_export(
+        table,
+        start=start.isoformat(sep=" ") if start else None,
+        end=end.isoformat(sep=" ") if end else None,
+        arrow=format == "arrow",
+        cancelled=cancelled
+    )
+    try:
+        # 最初の1回（クエリの実行）はレスポンスを返す前に行い、失敗を 500 で返せるようにする
+        columns = await run_in_threadpool(next, rows)
+    except Exception as e:
+        export_slots.release()
+        raise HTTPException(status_code=500, detail=f"Failed to export {table}: {str(e)}")
+
+    chunks = ENCODERS[format](columns, rows)
+    # ジェネレーターはワーカースレッドでしか触らない（実行中の next() と close() が重ならないようにする）
+    generator_lock = threading.Lock()
+    done = object()
+
+    def pull():
+        with generator_lock:
+            return next(chunks, done)
+
+    def close():
+        cancelled.set()  # 実行中の next() は次の fetchmany の前で打ち切られる
+        with generator_lock:
+            chunks.close()
+            rows.close()  # カーソルを閉じて接続をプールに返す
+
+    async def stream():
+        try:
+            while True:
+                chunk = await run_in_threadpool(pull)
+                if chunk is done:
+                    break
+                yield chunk
+        finally:
+            # 切断でキャンセルされていても、接続を返し終えてから枠を空ける
+            with anyio.CancelScope(shield=True):
+                try:
+                    await run_in_threadpool(close)
+                finally:
+                    export_slots.release()
+
+    filename = f"quiz_{table}.{'arrow' if format == 'arrow' else format}"
+    return StreamingResponse(
+        stream(),
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
@@ -0,0 +1,99 @@
+"""
+QUIZ_ANSWERS の問題文を QUIZ_QUESTIONS に移すマイグレーションスクリプト
+  1. QUIZ_QUESTIONS テーブルと QUIZ_ANSWERS.question_hash 列を作成（既にあれば何もしない）
+  2. 既存の回答の (question_id, question_text) から QUIZ_QUESTIONS を作成
+  3. 回答に question_hash を入れ、question_text を NULL にする
+何度実行しても同じ結果になる（移行済みの行は対象外）
+"""
+
+from db import ensure_questions, get_backend, get_connection, question_hash
+
+
+def add_question_hash_column(conn) -> bool:
+    """
+    QUIZ_ANSWERS に question_hash 列が無ければ追加
+
+    Returns:
+        bool: 追加した場合 True
+    """
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT question_hash FROM QUIZ_ANSWERS WHERE 1 = 0")
+        return False
+    except Exception:
+        conn.rollback()
+        cursor.execute("ALTER TABLE QUIZ_ANSWERS ADD COLUMN question_hash VARCHAR(16)")
+        conn.commit()
+        return True
+    finally:
+        cursor.close()
+
+
+def backfill_questions(conn) -> tuple:
+    """
+    旧形式の回答から QUIZ_QUESTIONS を作成し、回答を問題IDとハッシュだけにする
+
+    Returns:
+        tuple: (登録した問題数, 移行した回答数)
+    """
+    cursor = conn.cursor()
+    try:
+        cursor.execute("""
+            SELECT DISTINCT question_id, question_text
+            FROM QUIZ_ANSWERS
+            WHERE question_hash IS NULL AND question_text IS NOT NULL
+        """)
+        questions = [{"question_id": row[0], "question_text": row[1]} for row in cursor.fetchall()]
+        if not questions:
+            return 0, 0
+
+        # 先に問題を登録してから回答を書き換える（途中で止まっても再実行で続きから移行できる）
+        registered = ensure_questions(conn, questions)
+
+        migrated = 0
+        cursor.execute("BEGIN")
+        for question in questions:
+            cursor.execute(
+                """
+                UPDATE QUIZ_ANSWERS
+                SET question_hash = %s, question_text = NULL
+                WHERE question_id = %s AND question_text = %s AND question_hash IS NULL
+                """,
+                (question_hash(question["question_text"]), question["question_id"], question["question_text"])
+            )
+            migrated += max(cursor.rowcount or 0, 0)
+        conn.commit()
+        return registered, migrated
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+def main():
+    """メイン処理"""
+    print("=" * 50)
+    print("問題テーブルへの移行")
+    print("=" * 50)
+
+    backend = get_backend()
+    print(f"\n1. テーブル作成中... ({backend.name})")
+    backend.create_tables()
+    with get_connection() as conn:
+        if add_question_hash_column(conn):
+            print("✅ QUIZ_ANSWERS.question_hash を追加しました")
+        else:
+            print("✅ QUIZ_ANSWERS.question_hash は作成済みです")
+
+        print("\n2. 既存の回答を移行中...")
+        registered, migrated = backfill_questions(conn)
+        print(f"✅ 問題 {registered} 件を登録、回答 {migrated} 件を移行しました")
+
+    print("\n" + "=" * 50)
+    print("移行完了！")
+    print("=" * 50)
+
+
+if __name__ == "__main__":
+    main()
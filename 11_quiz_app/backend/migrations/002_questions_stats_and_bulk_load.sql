@@ -0,0 +1,45 @@
+-- 問題テーブル・集計テーブル・一括ロードの記録の追加
+-- 注意: {DATABASE} と {SCHEMA} は migrator.py によって connection.toml の値に置換されます
+-- 適用済みのファイルは編集しないこと（変更は次の番号のファイルを追加する）
+
+-- 1. 問題テーブル
+-- 問題文は問題IDと内容のハッシュごとに1行だけ持つ（問題文が変わればハッシュが変わり新しい行になる）
+CREATE TABLE IF NOT EXISTS {DATABASE}.{SCHEMA}.QUIZ_QUESTIONS (
+    question_id INTEGER NOT NULL,                 -- 問題ID
+    content_hash VARCHAR(16) NOT NULL,            -- 問題文の SHA-256 の先頭16文字
+    question_text VARCHAR(1000),                  -- 問題文
+    created_at TIMESTAMP_NTZ DEFAULT CURRENT_TIMESTAMP(),  -- 登録日時
+    PRIMARY KEY (question_id, content_hash)
+);
+
+-- 2. 回答から問題への参照
+-- 問題文のハッシュ（QUIZ_QUESTIONS.content_hash）。既存の回答の question_text は migrate_questions.py で移す
+-- （migrate_questions.py で追加済みの場合もあるため IF NOT EXISTS）
+ALTER TABLE {DATABASE}.{SCHEMA}.QUIZ_ANSWERS ADD COLUMN IF NOT EXISTS question_hash VARCHAR(16);
+
+-- 3. 問題別の集計テーブル
+-- API が保持している集計を定期的に書き出したもの（全件の GROUP BY をせずに参照するため）
+CREATE TABLE IF NOT EXISTS {DATABASE}.{SCHEMA}.QUIZ_QUESTION_STATS (
+    question_id INTEGER PRIMARY KEY,              -- 問題ID
+    attempts INTEGER NOT NULL,                    -- 回答数
+    correct INTEGER NOT NULL,                     -- 正解数
+    updated_at TIMESTAMP_NTZ DEFAULT CURRENT_TIMESTAMP()  -- 更新日時
+);
+
+-- 4. スコア分布の集計テーブル
+CREATE TABLE IF NOT EXISTS {DATABASE}.{SCHEMA}.QUIZ_SCORE_STATS (
+    total_questions INTEGER NOT NULL,             -- 総問題数
+    score INTEGER NOT NULL,                       -- 正解数
+    sessions INTEGER NOT NULL,                    -- セッション数
+    updated_at TIMESTAMP_NTZ DEFAULT CURRENT_TIMESTAMP(),  -- 更新日時
+    PRIMARY KEY (total_questions, score)
+);
+
+-- 5. 一括ロードの記録
+-- ステージングしたバッチごとに1行。同じバッチを2回ロードしないために参照する
+CREATE TABLE IF NOT EXISTS {DATABASE}.{SCHEMA}.QUIZ_LOAD_BATCHES (
+    batch_id VARCHAR(64) PRIMARY KEY,             -- バッチID（ステージングファイル名）
+    sessions INTEGER NOT NULL,                    -- ロードしたセッション数
+    answers INTEGER NOT NULL,                     -- ロードした回答数
+    loaded_at TIMESTAMP_NTZ DEFAULT CURRENT_TIMESTAMP()   -- ロード日時
+);
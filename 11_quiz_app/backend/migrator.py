@@ -0,0 +1,207 @@
+"""
+スキーマのマイグレーション
+migrations/ の SQL ファイル（001_名前.sql のように番号で始まる）を番号順に適用し、
+適用したバージョンとファイルのチェックサムを SCHEMA_MIGRATIONS に記録する
+  - 適用済みのファイルは実行しない（変更がなければ履歴の SELECT 1回で終わる）
+  - 文の分割は sqlglot のトークナイザーで行う（文字列やコメントの中の ; では分割しない）
+  - 未適用の文と履歴の記録はまとめて backend.execute_script() に渡す（Snowflake では1回のリクエスト）
+"""
+
+import hashlib
+import re
+from pathlib import Path
+from typing import Any, Dict, List
+
+import sqlglot
+from sqlglot.tokens import TokenType
+
+MIGRATIONS_DIR = Path(__file__).parent / "migrations"
+HISTORY_TABLE = "SCHEMA_MIGRATIONS"
+
+_FILE_PATTERN = re.compile(r"^(\d+)_(\w+)\.sql$")
+
+# 履歴テーブルが無いときのエラー（SQLite: no such table / Snowflake: 002003 does not exist）
+_MISSING_TABLE_ERRNO = 2003
+_MISSING_TABLE_MESSAGES = ("no such table", "does not exist")
+
+# 初回だけ実行する（スキーマと履歴テーブルの作成）
+_BOOTSTRAP_SQL = """
+CREATE SCHEMA IF NOT EXISTS {DATABASE}.{SCHEMA};
+CREATE TABLE IF NOT EXISTS {DATABASE}.{SCHEMA}.SCHEMA_MIGRATIONS (
+    version INTEGER PRIMARY KEY,                  -- ファイル名の番号
+    name VARCHAR(200) NOT NULL,                   -- ファイル名の番号以降
+    checksum VARCHAR(64) NOT NULL,                -- ファイル内容の SHA-256
+    applied_at TIMESTAMP_NTZ DEFAULT CURRENT_TIMESTAMP()  -- 適用日時
+);
+"""
+
+
+class MigrationError(Exception):
+    """マイグレーションファイルの不整合（適用済みのファイルの変更、番号の重複）"""
+
+
+class Migration:
+    """
+    マイグレーションファイル1つ
+
+    Attributes:
+        version: ファイル名の番号
+        name: ファイル名の番号以降（拡張子なし）
+        sql: ファイルの内容（{DATABASE} / {SCHEMA} は置換前）
+        checksum: ファイル内容の SHA-256
+    """
+
+    def __init__(self, path: Path):
+        match = _FILE_PATTERN.match(path.name)
+        if match is None:
+            raise MigrationError(f"Invalid migration file name: {path.name}")
+        self.path = path
+        self.version = int(match.group(1))
+        self.name = match.group(2)
+        self.sql = path.read_text(encoding="utf-8")
+        self.checksum = hashlib.sha256(self.sql.encode("utf-8")).hexdigest()
+
+    def __repr__(self) -> str:
+        return f"Migration({self.version:03d}_{self.name})"
+
+
+def discover(directory: Path = MIGRATIONS_DIR) -> List[Migration]:
+    """
+    ディレクトリのマイグレーションファイルを番号順に返す
+
+    Raises:
+        MigrationError: 同じ番号のファイルが複数ある
+    """
+    migrations = sorted(
+        (Migration(path) for path in Path(directory).glob("*.sql") if _FILE_PATTERN.match(path.name)),
+        key=lambda migration: migration.version
+    )
+    for previous, current in zip(migrations, migrations[1:]):
+        if previous.version == current.version:
+            raise MigrationError(f"Duplicate migration version {current.version}: {previous.path.name}, {current.path.name}")
+    return migrations
+
+
+def render(sql: str, database: str = "", schema: str = "") -> str:
+    """{DATABASE} と {SCHEMA} を実際の値で置換（database が空なら {DATABASE}.{SCHEMA}. の修飾ごと外す）"""
+    if not database:
+        sql = sql.replace("{DATABASE}.{SCHEMA}.", "")
+    return sql.replace("{DATABASE}", database).replace("{SCHEMA}", schema)
+
+
+def split_statements(sql: str, dialect: str = "snowflake") -> List[str]:
+    """
+    SQL を文ごとに分割する（文の前後のコメントと末尾の ; は含めない）
+
+    Args:
+        sql: 複数の文を含む SQL
+        dialect: トークナイズに使う sqlglot の方言
+
+    Returns:
+        list: 文のリスト（元の SQL の文字列をそのまま切り出したもの）
+    """
+    statements = []
+    start = end = None
+    for token in sqlglot.Dialect.get_or_raise(dialect).tokenize(sql):
+        if token.token_type == TokenType.SEMICOLON:
+            if start is not None:
+                statements.append(sql[start:end + 1])
+            start = end = None
+            continue
+        if start is None:
+            start = token.start
+        end = token.end
+    if start is not None:
+        statements.append(sql[start:end + 1])
+    return statements
+
+
+def history_table(database: str = "", schema: str = "") -> str:
+    return f"{database}.{schema}.{HISTORY_TABLE}" if database else HISTORY_TABLE
+
+
+def is_missing_table(error: Exception) -> bool:
+    """履歴テーブル（またはスキーマ）が無いことによるエラーか"""
+    if getattr(error, "errno", None) == _MISSING_TABLE_ERRNO:
+        return True
+    message = str(error).lower()
+    return any(text in message for text in _MISSING_TABLE_MESSAGES)
+
+
+def applied_versions(conn, database: str = "", schema: str = "") -> Dict[int, str]:
+    """
+    適用済みのバージョンとチェックサム
+
+    Raises:
+        Exception: 履歴テーブルが無い（初回）、または接続・権限などのエラー
+    """
+    cursor = conn.cursor()
+    try:
+        cursor.execute(f"SELECT version, checksum FROM {history_table(database, schema)}")
+        return {int(version): checksum for version, checksum in cursor.fetchall()}
+    finally:
+        cursor.close()
+
+
+def migrate(backend: Any, conn, database: str = "", schema: str = "", directory: Path = MIGRATIONS_DIR) -> List[Migration]:
+    """
+    未適用のマイグレーションを番号順に適用する
+
+    Args:
+        backend: 文の実行に使う StorageBackend（execute_script）
+        conn: 接続
+        database: {DATABASE} に入れる値（SQLite は空文字）
+        schema: {SCHEMA} に入れる値（SQLite は空文字）
+        directory: マイグレーションファイルのディレクトリ
+
+    Returns:
+        list: 今回適用したマイグレーション（変更がなければ空）
+
+    Raises:
+        MigrationError: 適用済みのファイルの内容が変わっている
+        Exception: 履歴の取得に失敗した（履歴テーブルが無い場合を除く）
+    """
+    migrations = discover(directory)
+    statements: List[str] = []
+    try:
+        applied = applied_versions(conn, database, schema)
+    except Exception as e:
+        conn.rollback()
+        # 一時的なエラーで全マイグレーションを再適用しないよう、初回（履歴テーブルが無い）だけ作成する
+        if not is_missing_table(e):
+            raise
+        applied = {}
+        statements.extend(split_statements(render(_BOOTSTRAP_SQL, database, schema)))
+
+    pending = []
+    for migration in migrations:
+        checksum = applied.get(migration.version)
+        if checksum is None:
+            pending.append(migration)
+        elif checksum != migration.checksum:
+            raise MigrationError(
+                f"Applied migration {migration.path.name} has been modified "
+                "(add a new migration file instead of editing an applied one)"
+            )
+    if not pending and not statements:
+        return []
+
+    history = history_table(database, schema)
+    for migration in pending:
+        statements.extend(split_statements(render(migration.sql, database, schema)))
+        # 番号・名前・チェックサムはファイル名と SHA-256 から作った値なのでそのまま埋め込める
+        statements.append(
+            f"INSERT INTO {history} (version, name, checksum) "
+            f"VALUES ({migration.version}, '{migration.name}', '{migration.checksum}')"
+        )
+
+    cursor = conn.cursor()
+    try:
+        backend.execute_script(cursor, statements)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+    return pending
@@ -0,0 +1,267 @@
+"""
+スレッドセーフなデータベース接続プール
+接続の使い回し・生存確認・寿命によるリサイクル・取得待ちタイムアウトを行う
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+
+class PoolTimeout(Exception):
+    """接続の取得待ちがタイムアウトした"""
+
+
+class PoolClosed(Exception):
+    """クローズ済みのプールから接続を取得しようとした"""
+
+
+@dataclass
+class PooledConnection:
+    """プール内の接続と、その作成・最終利用時刻"""
+    conn: Any
+    created_at: float = field(default_factory=time.monotonic)
+    last_used: float = field(default_factory=time.monotonic)
+
+
+class ConnectionPool:
+    """
+    接続プール
+
+    Args:
+        connect: 新しい接続を作成する関数
+        min_size: open() 時に作成しておく接続数
+        max_size: 同時に存在できる接続の最大数
+        max_lifetime: 接続の最大寿命（秒）。超えた接続は返却時・取得時に作り直す
+        validate_after: この秒数以上アイドルだった接続は取得時に生存確認する
+        wait_timeout: 接続が空くまで待つ最大秒数
+        validate: 接続が使えるかを確認する関数（False または例外で破棄）
+        close: 接続をクローズする関数
+    """
+
+    def __init__(
+        self,
+        connect: Callable[[], Any],
+        min_size: int = 1,
+        max_size: int = 5,
+        max_lifetime: float = 3600.0,
+        validate_after: float = 60.0,
+        wait_timeout: float = 10.0,
+        validate: Optional[Callable[[Any], bool]] = None,
+        close: Optional[Callable[[Any], None]] = None
+    ):
+        self._connect = connect
+        self.min_size = min_size
+        self.max_size = max(max_size, 1)
+        self.max_lifetime = max_lifetime
+        self.validate_after = validate_after
+        self.wait_timeout = wait_timeout
+        self._validate = validate
+        self._close = close or (lambda conn: conn.close())
+
+        self._idle: List[PooledConnection] = []
+        self._size = 0  # 作成済み（作成中を含む）の接続数
+        self._closed = False
+        self._cond = threading.Condition()
+
+        # 統計情報
+        self._waiting = 0
+        self._stats = {
+            "acquired": 0,
+            "created": 0,
+            "recycled": 0,
+            "invalidated": 0,
+            "timeouts": 0,
+            "wait_ms_total": 0.0,
+            "wait_ms_max": 0.0,
+        }
+
+    def open(self) -> None:
+        """min_size 個の接続を作成してプールに入れる"""
+        for _ in range(self.min_size):
+            with self._cond:
+                if self._size >= self.max_size:
+                    break
+                self._size += 1
+            item = self._create()
+            with self._cond:
+                self._idle.append(item)
+                self._cond.notify()
+
+    def _create(self) -> PooledConnection:
+        """接続を作成する（呼び出し側で _size を確保済みであること）"""
+        try:
+            conn = self._connect()
+        except BaseException:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self._stats["created"] += 1
+        return PooledConnection(conn=conn)
+
+    def _discard(self, item: PooledConnection, reason: str) -> None:
+        """接続をクローズしてプールから外す"""
+        try:
+            self._close(item.conn)
+        except Exception as e:
+            print(f"[POOL] Error closing connection: {e}")
+        with self._cond:
+            self._size -= 1
+            self._stats[reason] += 1
+            self._cond.notify()
+
+    def _expired(self, item: PooledConnection, now: float) -> bool:
+        return bool(self.max_lifetime) and now - item.created_at > self.max_lifetime
+
+    def _is_alive(self, item: PooledConnection, now: float) -> bool:
+        """しばらく使われていない接続だけ生存確認する"""
+        if self._validate is None or now - item.last_used < self.validate_after:
+            return True
+        try:
+            return bool(self._validate(item.conn))
+        except Exception:
+            return False
+
+    def acquire(self, timeout: Optional[float] = None) -> PooledConnection:
+        """
+        接続を1つ取り出す
+
+        Args:
+            timeout: 待ち時間の上限（秒）。None なら wait_timeout
+
+        Raises:
+            PoolTimeout: 時間内に接続が空かなかった
+            PoolClosed: プールがクローズ済み
+        """
+        timeout = self.wait_timeout if timeout is None else timeout
+        started = time.monotonic()
+        deadline = started + timeout
+
+        while True:
+            item = None
+            with self._cond:
+                while True:
+                    if self._closed:
+                        raise PoolClosed("Connection pool is closed")
+                    if self._idle:
+                        # 最近使った接続から使う（古いアイドル接続は寿命で自然に減る）
+                        item = self._idle.pop()
+                        break
+                    if self._size < self.max_size:
+                        self._size += 1
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats["timeouts"] += 1
+                        raise PoolTimeout(
+                            f"No connection available within {timeout:g}s (max_size={self.max_size})"
+                        )
+                    self._waiting += 1
+                    try:
+                        self._cond.wait(remaining)
+                    finally:
+                        self._waiting -= 1
+
+            if item is None:
+                item = self._create()
+            else:
+                now = time.monotonic()
+                if self._expired(item, now):
+                    self._discard(item, "recycled")
+                    continue
+                if not self._is_alive(item, now):
+                    self._discard(item, "invalidated")
+                    continue
+
+            waited_ms = (time.monotonic() - started) * 1000
+            with self._cond:
+                self._stats["acquired"] += 1
+                self._stats["wait_ms_total"] += waited_ms
+                self._stats["wait_ms_max"] = max(self._stats["wait_ms_max"], waited_ms)
+            return item
+
+    def release(self, item: PooledConnection, broken: bool = False) -> None:
+        """
+        接続をプールに返す
+
+        Args:
+            item: acquire() で取得した接続
+            broken: True なら再利用せずに破棄する
+        """
+        now = time.monotonic()
+        if broken or self._closed:
+            self._discard(item, "invalidated" if broken else "recycled")
+            return
+        if self._expired(item, now):
+            self._discard(item, "recycled")
+            return
+        item.last_used = now
+        with self._cond:
+            self._idle.append(item)
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self, timeout: Optional[float] = None):
+        """
+        with 文で接続を借りるコンテキストマネージャー
+
+        Yields:
+            プールから取得した接続オブジェクト
+        """
+        item = self.acquire(timeout)
+        try:
+            yield item.conn
+        except BaseException:
+            # 途中で失敗した場合は未確定のトランザクションを戻してから返却（戻せなければ破棄）
+            self.release(item, broken=not _rollback(item.conn))
+            raise
+        else:
+            self.release(item)
+
+    def close(self) -> None:
+        """
+        プールを閉じる（アイドル接続をクローズし、使用中の接続は返却時にクローズ）
+        """
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._cond.notify_all()
+        for item in idle:
+            self._discard(item, "recycled")
+
+    def stats(self) -> Dict[str, Any]:
+        """モニタリング用の統計情報"""
+        with self._cond:
+            acquired = self._stats["acquired"]
+            return {
+                "size": self._size,
+                "idle": len(self._idle),
+                "in_use": self._size - len(self._idle),
+                "waiting": self._waiting,
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+                "closed": self._closed,
+                "acquired": acquired,
+                "created": self._stats["created"],
+                "recycled": self._stats["recycled"],
+                "invalidated": self._stats["invalidated"],
+                "timeouts": self._stats["timeouts"],
+                "wait_ms_avg": round(self._stats["wait_ms_total"] / acquired, 3) if acquired else 0.0,
+                "wait_ms_max": round(self._stats["wait_ms_max"], 3),
+            }
+
+
+def _rollback(conn: Any) -> bool:
+    """ロールバックして再利用できる状態に戻す。失敗したら False"""
+    try:
+        is_closed = getattr(conn, "is_closed", None)
+        if callable(is_closed) and is_closed():
+            return False
+        conn.rollback()
+        return True
+    except Exception:
+        return False
@@ -0,0 +1,352 @@
+"""
+クイズ結果のローカルスプール（追記専用ファイル）と再送スレッド
+送信はまずローカルファイルに追記・fsync してから受け付け、
+バックグラウンドの再送スレッドが Snowflake が応答する時にまとめて書き込む
+何度書いても保存できない送信は quarantine.jsonl に移し、再送を止めない
+"""
+
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from writer import Submission, write_bisecting
+
+DEFAULT_SPOOL_DIR = Path(__file__).parent / "spool"
+SEGMENT_PREFIX = "spool-"
+SEGMENT_SUFFIX = ".jsonl"
+QUARANTINE_FILE = "quarantine.jsonl"  # 保存できなかった送信（セグメントとしては扱わない）
+
+
+def _fsync_dir(directory: Path) -> None:
+    """ファイルの作成・削除をディレクトリエントリごと永続化する"""
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class Spool:
+    """
+    追記専用のスプール
+    送信1件を JSON 1行としてセグメントファイルに追記する。
+    同時に追記したスレッドは1回の fsync をまとめて共有する（グループコミット）
+
+    Args:
+        directory: セグメントファイルを置くディレクトリ
+        fsync: False なら fsync しない（テスト・開発用）
+    """
+
+    def __init__(self, directory: Path = DEFAULT_SPOOL_DIR, fsync: bool = True):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.fsync = fsync
+        self._lock = threading.Lock()       # 書き込み・セグメント切り替え
+        self._sync_lock = threading.Lock()  # fsync（_lock より先に取る）
+        existing = self.segments()
+        # 再起動後は前回のセグメントに追記しない（末尾が途中で切れている可能性があるため）
+        self._seq = self._segment_seq(existing[-1]) + 1 if existing else 1
+        self._file = self._open(self._seq)
+        self._written = 0  # 追記した件数（通し番号）
+        self._synced = 0   # fsync 済みの件数
+        self._stats = {"appended": 0, "fsyncs": 0, "bytes": 0}
+
+    def _path(self, seq: int) -> Path:
+        return self.directory / f"{SEGMENT_PREFIX}{seq:012d}{SEGMENT_SUFFIX}"
+
+    @staticmethod
+    def _segment_seq(path: Path) -> int:
+        return int(path.name[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)])
+
+    def _open(self, seq: int):
+        f = open(self._path(seq), "ab")
+        if self.fsync:
+            _fsync_dir(self.directory)
+        return f
+
+    def segments(self) -> List[Path]:
+        """全セグメントファイル（古い順）"""
+        return sorted(self.directory.glob(f"{SEGMENT_PREFIX}*{SEGMENT_SUFFIX}"))
+
+    def append(self, submission: Submission) -> None:
+        """
+        送信を追記し、ディスクに書き込まれるまで待つ
+
+        Args:
+            submission: (セッション情報, 回答データのリスト)
+        """
+        line = self._encode(submission)
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+            self._written += 1
+            ticket = self._written
+            self._stats["appended"] += 1
+            self._stats["bytes"] += len(line)
+        self._sync(ticket)
+
+    @staticmethod
+    def _encode(submission: Submission) -> bytes:
+        session, answers = submission
+        return (json.dumps({"session": session, "answers": answers}, ensure_ascii=False) + "\n").encode("utf-8")
+
+    def _sync(self, ticket: int) -> None:
+        """ticket 番目までの追記を fsync（他のスレッドの fsync で済んでいれば何もしない）"""
+        if not self.fsync:
+            return
+        with self._sync_lock:
+            if self._synced >= ticket:
+                return
+            with self._lock:
+                target = self._written
+                f = self._file
+            os.fsync(f.fileno())
+            self._synced = target
+            self._stats["fsyncs"] += 1
+
+    def rotate(self) -> bool:
+        """
+        書き込み中のセグメントを閉じて新しいセグメントに切り替える
+
+        Returns:
+            bool: 切り替えた場合 True（書き込み中のセグメントが空なら何もしない）
+        """
+        with self._sync_lock, self._lock:
+            if self._file.tell() == 0:
+                return False
+            if self.fsync:
+                os.fsync(self._file.fileno())
+            self._synced = self._written
+            self._file.close()
+            self._seq += 1
+            self._file = self._open(self._seq)
+            return True
+
+    def sealed_segments(self) -> List[Path]:
+        """書き込みが終わった（再送してよい）セグメント（古い順）"""
+        return [path for path in self.segments() if self._segment_seq(path) < self._seq]
+
+    @staticmethod
+    def read_segment(path: Path) -> List[Submission]:
+        """
+        セグメントの送信を読み込む（途中で切れた行・壊れた行は読み飛ばす）
+        """
+        submissions: List[Submission] = []
+        with open(path, "rb") as f:
+            for number, line in enumerate(f, start=1):
+                try:
+                    record = json.loads(line)
+                    submissions.append((record["session"], record["answers"]))
+                except (ValueError, KeyError, TypeError):
+                    print(f"[SPOOL] Skipping unreadable line {number} in {path.name}")
+        return submissions
+
+    def rewrite(self, path: Path, submissions: List[Submission]) -> None:
+        """再送し終わっていない送信だけでセグメントを書き直す（一時ファイルに書いてから置き換える）"""
+        tmp = path.with_suffix(".tmp")
+        with open(tmp, "wb") as f:
+            f.writelines(self._encode(submission) for submission in submissions)
+            if self.fsync:
+                os.fsync(f.fileno())
+        os.replace(tmp, path)
+        if self.fsync:
+            _fsync_dir(self.directory)
+
+    def quarantine(self, submissions: List[Submission]) -> None:
+        """保存できない送信を quarantine.jsonl に追記（調査・手動での再投入用）"""
+        with open(self.directory / QUARANTINE_FILE, "ab") as f:
+            f.writelines(self._encode(submission) for submission in submissions)
+            if self.fsync:
+                os.fsync(f.fileno())
+
+    def remove(self, path: Path) -> None:
+        """再送が終わったセグメントを削除"""
+        path.unlink()
+        if self.fsync:
+            _fsync_dir(self.directory)
+
+    def close(self) -> None:
+        with self._sync_lock, self._lock:
+            if self.fsync:
+                os.fsync(self._file.fileno())
+            self._file.close()
+
+    def stats(self) -> Dict[str, Any]:
+        """モニタリング用の統計情報"""
+        pending_bytes = 0
+        segments = self.segments()
+        for path in segments:
+            try:
+                pending_bytes += path.stat().st_size
+            except FileNotFoundError:
+                pass  # 再送が終わって削除された
+        with self._lock:
+            return {**self._stats, "segments": len(segments), "pending_bytes": pending_bytes}
+
+
+class SpoolReplayer:
+    """
+    スプールを Snowflake に流し込むバックグラウンドスレッド
+
+    失敗したバッチは半分ずつに分けて書き直し（writer.write_bisecting）、書けなかった送信だけを
+    セグメントに残して次のセグメントに進む。他の送信は書けているのに max_attempts 回失敗した
+    送信は quarantine.jsonl に移す（どの送信も書けないときは DB 側の障害とみなし、
+    既に単独で失敗したことのある送信以外は回数に数えない）
+
+    Args:
+        spool: 再送するスプール
+        flush: 送信のリストを保存する関数（成功時 True、保存済みの session_id は飛ばすこと）
+        max_batch: 1回の書き込みにまとめる最大件数
+        interval: スプールを確認する間隔（秒）
+        max_backoff: 書き込み失敗が続いたときの最大待ち時間（秒）
+        max_attempts: quarantine.jsonl に移すまでの失敗回数
+    """
+
+    def __init__(
+        self,
+        spool: Spool,
+        flush: Callable[[List[Submission]], bool],
+        max_batch: int = 1000,
+        interval: float = 1.0,
+        max_backoff: float = 60.0,
+        max_attempts: int = 3
+    ):
+        self.spool = spool
+        self._flush = flush
+        self.max_batch = max(max_batch, 1)
+        self.interval = interval
+        self.max_backoff = max_backoff
+        self.max_attempts = max(max_attempts, 1)
+        self._attempts: Dict[str, int] = {}  # session_id -> 他の送信が書けた中で単独で失敗した回数
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._failures_in_row = 0
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            "replayed": 0,
+            "batches": 0,
+            "failures": 0,
+            "quarantined": 0,
+            "last_replay_at": None,
+        }
+
+    def start(self) -> None:
+        """再送スレッドを開始"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="quiz-spool-replayer", daemon=True)
+            self._thread.start()
+
+    def replay_once(self) -> bool:
+        """
+        書き込みが終わったセグメントを古い順に再送し、成功したものを削除する
+        書き込み中のセグメントは先に切り替えて今回の対象に含める
+
+        Returns:
+            bool: すべて成功した場合 True（書けなかった送信はセグメントに残して次回やり直す）
+        """
+        # 書けない送信を残したセグメントがあっても、新しい送信は毎回切り替えて再送の対象にする
+        self.spool.rotate()
+        segments = self.spool.sealed_segments()
+        reached_db = False  # 1件でも書き込めたか
+        pending = []  # (セグメント, 元の件数, 書けなかった送信, そのうち単独で失敗した送信)
+        for path in segments:
+            submissions = self.spool.read_segment(path)
+            failed: List[Submission] = []
+            isolated: List[Submission] = []
+            for start in range(0, len(submissions), self.max_batch):
+                written, batch_failed = write_bisecting(self._write, submissions[start:start + self.max_batch])
+                reached_db = reached_db or written
+                failed += batch_failed
+                if batch_failed and not written:
+                    # 何も書けない: 先頭の1件だけ試した状態で、このセグメントの残りは次回に回す
+                    isolated.append(batch_failed[0])
+                    failed += submissions[start + self.max_batch:]
+                    break
+                isolated += batch_failed
+            if failed:
+                pending.append((path, len(submissions), failed, isolated))
+            else:
+                self.spool.remove(path)
+
+        done = True
+        for path, count, failed, isolated in pending:
+            if not reached_db:
+                # 何も書けなかった: 以前に他の送信が書けた中で失敗した送信だけを数える
+                # （障害中でも、残った1件が原因の送信なら隔離されるように）
+                isolated = [submission for submission in isolated if self._key(submission) in self._attempts]
+            poison = self._count_failures(isolated)
+            if poison:
+                self.spool.quarantine(poison)
+                quarantined = {id(submission) for submission in poison}
+                failed = [submission for submission in failed if id(submission) not in quarantined]
+            if not failed:
+                self.spool.remove(path)
+                continue
+            done = False
+            if len(failed) < count:
+                self.spool.rewrite(path, failed)  # 保存済み・隔離済みの分を次回読み直さない
+        return done
+
+    def _write(self, batch: List[Submission]) -> bool:
+        ok = self._flush(batch)
+        with self._stats_lock:
+            if ok:
+                self._stats["replayed"] += len(batch)
+                self._stats["batches"] += 1
+                self._stats["last_replay_at"] = time.time()
+            else:
+                self._stats["failures"] += 1
+        return ok
+
+    @staticmethod
+    def _key(submission: Submission) -> str:
+        return str(submission[0].get("session_id"))
+
+    def _count_failures(self, isolated: List[Submission]) -> List[Submission]:
+        """単独で失敗した回数を数え、max_attempts に達した送信（隔離するもの）を返す"""
+        poison = []
+        for submission in isolated:
+            session_id = self._key(submission)
+            attempts = self._attempts.get(session_id, 0) + 1
+            if attempts < self.max_attempts:
+                self._attempts[session_id] = attempts
+                continue
+            self._attempts.pop(session_id, None)
+            poison.append(submission)
+            print(f"[SPOOL] Quarantining submission {session_id} after {attempts} failed writes")
+        with self._stats_lock:
+            self._stats["quarantined"] += len(poison)
+        return poison
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                ok = self.replay_once()
+            except Exception as e:
+                print(f"[SPOOL] Replay error: {e}")
+                ok = False
+            if ok:
+                self._failures_in_row = 0
+                wait = self.interval
+            else:
+                # Snowflake が応答しない間は間隔を延ばす
+                self._failures_in_row += 1
+                wait = min(self.interval * (2 ** self._failures_in_row), self.max_backoff)
+            self._stop.wait(wait)
+
+    def stop(self, timeout: Optional[float] = 30.0) -> None:
+        """
+        再送スレッドを止める（未送信の分はスプールに残り、次回起動時に再送される）
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def stats(self) -> Dict[str, Any]:
+        """モニタリング用の統計情報"""
+        with self._stats_lock:
+            return {**self._stats, "failures_in_row": self._failures_in_row, "spool": self.spool.stats()}
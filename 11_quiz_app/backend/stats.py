@@ -0,0 +1,162 @@
+"""
+問題別の正答率とスコア分布をメモリ上で逐次集計する
+起動時に DB 全体から集計をやり直し、受け付けた送信ごとにカウンターを進め、
+定期的に集計テーブルへ書き出す（/api/quiz/stats は集計済みの値を返すだけ）
+"""
+
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+StatsRows = Tuple[List[tuple], List[tuple]]  # (問題別の行, スコア分布の行)
+
+
+class QuizStats:
+    """
+    問題別・スコア別のカウンター
+
+    Args:
+        rebuild: DB 全体から集計する関数（起動時）
+        load: 集計テーブルから読み込む関数（rebuild に失敗したとき）
+        save: 集計テーブルへ書き出す関数
+        persist_interval: 書き出しの間隔（秒）
+    """
+
+    def __init__(
+        self,
+        rebuild: Callable[[], StatsRows],
+        load: Callable[[], StatsRows],
+        save: Callable[[List[tuple], List[tuple]], None],
+        persist_interval: float = 60.0
+    ):
+        self._rebuild = rebuild
+        self._load = load
+        self._save = save
+        self.persist_interval = persist_interval
+        self._lock = threading.Lock()
+        self._questions: Dict[int, List[int]] = {}       # question_id -> [attempts, correct]
+        self._scores: Dict[Tuple[int, int], int] = {}    # (total_questions, score) -> sessions
+        self._version = 0            # record() のたびに増える
+        self._persisted_version = 0
+        self._snapshot: Optional[Dict[str, Any]] = None
+        self.source: Optional[str] = None  # "rebuild" / "table" / None（空から開始）
+        self.persisted_at: Optional[float] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _reset(self, rows: StatsRows) -> None:
+        questions, scores = rows
+        with self._lock:
+            self._questions = {int(qid): [int(attempts), int(correct or 0)] for qid, attempts, correct in questions}
+            self._scores = {(int(total), int(score)): int(sessions) for total, score, sessions in scores}
+            self._version += 1
+            self._persisted_version = self._version
+            self._snapshot = None
+
+    def start(self) -> None:
+        """
+        集計を再構築して書き出しスレッドを開始（DB に届かなければ前回の集計テーブル、それも無理なら空から）
+        """
+        try:
+            self._reset(self._rebuild())
+            self.source = "rebuild"
+            self._persisted_version = 0  # 再構築した内容を集計テーブルに書き出す
+        except Exception as e:
+            print(f"[STATS] Rebuild failed, loading persisted stats: {e}")
+            try:
+                self._reset(self._load())
+                self.source = "table"
+            except Exception as e:
+                print(f"[STATS] Starting with empty stats: {e}")
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="quiz-stats", daemon=True)
+            self._thread.start()
+
+    def record(self, session: Dict[str, Any], answers: List[Dict[str, Any]]) -> None:
+        """
+        受け付けた送信1件をカウンターに加える（回答数に比例する時間で済む）
+        """
+        with self._lock:
+            for answer in answers:
+                counts = self._questions.setdefault(answer["question_id"], [0, 0])
+                counts[0] += 1
+                if answer["is_correct"]:
+                    counts[1] += 1
+            key = (session["total_questions"], session["score"])
+            self._scores[key] = self._scores.get(key, 0) + 1
+            self._version += 1
+            self._snapshot = None
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        集計結果（変更がなければ前回作った辞書をそのまま返す）
+        """
+        with self._lock:
+            if self._snapshot is None:
+                sessions = sum(self._scores.values())
+                self._snapshot = {
+                    "sessions": sessions,
+                    "average_score": (
+                        round(sum(score * count for (_, score), count in self._scores.items()) / sessions, 3)
+                        if sessions else None
+                    ),
+                    "questions": [
+                        {
+                            "question_id": qid,
+                            "attempts": attempts,
+                            "correct": correct,
+                            "correct_rate": round(correct / attempts * 100, 2) if attempts else None,
+                        }
+                        for qid, (attempts, correct) in sorted(self._questions.items())
+                    ],
+                    "score_distribution": [
+                        {"total_questions": total, "score": score, "sessions": count}
+                        for (total, score), count in sorted(self._scores.items())
+                    ],
+                }
+            return self._snapshot
+
+    def persist(self) -> bool:
+        """
+        前回の書き出し以降に変更があれば集計テーブルに書き出す
+
+        Returns:
+            bool: 書き出した（または変更がなかった）場合 True
+        """
+        with self._lock:
+            version = self._version
+            if version == self._persisted_version:
+                return True
+            questions = [(qid, attempts, correct) for qid, (attempts, correct) in self._questions.items()]
+            scores = [(total, score, count) for (total, score), count in self._scores.items()]
+        try:
+            self._save(questions, scores)
+        except Exception as e:
+            print(f"[STATS] Failed to persist stats: {e}")
+            return False
+        with self._lock:
+            self._persisted_version = max(self._persisted_version, version)
+        self.persisted_at = time.time()
+        return True
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.persist_interval):
+            self.persist()
+
+    def stop(self) -> None:
+        """書き出しスレッドを止め、最後にもう一度書き出す"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.persist()
+
+    def stats(self) -> Dict[str, Any]:
+        """モニタリング用の統計情報"""
+        with self._lock:
+            return {
+                "source": self.source,
+                "questions": len(self._questions),
+                "dirty": self._version != self._persisted_version,
+                "persisted_at": self.persisted_at,
+            }
@@ -0,0 +1,307 @@
+"""
+保存先（ストレージバックエンド）の切り替え
+db.py の各関数は backend.connect() で得た DB-API 互換の接続に対して SQL を実行する
+  - snowflake: 本番用（connection.toml の設定で接続）
+  - sqlite:    ローカルの組み込み DB（ベンチマーク・オフラインでの動作確認用、テーブルは migrations/ から作成）
+"""
+
+import csv
+import gzip
+import re
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Any, List, Optional, Sequence
+
+
+class StorageBackend:
+    """
+    保存先の共通インターフェース
+
+    Attributes:
+        name: バックエンド名（統計・ログ用）
+    """
+    name = "base"
+
+    def connect(self) -> Any:
+        """新しい接続を作成（commit / rollback / cursor / close / is_closed を持つこと）"""
+        raise NotImplementedError
+
+    def is_alive(self, conn: Any) -> bool:
+        """接続が使えるかを確認"""
+        if conn.is_closed():
+            return False
+        cursor = conn.cursor()
+        try:
+            cursor.execute("SELECT 1")
+            return cursor.fetchone() is not None
+        finally:
+            cursor.close()
+
+    def create_tables(self) -> None:
+        """migrations/ の未適用のマイグレーションを適用（適用済みなら何もしない）"""
+        raise NotImplementedError
+
+    def execute_script(self, cursor: Any, statements: Sequence[str]) -> None:
+        """複数の文を順に実行（マイグレーション用）"""
+        for statement in statements:
+            cursor.execute(statement)
+
+    def stage_file(self, cursor: Any, table: str, path: Path) -> None:
+        """
+        gzip 圧縮した CSV ファイルをロードできる場所に置く（トランザクションの外で呼ぶ）
+        """
+
+    def copy_file(
+        self,
+        cursor: Any,
+        table: str,
+        columns: Sequence[str],
+        path: Path,
+        chunk_rows: int = 1000,
+        into: Optional[str] = None
+    ) -> None:
+        """
+        stage_file() したファイルをテーブルにロードする（既定は CSV を読んで複数行 INSERT）
+
+        Args:
+            cursor: トランザクション中のカーソル
+            table: stage_file() に渡したテーブル
+            columns: CSV の列に対応するテーブルの列
+            path: gzip 圧縮した CSV ファイル（ヘッダーなし、空欄は NULL）
+            chunk_rows: 1文の INSERT にまとめる行数
+            into: ロード先のテーブル（省略時は table）
+        """
+        table = into or table
+        placeholders = "(" + ", ".join(["%s"] * len(columns)) + ")"
+        with gzip.open(path, "rt", encoding="utf-8", newline="") as f:
+            chunk: List[List[Any]] = []
+            for row in csv.reader(f):
+                chunk.append([value if value != "" else None for value in row])
+                if len(chunk) >= chunk_rows:
+                    self._insert_chunk(cursor, table, columns, placeholders, chunk)
+                    chunk = []
+            if chunk:
+                self._insert_chunk(cursor, table, columns, placeholders, chunk)
+
+    @staticmethod
+    def _insert_chunk(cursor: Any, table: str, columns: Sequence[str], placeholders: str, rows: List[List[Any]]) -> None:
+        sql = f"INSERT INTO {table} ({', '.join(columns)}) VALUES " + ", ".join([placeholders] * len(rows))
+        cursor.execute(sql, [value for row in rows for value in row])
+
+
+class SnowflakeBackend(StorageBackend):
+    """Snowflake（connection.toml の設定で接続）"""
+    name = "snowflake"
+
+    def connect(self) -> Any:
+        import snowflake.connector
+        from credentials import get_provider
+
+        return snowflake.connector.connect(**get_provider().connect_params())
+
+    def create_tables(self) -> None:
+        from credentials import get_provider
+
+        from migrator import migrate
+
+        config = get_provider().config()
+        conn = self.connect()
+        try:
+            migrate(self, conn, config["database"], config["schema"])
+        finally:
+            conn.close()
+
+    def execute_script(self, cursor: Any, statements: Sequence[str]) -> None:
+        """全ての文をマルチステートメントで1回のリクエストとして送る"""
+        cursor.execute(";\n".join(statements), num_statements=len(statements))
+
+    def stage_file(self, cursor: Any, table: str, path: Path) -> None:
+        """テーブルステージ（@%テーブル）に PUT（同じ名前のファイルは上書き）"""
+        cursor.execute(f"PUT 'file://{Path(path).resolve().as_posix()}' @%{table} AUTO_COMPRESS = FALSE OVERWRITE = TRUE")
+
+    def copy_file(
+        self,
+        cursor: Any,
+        table: str,
+        columns: Sequence[str],
+        path: Path,
+        chunk_rows: int = 1000,
+        into: Optional[str] = None
+    ) -> None:
+        """ステージのファイルを COPY INTO 1文でロードし、ロード後にステージから削除"""
+        cursor.execute(
+            f"COPY INTO {into or table} ({', '.join(columns)}) FROM @%{table}/{Path(path).name} "
+            "FILE_FORMAT = (TYPE = CSV COMPRESSION = GZIP FIELD_OPTIONALLY_ENCLOSED_BY = '\"') "
+            "ON_ERROR = ABORT_STATEMENT PURGE = TRUE"
+        )
+
+
+# Snowflake の DDL を SQLite で実行できる形に直す置換
+_SQLITE_DDL_REWRITES = [
+    (re.compile(r"\bINTEGER\s+AUTOINCREMENT\s+PRIMARY\s+KEY\b", re.IGNORECASE), "INTEGER PRIMARY KEY AUTOINCREMENT"),
+    (re.compile(r"\bTIMESTAMP_NTZ\b", re.IGNORECASE), "TIMESTAMP"),
+    (re.compile(r"\bCURRENT_TIMESTAMP\(\)", re.IGNORECASE), "CURRENT_TIMESTAMP"),
+]
+# SQLite の ADD COLUMN には IF NOT EXISTS が無い（列の有無を確認してから実行する）
+_ADD_COLUMN_IF_NOT_EXISTS = re.compile(
+    r"\s*ALTER\s+TABLE\s+(\w+)\s+ADD\s+COLUMN\s+(IF\s+NOT\s+EXISTS\s+)(\w+)", re.IGNORECASE
+)
+
+
+def sqlite_ddl(statement: str) -> Optional[str]:
+    """
+    マイグレーションの1文を SQLite 用に変換（SQLite で不要な文は None）
+    """
+    if re.match(r"\s*CREATE\s+SCHEMA\b", statement, re.IGNORECASE):
+        return None
+    for pattern, replacement in _SQLITE_DDL_REWRITES:
+        statement = pattern.sub(replacement, statement)
+    return statement
+
+
+class SQLiteCursor:
+    """
+    sqlite3 のカーソルを db.py の SQL（%s プレースホルダー、明示的な BEGIN）で使えるようにするラッパー
+    列名は Snowflake と同じく大文字で返す
+    """
+
+    def __init__(self, conn: sqlite3.Connection):
+        self._conn = conn
+        self._cursor = conn.cursor()
+
+    def execute(self, sql: str, params: Sequence[Any] = ()) -> "SQLiteCursor":
+        if sql.strip().upper() == "BEGIN" and self._conn.in_transaction:
+            return self  # 既にトランザクション中（sqlite3 は INSERT 等の前に暗黙に開始する）
+        self._cursor.execute(sql.replace("%s", "?"), params or ())
+        return self
+
+    def executemany(self, sql: str, rows: Sequence[Sequence[Any]]) -> "SQLiteCursor":
+        self._cursor.executemany(sql.replace("%s", "?"), rows)
+        return self
+
+    @property
+    def description(self):
+        if self._cursor.description is None:
+            return None
+        return [(desc[0].upper(),) + tuple(desc[1:]) for desc in self._cursor.description]
+
+    @property
+    def rowcount(self) -> int:
+        return self._cursor.rowcount
+
+    def fetchone(self):
+        return self._cursor.fetchone()
+
+    def fetchmany(self, size: int = 1):
+        return self._cursor.fetchmany(size)
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+    def close(self) -> None:
+        self._cursor.close()
+
+
+class SQLiteConnection:
+    """sqlite3 の接続に Snowflake の接続と同じ is_closed() を足したラッパー"""
+
+    def __init__(self, conn: sqlite3.Connection):
+        self._conn = conn
+        self._closed = False
+
+    def cursor(self) -> SQLiteCursor:
+        return SQLiteCursor(self._conn)
+
+    def commit(self) -> None:
+        self._conn.commit()
+
+    def rollback(self) -> None:
+        self._conn.rollback()
+
+    def close(self) -> None:
+        self._closed = True
+        self._conn.close()
+
+    def is_closed(self) -> bool:
+        return self._closed
+
+
+class SQLiteBackend(StorageBackend):
+    """
+    SQLite（Python 標準ライブラリ、追加の依存なし）
+
+    Args:
+        path: データベースファイルのパス（":memory:" はプロセス内で共有される1つの DB）
+    """
+    name = "sqlite"
+
+    def __init__(self, path: str = "quiz.sqlite3"):
+        self.path = path
+        self._tables_lock = threading.Lock()
+        self._tables_created = False
+        self._uri = "file:quiz?mode=memory&cache=shared" if path == ":memory:" else path
+        # メモリ DB は最後の接続が閉じると消えるため、1本保持しておく
+        self._keepalive = self._raw_connect() if path == ":memory:" else None
+
+    def _raw_connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            self._uri,
+            uri=self._uri.startswith("file:"),
+            check_same_thread=False,  # 接続プール経由で別スレッドから使われる
+            timeout=30.0
+        )
+        conn.execute("PRAGMA foreign_keys = ON")
+        return conn
+
+    def connect(self) -> SQLiteConnection:
+        self.create_tables()
+        return SQLiteConnection(self._raw_connect())
+
+    def execute_script(self, cursor: Any, statements: Sequence[str]) -> None:
+        """Snowflake 向けの文を SQLite 用に変換して実行（不要な文は飛ばす）"""
+        for statement in statements:
+            statement = sqlite_ddl(statement)
+            if not statement:
+                continue
+            match = _ADD_COLUMN_IF_NOT_EXISTS.match(statement)
+            if match:
+                table, column = match.group(1), match.group(3)
+                cursor.execute(f"PRAGMA table_info({table})")
+                if any(row[1].lower() == column.lower() for row in cursor.fetchall()):
+                    continue
+                statement = statement[:match.start(2)] + statement[match.end(2):]
+            cursor.execute(statement)
+
+    def create_tables(self) -> None:
+        with self._tables_lock:
+            if self._tables_created:
+                return
+            from migrator import migrate
+
+            raw = self._raw_connect()
+            try:
+                if self._uri == self.path:
+                    raw.execute("PRAGMA journal_mode = WAL")  # 読み込みと書き込みを並行させる
+                migrate(self, SQLiteConnection(raw))
+            finally:
+                raw.close()
+            self._tables_created = True
+
+
+def create_backend(name: str, sqlite_path: str = "quiz.sqlite3") -> StorageBackend:
+    """
+    名前からバックエンドを作成
+
+    Args:
+        name: "snowflake" または "sqlite"
+        sqlite_path: sqlite の場合のデータベースファイル
+
+    Raises:
+        ValueError: 不明なバックエンド名
+    """
+    if name == "snowflake":
+        return SnowflakeBackend()
+    if name == "sqlite":
+        return SQLiteBackend(sqlite_path)
+    raise ValueError(f"Unknown storage backend: {name} (expected 'snowflake' or 'sqlite')")
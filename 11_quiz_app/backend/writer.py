@@ -0,0 +1,224 @@
+"""
+クイズ結果の書き込み遅延（write-behind）キュー
+受け付けた送信をメモリ上のキューに入れ、バックグラウンドのスレッドが
+件数または時間間隔でまとめて Snowflake に書き込む
+バッチの書き込みに失敗したら半分ずつに分けて書き直し、単独でも書けない送信だけを
+再試行・破棄の対象にする（1件の不正な送信でバッチ全体が止まらないように）
+"""
+
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+Submission = Tuple[Dict[str, Any], List[Dict[str, Any]]]  # (セッション情報, 回答データのリスト)
+
+
+def write_bisecting(write: Callable[[List[Submission]], bool], batch: List[Submission]) -> Tuple[bool, List[Submission]]:
+    """
+    バッチを書き込み、失敗したら半分ずつに分けて書き直す（書き込みキュー・スプールの再送で共用）
+
+    何も書けないまま1件まで分けても失敗したら、DB 側の障害とみなして残りは試さない
+    （障害中の再試行ごとの書き込み回数を log2(件数) 程度に抑える）
+
+    Args:
+        write: 送信のリストを保存する関数（成功時 True）
+        batch: 書き込む送信のリスト
+
+    Returns:
+        (1件でも書き込めたか, 書き込めなかった送信のリスト)
+    """
+    written = False
+    failed: List[Submission] = []
+    parts = [batch]
+    while parts:
+        part = parts.pop()
+        if write(part):
+            written = True
+            continue
+        if len(part) > 1:
+            middle = len(part) // 2
+            parts += [part[middle:], part[:middle]]
+            continue
+        failed += part
+        if not written:
+            # 障害とみなし、失敗した1件を先頭に残りをそのまま返す
+            for rest in reversed(parts):
+                failed += rest
+            break
+    return written, failed
+
+
+class QueueFull(Exception):
+    """キューが満杯で送信を受け付けられない（バックプレッシャー）"""
+
+
+class WriteBehindQueue:
+    """
+    送信をまとめて書き込むキュー
+
+    Args:
+        flush: 送信のリストを保存する関数（成功時 True）
+        max_batch: 1回のフラッシュで書き込む最大件数
+        flush_interval: キューに残っている送信を書き込むまでの最大待ち時間（秒）
+        max_queue: キューに溜められる最大件数（超えると QueueFull）
+        retry_interval: フラッシュ失敗時に再試行するまでの待ち時間（秒）
+        max_attempts: 他の送信は書けているのに単独で失敗し続けた送信を破棄するまでの回数
+    """
+
+    def __init__(
+        self,
+        flush: Callable[[List[Submission]], bool],
+        max_batch: int = 500,
+        flush_interval: float = 1.0,
+        max_queue: int = 10000,
+        retry_interval: float = 2.0,
+        max_attempts: int = 3
+    ):
+        self._flush = flush
+        self.max_batch = max(max_batch, 1)
+        self.flush_interval = flush_interval
+        self.retry_interval = retry_interval
+        self.max_attempts = max(max_attempts, 1)
+        self._attempts: Dict[int, int] = {}  # id(送信) -> 単独で失敗した回数
+        self._queue: "queue.Queue[Submission]" = queue.Queue(maxsize=max_queue)
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            "accepted": 0,
+            "rejected": 0,
+            "flushed": 0,
+            "batches": 0,
+            "failures": 0,
+            "dropped": 0,
+            "last_flush_ms": None,
+        }
+
+    def start(self) -> None:
+        """バックグラウンドのフラッシュスレッドを開始"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="quiz-write-behind", daemon=True)
+            self._thread.start()
+
+    def submit(self, submission: Submission) -> None:
+        """
+        送信をキューに入れる（待たずに戻る）
+
+        Raises:
+            QueueFull: キューが満杯、または停止処理中
+        """
+        if self._stop.is_set():
+            raise QueueFull("Writer is shutting down")
+        try:
+            self._queue.put_nowait(submission)
+        except queue.Full:
+            with self._stats_lock:
+                self._stats["rejected"] += 1
+            raise QueueFull(f"Write queue is full ({self._queue.maxsize} pending)")
+        with self._stats_lock:
+            self._stats["accepted"] += 1
+
+    def _take_batch(self, timeout: float) -> List[Submission]:
+        """最大 max_batch 件を取り出す（最初の1件は timeout 秒まで待つ）"""
+        batch: List[Submission] = []
+        try:
+            batch.append(self._queue.get(timeout=timeout))
+        except queue.Empty:
+            return batch
+        # 最初の1件から flush_interval の間に届いた分もまとめる
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or self._stop.is_set():
+                remaining = 0
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch: List[Submission]) -> bool:
+        started = time.perf_counter()
+        ok = self._flush(batch)
+        with self._stats_lock:
+            if ok:
+                self._stats["flushed"] += len(batch)
+                self._stats["batches"] += 1
+                self._stats["last_flush_ms"] = round((time.perf_counter() - started) * 1000, 3)
+            else:
+                self._stats["failures"] += 1
+        return ok
+
+    def _write_bisecting(self, batch: List[Submission]) -> Tuple[bool, List[Submission]]:
+        return write_bisecting(self._write, batch)
+
+    def _retry_later(self, written: bool, failed: List[Submission]) -> List[Submission]:
+        """
+        書き込めなかった送信のうち再試行するものを返す
+
+        他の送信が書けている中で単独でも失敗した送信は、max_attempts 回で破棄する。
+        何も書けなかった（障害）ときは回数を数えず、失敗した先頭の1件を末尾に回す
+        （その1件が原因なら、次の再試行では他の送信が先に書ける）
+        """
+        if not written:
+            return failed[1:] + failed[:1]
+        retry = []
+        attempts_by_id: Dict[int, int] = {}
+        for submission in failed:
+            attempts = self._attempts.get(id(submission), 0) + 1
+            if attempts < self.max_attempts:
+                attempts_by_id[id(submission)] = attempts
+                retry.append(submission)
+                continue
+            with self._stats_lock:
+                self._stats["dropped"] += 1
+            print(
+                f"[WRITER] Dropping submission {submission[0].get('session_id')} "
+                f"after {attempts} failed writes"
+            )
+        self._attempts = attempts_by_id
+        return retry
+
+    def _run(self) -> None:
+        """フラッシュスレッド本体"""
+        pending: List[Submission] = []  # 書き込みに失敗して再試行待ちの送信
+        while not self._stop.is_set():
+            if len(pending) < self.max_batch:
+                # 新しい送信を再試行分の前に加える（再試行分が max_batch 件ある間はキューから取らず、
+                # キューが埋まれば受け付けを止める）
+                pending = self._take_batch(timeout=0 if pending else 0.5) + pending
+            if not pending:
+                continue
+            written, failed = self._write_bisecting(pending)
+            pending = self._retry_later(written, failed)
+            if pending and not written:
+                self._stop.wait(self.retry_interval)
+
+        # 停止時: 残りをすべて書き込む（何も書けなくなったら残りは破棄）
+        while True:
+            batch = self._take_batch(timeout=0) + pending
+            if not batch:
+                break
+            written, failed = self._write_bisecting(batch)
+            if failed and not written:
+                dropped = len(failed) + self._queue.qsize()
+                with self._stats_lock:
+                    self._stats["dropped"] += dropped
+                print(f"[WRITER] Dropping {dropped} submissions after failed final flush")
+                break
+            pending = self._retry_later(written, failed)
+
+    def stop(self, timeout: Optional[float] = 30.0) -> None:
+        """
+        受け付けを止め、キューに残った送信をフラッシュしてからスレッドを終了
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def stats(self) -> Dict[str, Any]:
+        """モニタリング用の統計情報"""
+        with self._stats_lock:
+            return {**self._stats, "queued": self._queue.qsize(), "max_queue": self._queue.maxsize}
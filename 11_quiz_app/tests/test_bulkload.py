@@ -0,0 +1,101 @@
+"""Tests for the staged bulk load against the local SQLite backend."""
+
+import shutil
+
+import pytest
+
+import db
+from bulkload import MANIFEST_SUFFIX, BulkLoader, StagingWriter
+from storage import SQLiteBackend
+
+
+@pytest.fixture
+def sqlite_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, "_backend", SQLiteBackend(str(tmp_path / "quiz.sqlite3")))
+    monkeypatch.setattr(db, "_known_questions", set())
+
+
+def _submission(session_id, question_ids=(1, 2)):
+    session = {"session_id": session_id, "user_id": None, "score": 1, "total_questions": len(question_ids),
+               "correct_rate": 50.0}
+    answers = [
+        {"session_id": session_id, "question_id": qid, "question_text": f"question {qid}",
+         "selected_answer": 0, "correct_answer": 0, "is_correct": qid == 1}
+        for qid in question_ids
+    ]
+    return session, answers
+
+
+def _staging(directory, **kwargs):
+    return StagingWriter(directory, db.staged_rows, db.question_key, list(db.STAGED_COLUMNS), **kwargs)
+
+
+def _rows(sql):
+    with db.get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(sql)
+        return cursor.fetchall()
+
+
+def test_batches_rotate_by_size_and_age(tmp_path):
+    staging = _staging(tmp_path, max_bytes=1)
+    staging.append(_submission("a"))
+    staging.append(_submission("b"))
+    assert len(staging.ready_batches()) == 2
+
+    staging = _staging(tmp_path, max_age=3600)
+    staging.append(_submission("c"))
+    assert staging.seal(force=False) is None
+    staging.max_age = 0
+    assert staging.seal(force=False) is not None
+    assert len(staging.ready_batches()) == 3
+
+
+def test_duplicates_are_skipped_within_and_across_batches(tmp_path, sqlite_db):
+    staging = _staging(tmp_path)
+    saved = []
+    loader = BulkLoader(staging, lambda directory, manifest: db.load_staged_batch(directory, manifest, saved.extend))
+
+    assert staging.append(_submission("a"))
+    assert not staging.append(_submission("a"))  # 同じバッチ内の再送
+    staging.append(_submission("b"))
+    staging.seal()
+    staging.append(_submission("a"))  # 別のバッチでの再送
+    staging.append(_submission("c"))
+    staging.seal()
+    assert loader.load_ready()
+
+    assert sorted(_rows("SELECT session_id FROM QUIZ_SESSIONS")) == [("a",), ("b",), ("c",)]
+    assert sorted(_rows("SELECT session_id, COUNT(*) FROM QUIZ_ANSWERS GROUP BY session_id")) == [
+        ("a", 2), ("b", 2), ("c", 2)
+    ]
+    assert _rows("SELECT COUNT(*) FROM QUIZ_QUESTIONS") == [(2,)]
+    # 集計に渡るのは実際に挿入したセッションだけ
+    assert sorted(session["session_id"] for session, _ in saved) == ["a", "b", "c"]
+    assert all(len(answers) == 2 for _, answers in saved)
+    assert staging.ready_batches() == []
+
+
+def test_unsealed_batch_is_recovered_on_startup(tmp_path, sqlite_db):
+    staging = _staging(tmp_path / "live")
+    for session_id in ("a", "b", "c"):
+        staging.append(_submission(session_id))
+    # 書き込み中のまま止まった状態（gzip の末尾もマニフェストも無い）を写し取る
+    crashed = tmp_path / "crashed"
+    shutil.copytree(tmp_path / "live", crashed)
+    staging.seal()
+
+    sessions_file = next(crashed.glob("*.quiz_sessions.csv.gz"))
+    data = sessions_file.read_bytes()
+    sessions_file.write_bytes(data[:-12])  # 最後の送信の途中で切れた
+
+    recovered = _staging(crashed)
+    assert len(recovered.ready_batches()) == 1
+    assert sorted(path.suffix for path in crashed.iterdir() if path.is_file()) == [
+        ".gz", ".gz", MANIFEST_SUFFIX
+    ]
+    assert BulkLoader(recovered, db.load_staged_batch).load_ready()
+    sessions = {row[0] for row in _rows("SELECT session_id FROM QUIZ_SESSIONS")}
+    assert sessions == {"a", "b"}
+    answers = _rows("SELECT session_id, COUNT(*) FROM QUIZ_ANSWERS GROUP BY session_id")
+    assert sorted(answers) == [(session_id, 2) for session_id in sorted(sessions)]
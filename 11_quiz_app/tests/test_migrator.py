@@ -0,0 +1,72 @@
+"""Tests for the migration runner."""
+
+import sqlite3
+
+import pytest
+
+import migrator
+from storage import SQLiteBackend, SQLiteConnection
+
+
+class FlakyConnection(SQLiteConnection):
+    """最初の履歴の SELECT だけ失敗する接続"""
+
+    def __init__(self, conn, error):
+        super().__init__(conn)
+        self.error = error
+
+    def cursor(self):
+        cursor = super().cursor()
+        if self.error is None:
+            return cursor
+        error, self.error = self.error, None
+
+        def execute(sql, params=None):
+            raise error
+
+        cursor.execute = execute
+        return cursor
+
+
+@pytest.fixture
+def backend(tmp_path):
+    backend = SQLiteBackend(str(tmp_path / "quiz.sqlite3"))
+    backend.create_tables()
+    return backend
+
+
+def _history(backend):
+    raw = sqlite3.connect(backend.path)
+    try:
+        return raw.execute("SELECT version FROM SCHEMA_MIGRATIONS").fetchall()
+    finally:
+        raw.close()
+
+
+def test_fresh_database_is_bootstrapped(backend):
+    assert len(_history(backend)) == len(migrator.discover())
+
+
+def test_applied_migrations_are_skipped(backend):
+    raw = sqlite3.connect(backend.path)
+    try:
+        assert migrator.migrate(backend, SQLiteConnection(raw)) == []
+    finally:
+        raw.close()
+
+
+def test_transient_error_is_raised_without_reapplying(backend):
+    before = _history(backend)
+    raw = sqlite3.connect(backend.path)
+    try:
+        with pytest.raises(sqlite3.OperationalError, match="database is locked"):
+            migrator.migrate(backend, FlakyConnection(raw, sqlite3.OperationalError("database is locked")))
+    finally:
+        raw.close()
+    assert _history(backend) == before
+
+
+def test_missing_table_errors():
+    assert migrator.is_missing_table(sqlite3.OperationalError("no such table: SCHEMA_MIGRATIONS"))
+    assert migrator.is_missing_table(Exception("Object 'QUIZ.SCHEMA_MIGRATIONS' does not exist or not authorized."))
+    assert not migrator.is_missing_table(sqlite3.OperationalError("database is locked"))
@@ -0,0 +1,66 @@
+"""Tests for the local spool and its replayer."""
+
+from spool import QUARANTINE_FILE, Spool, SpoolReplayer
+
+
+def _submission(session_id):
+    return {"session_id": session_id, "score": 1, "total_questions": 1}, []
+
+
+class FakeStore:
+    """save_quiz_batch の代わり（session_id が長すぎる送信は毎回失敗する）"""
+
+    def __init__(self):
+        self.saved = {}
+        self.down = False
+
+    def flush(self, batch):
+        if self.down or any(len(session["session_id"]) > 36 for session, _ in batch):
+            return False
+        for session, answers in batch:
+            self.saved.setdefault(session["session_id"], (session, answers))
+        return True
+
+
+def _spool(tmp_path, store, submissions, **kwargs):
+    spool = Spool(tmp_path, fsync=False)
+    for submission in submissions:
+        spool.append(submission)
+    return spool, SpoolReplayer(spool, store.flush, max_batch=4, **kwargs)
+
+
+def test_replay_removes_segments(tmp_path):
+    store = FakeStore()
+    spool, replayer = _spool(tmp_path, store, [_submission(f"s{i}") for i in range(10)])
+    assert replayer.replay_once()
+    assert sorted(store.saved) == sorted(f"s{i}" for i in range(10))
+    assert spool.sealed_segments() == []
+
+
+def test_failing_record_is_quarantined_and_does_not_block_later_segments(tmp_path):
+    store = FakeStore()
+    bad = _submission("x" * 40)
+    spool, replayer = _spool(tmp_path, store, [_submission("a"), bad, _submission("b")], max_attempts=3)
+    assert not replayer.replay_once()
+    # 次のセグメントは失敗した送信があっても再送される
+    spool.append(_submission("c"))
+    assert not replayer.replay_once()
+    assert sorted(store.saved) == ["a", "b", "c"]
+
+    # 他の送信が書けている中で max_attempts 回失敗したら隔離し、セグメントを消す
+    assert replayer.replay_once()
+    assert spool.sealed_segments() == []
+    assert Spool.read_segment(tmp_path / QUARANTINE_FILE) == [bad]
+    assert replayer.stats()["quarantined"] == 1
+
+
+def test_outage_keeps_everything(tmp_path):
+    store = FakeStore()
+    store.down = True
+    spool, replayer = _spool(tmp_path, store, [_submission(f"s{i}") for i in range(10)], max_attempts=1)
+    for _ in range(3):
+        assert not replayer.replay_once()
+    assert replayer.stats()["quarantined"] == 0
+    store.down = False
+    assert replayer.replay_once()
+    assert len(store.saved) == 10
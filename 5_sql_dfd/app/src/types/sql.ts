@@ -53,7 +53,9 @@ export interface DFDNode {
   type: 'table' | 'logic'
   label: string
   columns?: string[]
-  logicType?: 'where' | 'join' | 'groupby' | 'case'
+  logicType?: 'where' | 'join' | 'groupby' | 'case' | 'task'
+  error?: string | null // 部分パースで失敗したCTEのエラー
+  errorSpan?: [number, number] | null // 入力SQL内の失敗箇所（文字オフセット）
 }
 
 export interface DFDEdge {
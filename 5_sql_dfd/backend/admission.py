@@ -0,0 +1,161 @@
+"""Admission control and per-client rate limiting for the SQL DFD API.
+
+Requests are classified by their pre-parse complexity score
+(parser.complexity): small ones take the fast lane, big ones wait in a
+separate bounded queue with limited concurrency so they cannot occupy every
+parser, and oversized ones are rejected before any parsing. Independently,
+each client has a token bucket that limits its request rate.
+"""
+
+import asyncio
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request cannot be admitted right now."""
+
+    def __init__(self, message: str, status_code: int = 503, retry_after: float = 1.0):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+@dataclass(frozen=True)
+class AdmissionLimits:
+    """Lane thresholds (0 disables a limit)."""
+    fast_lane_max_score: int = int(os.environ.get("SQL_DFD_FAST_LANE_MAX_SCORE", 20_000))
+    max_score: int = int(os.environ.get("SQL_DFD_MAX_SCORE", 2_000_000))
+    heavy_concurrency: int = int(os.environ.get("SQL_DFD_HEAVY_CONCURRENCY", 1))
+    heavy_queue: int = int(os.environ.get("SQL_DFD_HEAVY_QUEUE", 8))
+
+
+@dataclass
+class AdmissionController:
+    """Routes requests to the fast lane or the bounded heavy lane."""
+    limits: AdmissionLimits = field(default_factory=AdmissionLimits)
+    fast: int = 0
+    heavy: int = 0
+    rejected_oversized: int = 0
+    rejected_queue_full: int = 0
+    waiting: int = 0
+    _semaphore: asyncio.Semaphore | None = field(default=None, repr=False)
+
+    def lane(self, score: int) -> str:
+        """Return 'fast' or 'heavy' for a complexity score.
+
+        Raises:
+            AdmissionRejected: 422 if the score is above ``limits.max_score``
+        """
+        if self.limits.max_score and score > self.limits.max_score:
+            self.rejected_oversized += 1
+            raise AdmissionRejected(
+                f"SQL complexity score {score} exceeds the limit of {self.limits.max_score}",
+                status_code=422
+            )
+        if not self.limits.fast_lane_max_score or score <= self.limits.fast_lane_max_score:
+            return "fast"
+        return "heavy"
+
+    @asynccontextmanager
+    async def admit(self, lane: str):
+        """Hold a slot in ``lane`` for the duration of the block.
+
+        The fast lane is not limited here (the parser pools bound it). The
+        heavy lane runs at most ``heavy_concurrency`` at a time with at most
+        ``heavy_queue`` requests waiting; beyond that requests get a 503.
+        """
+        if lane == "fast":
+            self.fast += 1
+            yield
+            return
+
+        if self._semaphore is None:
+            # イベントループ上で初めて使う時に作る（ループ外での生成を避ける）
+            self._semaphore = asyncio.Semaphore(max(1, self.limits.heavy_concurrency))
+        if self._semaphore.locked() and self.waiting >= self.limits.heavy_queue:
+            self.rejected_queue_full += 1
+            raise AdmissionRejected("Too many large queries queued, try again later", retry_after=5.0)
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        self.heavy += 1
+        try:
+            yield
+        finally:
+            self._semaphore.release()
+
+    def reset_stats(self) -> None:
+        """Zero the lane and rejection counters (e.g. after a warm-up)."""
+        self.fast = self.heavy = 0
+        self.rejected_oversized = self.rejected_queue_full = 0
+
+    def stats(self) -> dict:
+        return {
+            "fast": self.fast,
+            "heavy": self.heavy,
+            "heavy_waiting": self.waiting,
+            "rejected_oversized": self.rejected_oversized,
+            "rejected_queue_full": self.rejected_queue_full,
+            "fast_lane_max_score": self.limits.fast_lane_max_score,
+            "max_score": self.limits.max_score,
+        }
+
+
+class RateLimiter:
+    """Per-client token buckets.
+
+    Each client may burst up to ``burst`` requests and is refilled at
+    ``rate`` tokens per second. Idle clients are forgotten once more than
+    ``max_clients`` are tracked.
+    """
+
+    def __init__(self, rate: float, burst: float, max_clients: int = 10_000):
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self._buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()  # client -> (tokens, updated)
+        self._lock = threading.Lock()
+        self.limited = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.rate > 0
+
+    def acquire(self, client: str, cost: float = 1.0) -> float:
+        """Take ``cost`` tokens for ``client``.
+
+        Returns:
+            0 if allowed, otherwise seconds until enough tokens are available
+        """
+        if not self.enabled:
+            return 0.0
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.pop(client, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            if tokens >= cost:
+                tokens -= cost
+                wait = 0.0
+            else:
+                self.limited += 1
+                wait = (cost - tokens) / self.rate
+            self._buckets[client] = (tokens, now)
+            while len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+        return wait
+
+    def reset(self) -> None:
+        """Forget every client bucket and the limited counter."""
+        with self._lock:
+            self._buckets.clear()
+            self.limited = 0
+
+    def stats(self) -> dict:
+        return {"rate": self.rate, "burst": self.burst, "clients": len(self._buckets), "limited": self.limited}
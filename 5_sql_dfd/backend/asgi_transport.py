@@ -0,0 +1,73 @@
+"""Minimal in-process ASGI client.
+
+Sends requests straight into the app's ASGI callable, without sockets.
+Used by the load generator and by serve.py's warm-up.
+"""
+
+import asyncio
+
+
+class ASGITransport:
+    """Calls an ASGI app directly (no sockets), including its lifespan."""
+
+    def __init__(self, app):
+        self.app = app
+        self._lifespan = None
+
+    async def __aenter__(self):
+        lifespan_context = getattr(getattr(self.app, "router", None), "lifespan_context", None)
+        if lifespan_context:
+            self._lifespan = lifespan_context(self.app)
+            await self._lifespan.__aenter__()
+        return self
+
+    async def __aexit__(self, *exc):
+        if self._lifespan:
+            await self._lifespan.__aexit__(*exc)
+
+    async def post(self, path: str, body: bytes) -> tuple[int, int]:
+        """POST a JSON body; returns (status, response byte count)."""
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": "POST",
+            "scheme": "http",
+            "path": path,
+            "raw_path": path.encode(),
+            "query_string": b"",
+            "root_path": "",
+            "headers": [
+                (b"host", b"localhost"),
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+            ],
+            "client": ("127.0.0.1", 0),
+            "server": ("localhost", 80),
+        }
+        done = asyncio.Event()
+        sent_body = False
+        status = 0
+        size = 0
+
+        async def receive():
+            nonlocal sent_body
+            if not sent_body:
+                sent_body = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            # レスポンス完了までは切断を通知しない（StreamingResponse対策）
+            await done.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            nonlocal status, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+                if not message.get("more_body"):
+                    done.set()
+
+        await self.app(scope, receive, send)
+        done.set()
+        return status, size
@@ -0,0 +1,335 @@
+"""Command-line DFD renderer for whole repositories (CI use).
+
+Renders every SQL model matched by a glob into ``<out>/<model>.json``,
+``<model>.mmd`` (Mermaid) and ``<model>.dot`` (Graphviz) without starting
+the FastAPI server.
+
+Usage:
+    python cli.py "models/**/*.sql" --out lineage/
+    python cli.py "../../98_digdag/queries/*.sql" --out lineage/ --dialect postgres
+    python cli.py --manifest target/manifest.json --out lineage/
+    python cli.py --dig ../../98_digdag/tutorial.dig --out lineage/
+
+With ``--manifest`` the compiled SQL and dependencies are streamed from a
+dbt manifest instead (no Jinja preprocessing), and a project-level graph is
+written to ``<out>/project_lineage.{json,mmd,dot}``.
+
+With ``--dig`` the SQL scripts of a Digdag workflow are parsed in parallel
+and a single workflow graph (tasks, the tables they read and write, and
+task order) is written to ``<out>/<workflow>.{json,mmd,dot}``.
+
+With ``--catalog`` (a CSV/JSON dump of ``INFORMATION_SCHEMA.COLUMNS``),
+``SELECT *`` is expanded to the snapshot's columns through refs and CTEs.
+
+Parsed results are cached on disk by content hash (``--cache-dir``), and a
+manifest in the output directory records the hash each model was rendered
+from, so a warm run only re-renders models whose SQL changed.
+"""
+
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from parser import parse_sql, generate_dfd
+from parser.cache import DiskCache, cache_key, content_hash
+from parser.catalog import get_catalog
+from parser.dbt_manifest import ManifestIndex, project_lineage, read_manifest
+from parser.dfd_generator import DFDData, to_dict
+from parser.digdag import StepResult, load_workflow, parse_step, workflow_dfd
+from parser.dialects import SUPPORTED_DIALECTS, normalize_dialect, resolve_dialect
+from parser.exporters import iter_dot, iter_mermaid
+from parser.sql_parser import ParseLimits
+
+MANIFEST_NAME = ".sql_dfd_manifest.json"
+MANIFEST_VERSION = 1
+DEFAULT_CACHE_DIR = ".sql_dfd_cache"
+
+
+def glob_base(pattern: str) -> Path:
+    """Return the leading directory of a glob pattern that has no wildcards."""
+    parts = []
+    for part in Path(pattern).parts:
+        if glob.has_magic(part):
+            break
+        parts.append(part)
+    base = Path(*parts) if parts else Path(".")
+    return base if base.is_dir() else base.parent
+
+
+def load_manifest(out_dir: Path, options: dict) -> dict[str, dict]:
+    """Load the previous run's manifest; empty if missing or options changed."""
+    try:
+        with open(out_dir / MANIFEST_NAME, encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if manifest.get("version") != MANIFEST_VERSION or manifest.get("options") != options:
+        return {}
+    return manifest.get("models", {})
+
+
+def save_manifest(out_dir: Path, options: dict, models: dict[str, dict]) -> None:
+    """Write the manifest for the next run."""
+    out_dir.mkdir(parents=True, exist_ok=True)
+    with open(out_dir / MANIFEST_NAME, "w", encoding="utf-8") as f:
+        json.dump({"version": MANIFEST_VERSION, "options": options, "models": models}, f, indent=2, sort_keys=True)
+
+
+def _write_text(path: Path, chunks) -> None:
+    """Write an iterable of text chunks to a file."""
+    with open(path, "w", encoding="utf-8") as f:
+        f.writelines(chunks)
+
+
+def write_dfd(target: Path, dfd_data: DFDData) -> None:
+    """Write ``target``.json / .mmd / .dot for a DFD."""
+    target.parent.mkdir(parents=True, exist_ok=True)
+    with open(target.with_suffix(".json"), "w", encoding="utf-8") as f:
+        json.dump(to_dict(dfd_data), f, ensure_ascii=False, indent=2)
+    _write_text(target.with_suffix(".mmd"), iter_mermaid(dfd_data))
+    _write_text(target.with_suffix(".dot"), iter_dot(dfd_data))
+
+
+def render_model(
+    sql: str,
+    rel_path: str,
+    out_dir: str,
+    dialect: str,
+    separate_logic_nodes: bool,
+    cache_dir: str | None,
+    relations: dict[str, str] | None = None,
+    catalog_path: str | None = None
+) -> str:
+    """Parse one model and write its JSON/Mermaid/DOT files (runs in a worker).
+
+    Args:
+        relations: relation_name -> display name for compiled SQL (dbt manifest)
+        catalog_path: Schema snapshot used to expand ``SELECT *``
+
+    Returns:
+        The concrete dialect the model was parsed with
+    """
+    dialect = resolve_dialect(sql, dialect)
+    disk_cache = DiskCache(cache_dir) if cache_dir else None
+    cache_text = sql if relations is None else f"{sql}\0{json.dumps(relations, sort_keys=True)}"
+    key = cache_key(cache_text, dialect)
+
+    parsed = disk_cache.get(key) if disk_cache else None
+    if parsed is None:
+        parsed = parse_sql(
+            sql, limits=ParseLimits(), memory_conscious=True, dialect=dialect, recover=True, relations=relations
+        )
+        if disk_cache:
+            disk_cache.put(key, parsed)
+
+    if catalog_path:
+        parsed = get_catalog(catalog_path).expand(parsed)
+
+    dfd_data = generate_dfd(parsed, separate_logic_nodes=separate_logic_nodes)
+    write_dfd(Path(out_dir) / Path(rel_path).with_suffix(""), dfd_data)
+    return dialect
+
+
+def render_manifest(path: str, out_dir: Path, dialect: str, is_unchanged, submit, futures: dict) -> int:
+    """Stream a dbt manifest and submit each changed model as soon as it can be resolved.
+
+    A model is submitted once every node it depends on has been read (so its
+    relation names can be mapped to placeholders); the rest wait until the
+    end of the stream, since sources usually follow the nodes section.
+
+    Returns:
+        Number of SQL models in the manifest
+    """
+    index = ManifestIndex()
+    deferred = []
+    total = 0
+
+    def submit_model(model) -> None:
+        digest = content_hash(model.compiled_code + "\0" + " ".join(sorted(model.depends_on)))
+        if is_unchanged(model.path, digest):
+            return
+        # 方言は manifest の adapter_type を優先（--dialect 指定時はそちら）
+        model_dialect = dialect
+        if dialect == "auto" and index.adapter_type in SUPPORTED_DIALECTS:
+            model_dialect = index.adapter_type
+        futures[model.path] = (
+            digest, submit(model.path, model.compiled_code, index.relations_for(model), model_dialect)
+        )
+
+    with open(path, encoding="utf-8") as f:
+        for model in read_manifest(f, index):
+            total += 1
+            if all(dep in index.labels for dep in model.depends_on):
+                submit_model(model)
+            else:
+                deferred.append(model)
+    for model in deferred:
+        submit_model(model)
+
+    write_dfd(out_dir / "project_lineage", project_lineage(index))
+    return total
+
+
+def render_workflow(path: str, out_dir: Path, cache_dir: str | None, submit) -> tuple[int, int]:
+    """Parse every SQL task of a Digdag workflow and write the workflow DFD.
+
+    Scripts are parsed in the worker pool; results are cached on disk by
+    content hash, so unchanged steps are not re-parsed.
+
+    Returns:
+        (number of SQL tasks, number of tasks that failed)
+    """
+    base = Path(path).parent
+    tasks = load_workflow(Path(path).read_text(encoding="utf-8"),
+                          lambda rel: (base / rel).read_text(encoding="utf-8"))
+    disk_cache = DiskCache(cache_dir) if cache_dir else None
+    results: dict[str, StepResult] = {}
+    pending: dict[str, tuple[tuple[str, str], object]] = {}  # task name -> (cache key, future)
+
+    sql_tasks = [task for task in tasks if task.dialect]
+    for task in sql_tasks:
+        try:
+            sql = (base / task.command).read_text(encoding="utf-8")
+        except OSError as e:
+            results[task.name] = StepResult(error=f"Cannot read {task.command}: {e.strerror}")
+            continue
+        key = (f"{task.dialect}.statements", content_hash(sql))
+        cached = disk_cache.get(key) if disk_cache else None
+        if cached is not None:
+            results[task.name] = cached
+        else:
+            pending[task.name] = (key, submit(parse_step, sql, task.dialect, ParseLimits()))
+
+    for name, (key, future) in pending.items():
+        try:
+            results[name] = future.result()
+        except Exception as e:
+            results[name] = StepResult(error=str(e))
+            continue
+        if disk_cache:
+            disk_cache.put(key, results[name])
+
+    for name, result in results.items():
+        if result.error:
+            print(f"[ERROR] {name}: {result.error}", file=sys.stderr)
+    write_dfd(out_dir / Path(path).stem, workflow_dfd(tasks, results))
+    return len(sql_tasks), sum(1 for result in results.values() if result.error)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """Build the argument parser."""
+    ap = argparse.ArgumentParser(description="Render DFDs (JSON / Mermaid / DOT) for SQL models")
+    ap.add_argument("pattern", nargs="?", help='Glob for SQL files, e.g. "models/**/*.sql"')
+    ap.add_argument("--manifest", help="Read compiled SQL from a dbt target/manifest.json instead")
+    ap.add_argument("--dig", help="Render the lineage of a Digdag workflow (.dig) instead")
+    ap.add_argument("--out", default="dfd_out", help="Output directory (default: dfd_out)")
+    ap.add_argument("--dialect", default="auto", help="auto / snowflake / postgres / bigquery")
+    ap.add_argument("--jobs", "-j", type=int, default=os.cpu_count() or 1, help="Worker processes")
+    ap.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR, help="On-disk parse cache directory")
+    ap.add_argument("--no-cache", action="store_true", help="Disable the on-disk parse cache")
+    ap.add_argument("--catalog", help="INFORMATION_SCHEMA.COLUMNS snapshot (.csv/.json) to expand SELECT *")
+    ap.add_argument("--no-separate-logic-nodes", action="store_true",
+                    help="Put JOIN/WHERE/GROUP BY inside table nodes")
+    ap.add_argument("--force", action="store_true", help="Re-render every model")
+    return ap
+
+
+def main(argv: list[str] | None = None) -> int:
+    """CLI entry point. Returns the process exit code."""
+    args = build_parser().parse_args(argv)
+    try:
+        dialect = normalize_dialect(args.dialect)
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 2
+
+    start = time.perf_counter()
+    out_dir = Path(args.out)
+    separate = not args.no_separate_logic_nodes
+    cache_dir = None if args.no_cache else args.cache_dir
+    options = {"dialect": dialect, "separate_logic_nodes": separate}
+    if args.catalog:
+        try:
+            # スナップショットが変わったら全モデルを再描画する
+            options["catalog"] = content_hash(Path(args.catalog).read_text(encoding="utf-8"))
+        except OSError as e:
+            print(f"Error: {e}", file=sys.stderr)
+            return 2
+
+    if args.dig:
+        with ProcessPoolExecutor(max_workers=max(1, args.jobs)) as pool:
+            try:
+                total, failures = render_workflow(args.dig, out_dir, cache_dir, pool.submit)
+            except (OSError, ValueError) as e:
+                print(f"Error: {e}", file=sys.stderr)
+                return 1
+        elapsed = time.perf_counter() - start
+        print(f"{total} SQL tasks: {total - failures} parsed, {failures} failed ({elapsed:.2f}s)")
+        return 1 if failures else 0
+
+    if args.manifest:
+        options["manifest"] = True
+    elif not args.pattern:
+        print("Error: give a glob pattern, --manifest or --dig", file=sys.stderr)
+        return 2
+
+    previous = {} if args.force else load_manifest(out_dir, options)
+    models: dict[str, dict] = {}
+    futures: dict[str, tuple[str, object]] = {}  # rel_path -> (hash, future)
+
+    def is_unchanged(rel_path: str, digest: str) -> bool:
+        prev = previous.get(rel_path)
+        if prev and prev.get("hash") == digest and (out_dir / Path(rel_path).with_suffix(".json")).exists():
+            models[rel_path] = prev
+            return True
+        return False
+
+    # ワーカーは必要になった時点で起動する（ウォームランでは起動しない）
+    with ProcessPoolExecutor(max_workers=max(1, args.jobs)) as pool:
+        def submit(rel_path: str, sql: str, relations=None, model_dialect: str = dialect):
+            return pool.submit(
+                render_model, sql, rel_path, str(out_dir), model_dialect, separate, cache_dir, relations,
+                args.catalog
+            )
+
+        if args.manifest:
+            total = render_manifest(args.manifest, out_dir, dialect, is_unchanged, submit, futures)
+        else:
+            files = sorted(p for p in glob.glob(args.pattern, recursive=True) if os.path.isfile(p))
+            if not files:
+                print(f"No files matched: {args.pattern}", file=sys.stderr)
+                return 1
+            total = len(files)
+            base = glob_base(args.pattern)
+            for path in files:
+                rel_path = os.path.relpath(path, base)
+                sql = Path(path).read_text(encoding="utf-8")
+                digest = content_hash(sql)
+                if not is_unchanged(rel_path, digest):
+                    futures[rel_path] = (digest, submit(rel_path, sql))
+
+        failures = 0
+        for rel_path, (digest, future) in futures.items():
+            try:
+                models[rel_path] = {"hash": digest, "dialect": future.result()}
+            except Exception as e:
+                failures += 1
+                print(f"[ERROR] {rel_path}: {e}", file=sys.stderr)
+
+    save_manifest(out_dir, options, models)
+
+    elapsed = time.perf_counter() - start
+    print(
+        f"{total} models: {len(futures) - failures} rendered, "
+        f"{total - len(futures)} unchanged, {failures} failed ({elapsed:.2f}s)"
+    )
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
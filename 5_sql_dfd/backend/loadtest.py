@@ -0,0 +1,379 @@
+"""Load generator for the SQL DFD API.
+
+Replays a corpus of real and synthetic SQL models against ``/api/parse``
+(or any endpoint taking a SQLRequest body) at a fixed concurrency, either
+in-process (calling the ASGI app directly, pools and lifespan included) or
+against a running server such as ``uvicorn main:app --workers 4``.
+
+Usage:
+    python loadtest.py --corpus "../../98_digdag/queries/*.sql" --synthetic 50 -c 16 -n 2000
+    python loadtest.py --url http://127.0.0.1:8000 --server-pid 1234 -c 32 -d 30 --out run.json
+    python loadtest.py --compare baseline.json pool4.json nocache.json
+
+Results (throughput, p50/p95/p99 latency, error rate, CPU/memory per
+process) are written as JSON together with the run configuration and the
+SQL_DFD_* environment, so runs with different worker counts or cache
+settings can be compared with ``--compare``.
+"""
+
+import argparse
+import asyncio
+import glob
+import http.client
+import json
+import math
+import os
+import random
+import sys
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from urllib.parse import urlsplit
+
+from asgi_transport import ASGITransport
+
+_CLK_TCK = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+
+
+# ---------------------------------------------------------------------------
+# Corpus
+# ---------------------------------------------------------------------------
+
+def synthetic_model(n_ctes: int, seed: int) -> str:
+    """Generate a dbt-style model with refs, JOINs, WHERE, GROUP BY and UNION."""
+    rng = random.Random(seed)
+    ctes = []
+    for i in range(n_ctes):
+        kind = rng.choice(["ref", "join", "where", "group", "union"]) if i else "ref"
+        prev = f"cte_{i - 1}" if i else None
+        if kind == "ref" or prev is None:
+            body = f"select id, col_{i}, updated_at from {{{{ ref('model_{seed}_{i}') }}}}"
+        elif kind == "join":
+            body = (
+                f"select p.id, p.col_{i - 1}, r.col_{i} from {prev} p "
+                f"left join {{{{ ref('dim_{i}') }}}} r on p.id = r.id and r.active = true"
+            )
+        elif kind == "where":
+            body = f"select * from {prev} where col_{i - 1} > {rng.randint(0, 100)} and id is not null"
+        elif kind == "group":
+            body = f"select id, count(*) as cnt_{i}, sum(col_{i - 1}) as total_{i} from {prev} group by id"
+        else:
+            body = f"select id from {prev} union all select id from {{{{ ref('extra_{i}') }}}}"
+        ctes.append(f"cte_{i} as (\n    {body}\n)")
+    return "with " + ",\n".join(ctes) + f"\nselect * from cte_{n_ctes - 1}\n"
+
+
+def load_corpus(pattern: str | None, n_synthetic: int, synthetic_ctes: int) -> list[str]:
+    """Collect SQL bodies from a glob plus generated models."""
+    corpus = []
+    if pattern:
+        for path in sorted(glob.glob(pattern, recursive=True)):
+            if os.path.isfile(path):
+                corpus.append(Path(path).read_text(encoding="utf-8"))
+    corpus.extend(synthetic_model(synthetic_ctes, seed) for seed in range(n_synthetic))
+    return corpus
+
+
+# ---------------------------------------------------------------------------
+# Transports
+# ---------------------------------------------------------------------------
+
+class HTTPTransport:
+    """Keep-alive HTTP client for a running server (one connection per thread)."""
+
+    def __init__(self, url: str, timeout: float = 60.0):
+        parts = urlsplit(url)
+        self.host = parts.hostname or "127.0.0.1"
+        self.port = parts.port or 80
+        self.timeout = timeout
+        self._local = threading.local()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return None
+
+    def _post_blocking(self, path: str, body: bytes) -> tuple[int, int]:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        try:
+            conn.request("POST", path, body=body, headers={"Content-Type": "application/json"})
+            response = conn.getresponse()
+            return response.status, len(response.read())
+        except (OSError, http.client.HTTPException):
+            conn.close()
+            self._local.conn = None
+            raise
+
+    async def post(self, path: str, body: bytes) -> tuple[int, int]:
+        """POST a JSON body; returns (status, response byte count)."""
+        return await asyncio.to_thread(self._post_blocking, path, body)
+
+
+# ---------------------------------------------------------------------------
+# Process resource sampling (Linux /proc; falls back to this process only)
+# ---------------------------------------------------------------------------
+
+def _process_tree(pid: int) -> list[int]:
+    """Return pid and all its descendants."""
+    pids = [pid]
+    i = 0
+    while i < len(pids):
+        for children_file in glob.glob(f"/proc/{pids[i]}/task/*/children"):
+            try:
+                pids.extend(int(c) for c in Path(children_file).read_text().split())
+            except (OSError, ValueError):
+                pass
+        i += 1
+    return pids
+
+
+def _read_proc(pid: int) -> dict | None:
+    """Read CPU seconds and RSS/peak RSS for one process."""
+    try:
+        stat = Path(f"/proc/{pid}/stat").read_text()
+        fields = stat[stat.rindex(")") + 2:].split()
+        cpu = (int(fields[11]) + int(fields[12])) / _CLK_TCK  # utime + stime
+        status = Path(f"/proc/{pid}/status").read_text()
+    except (OSError, ValueError, IndexError):
+        return None
+    mem = {}
+    for line in status.splitlines():
+        key, _, value = line.partition(":")
+        if key in ("VmRSS", "VmHWM"):
+            mem[key] = int(value.split()[0]) * 1024
+    return {"cpu_seconds": cpu, "rss_bytes": mem.get("VmRSS", 0), "peak_rss_bytes": mem.get("VmHWM", 0)}
+
+
+def sample_processes(root_pid: int) -> dict[int, dict]:
+    """Snapshot CPU/memory for a process tree."""
+    samples = {}
+    for pid in _process_tree(root_pid):
+        info = _read_proc(pid)
+        if info:
+            samples[pid] = info
+    if not samples and root_pid == os.getpid():
+        import resource
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        samples[root_pid] = {
+            "cpu_seconds": usage.ru_utime + usage.ru_stime,
+            "rss_bytes": 0,
+            "peak_rss_bytes": usage.ru_maxrss * 1024,
+        }
+    return samples
+
+
+# ---------------------------------------------------------------------------
+# Runner
+# ---------------------------------------------------------------------------
+
+@dataclass
+class RunResult:
+    """Summary of one load-test run."""
+    requests: int = 0
+    errors: int = 0
+    duration_s: float = 0.0
+    throughput_rps: float = 0.0
+    error_rate: float = 0.0
+    latency_ms: dict = field(default_factory=dict)
+    status_counts: dict = field(default_factory=dict)
+    processes: list = field(default_factory=list)
+
+
+def percentile(sorted_values: list[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+async def run_load(
+    transport,
+    endpoint: str,
+    corpus: list[str],
+    concurrency: int,
+    total_requests: int | None,
+    duration_s: float | None,
+    options: dict,
+    unique: bool
+) -> tuple[list[float], dict[int, int], int, float]:
+    """Drive ``concurrency`` virtual users until the request count or duration is hit.
+
+    Returns:
+        (latencies in ms for successful requests, status counts, error count, wall seconds)
+    """
+    latencies: list[float] = []
+    statuses: dict[int, int] = {}
+    errors = 0
+    issued = 0
+    start = time.perf_counter()
+    deadline = start + duration_s if duration_s else None
+
+    def next_index() -> int | None:
+        nonlocal issued
+        if total_requests is not None and issued >= total_requests:
+            return None
+        if deadline is not None and time.perf_counter() >= deadline:
+            return None
+        issued += 1
+        return issued - 1
+
+    async def user():
+        nonlocal errors
+        while (i := next_index()) is not None:
+            sql = corpus[i % len(corpus)]
+            if unique:
+                # コメントを付与してキャッシュヒットを避ける
+                sql = f"{sql}\n-- loadtest {i}"
+            body = json.dumps({**options, "sql": sql}).encode()
+            t0 = time.perf_counter()
+            try:
+                status, _ = await transport.post(endpoint, body)
+            except Exception:
+                errors += 1
+                statuses[0] = statuses.get(0, 0) + 1
+                continue
+            elapsed = (time.perf_counter() - t0) * 1000
+            statuses[status] = statuses.get(status, 0) + 1
+            if 200 <= status < 300:
+                latencies.append(elapsed)
+            else:
+                errors += 1
+
+    await asyncio.gather(*(user() for _ in range(concurrency)))
+    return latencies, statuses, errors, time.perf_counter() - start
+
+
+def summarize(latencies, statuses, errors, wall, before, after) -> RunResult:
+    """Build a RunResult from raw measurements and process snapshots."""
+    total = sum(statuses.values())
+    ordered = sorted(latencies)
+    processes = []
+    for pid, end in after.items():
+        begin = before.get(pid, {"cpu_seconds": 0.0})
+        cpu = end["cpu_seconds"] - begin["cpu_seconds"]
+        processes.append({
+            "pid": pid,
+            "cpu_seconds": round(cpu, 3),
+            "cpu_percent": round(cpu / wall * 100, 1) if wall else 0.0,
+            "rss_bytes": end["rss_bytes"],
+            "peak_rss_bytes": end["peak_rss_bytes"],
+        })
+    return RunResult(
+        requests=total,
+        errors=errors,
+        duration_s=round(wall, 3),
+        throughput_rps=round(total / wall, 2) if wall else 0.0,
+        error_rate=round(errors / total, 4) if total else 0.0,
+        latency_ms={
+            "mean": round(sum(ordered) / len(ordered), 3) if ordered else 0.0,
+            "p50": round(percentile(ordered, 50), 3),
+            "p95": round(percentile(ordered, 95), 3),
+            "p99": round(percentile(ordered, 99), 3),
+            "max": round(ordered[-1], 3) if ordered else 0.0,
+        },
+        status_counts={str(k): v for k, v in sorted(statuses.items())},
+        processes=processes,
+    )
+
+
+def print_result(result: RunResult) -> None:
+    """Print a human-readable summary."""
+    lat = result.latency_ms
+    print(f"requests   {result.requests} in {result.duration_s}s ({result.throughput_rps} req/s)")
+    print(f"errors     {result.errors} ({result.error_rate * 100:.2f}%)  status={result.status_counts}")
+    print(f"latency ms p50={lat['p50']} p95={lat['p95']} p99={lat['p99']} max={lat['max']}")
+    for proc in result.processes:
+        print(
+            f"pid {proc['pid']:>7}  cpu {proc['cpu_percent']:>6}%  "
+            f"rss {proc['rss_bytes'] / 2**20:7.1f} MiB  peak {proc['peak_rss_bytes'] / 2**20:7.1f} MiB"
+        )
+
+
+def compare(paths: list[str]) -> None:
+    """Print several saved runs side by side."""
+    print(f"{'run':<28}{'conc':>6}{'req/s':>10}{'p50':>9}{'p95':>9}{'p99':>9}{'err%':>7}{'procs':>6}")
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        cfg, res = data["config"], data["result"]
+        lat = res["latency_ms"]
+        print(
+            f"{Path(path).stem[:27]:<28}{cfg['concurrency']:>6}{res['throughput_rps']:>10}"
+            f"{lat['p50']:>9}{lat['p95']:>9}{lat['p99']:>9}"
+            f"{res['error_rate'] * 100:>7.2f}{len(res['processes']):>6}"
+        )
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """Build the argument parser."""
+    ap = argparse.ArgumentParser(description="Load-test the SQL DFD API")
+    ap.add_argument("--url", help="Target a running server (default: in-process ASGI)")
+    ap.add_argument("--server-pid", type=int, help="Root pid of the server for CPU/memory sampling")
+    ap.add_argument("--endpoint", default="/api/parse", help="Endpoint taking a SQLRequest body")
+    ap.add_argument("--corpus", help='Glob of real SQL models, e.g. "models/**/*.sql"')
+    ap.add_argument("--synthetic", type=int, default=20, help="Number of synthetic models")
+    ap.add_argument("--synthetic-ctes", type=int, default=20, help="CTEs per synthetic model")
+    ap.add_argument("-c", "--concurrency", type=int, default=8)
+    ap.add_argument("-n", "--requests", type=int, help="Total requests (default 1000 unless --duration)")
+    ap.add_argument("-d", "--duration", type=float, help="Run for this many seconds")
+    ap.add_argument("--dialect", default="auto")
+    ap.add_argument("--unique", action="store_true", help="Make every SQL body unique (defeats the parse cache)")
+    ap.add_argument("--out", help="Write results as JSON to this file")
+    ap.add_argument("--compare", nargs="+", metavar="RESULT", help="Compare saved result files and exit")
+    return ap
+
+
+async def _main(args) -> RunResult:
+    corpus = load_corpus(args.corpus, args.synthetic, args.synthetic_ctes)
+    if not corpus:
+        raise SystemExit("Corpus is empty (use --corpus and/or --synthetic)")
+
+    total = args.requests if args.requests or args.duration else 1000
+    if args.url:
+        transport = HTTPTransport(args.url)
+        pid = args.server_pid
+    else:
+        from main import app
+        transport = ASGITransport(app)
+        pid = os.getpid()
+
+    async with transport:
+        before = sample_processes(pid) if pid else {}
+        latencies, statuses, errors, wall = await run_load(
+            transport, args.endpoint, corpus, args.concurrency, total, args.duration,
+            {"dialect": args.dialect}, args.unique,
+        )
+        after = sample_processes(pid) if pid else {}
+    return summarize(latencies, statuses, errors, wall, before, after)
+
+
+def main(argv: list[str] | None = None) -> int:
+    """CLI entry point. Returns the process exit code."""
+    args = build_parser().parse_args(argv)
+    if args.compare:
+        compare(args.compare)
+        return 0
+
+    result = asyncio.run(_main(args))
+    print_result(result)
+
+    if args.out:
+        config = {
+            key: getattr(args, key)
+            for key in ("url", "endpoint", "corpus", "synthetic", "synthetic_ctes",
+                        "concurrency", "requests", "duration", "dialect", "unique")
+        }
+        config["env"] = {k: v for k, v in os.environ.items() if k.startswith("SQL_DFD_")}
+        config["recorded_at"] = time.strftime("%Y-%m-%dT%H:%M:%S%z")
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump({"config": config, "result": asdict(result)}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
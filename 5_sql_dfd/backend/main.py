@@ -1,16 +1,92 @@
 """FastAPI backend for SQL DFD generation."""
 
-from fastapi import FastAPI, HTTPException
+import asyncio
+import math
+import os
+from contextlib import asynccontextmanager
+
+from fastapi import Depends, FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 
+from admission import AdmissionController, AdmissionRejected, RateLimiter
+from metrics import registry, start_memory_tracing, track_request
 from parser import parse_sql, generate_dfd
-from parser.dfd_generator import to_dict
+from parser.cache import LRUCache, cache_key
+from parser.catalog import SchemaCatalog
+from parser.complexity import estimate_complexity
+from parser.dfd_generator import DFDData, to_dict
+from parser.diff import diff_parsed
+from parser.dialects import resolve_dialect
+from parser.digdag import DigTask, StepResult, load_workflow, parse_step, workflow_dfd
+from parser.exporters import EXPORT_FORMATS, iter_chunks
+from parser.pool import DialectPools
+from parser.sql_parser import ParsedSQL, ParseLimits, SQLLimitExceeded
+
+# リクエストごとのパース制限（環境変数 SQL_DFD_MAX_SQL_BYTES / SQL_DFD_MAX_AST_NODES）
+PARSE_LIMITS = ParseLimits()
+# tracemalloc によるピークメモリ計測（全パースが遅くなるため既定は無効、調査時に "1" で有効化）
+TRACE_MEMORY = os.environ.get("SQL_DFD_TRACE_MEMORY", "0") == "1"
+# 方言ごとのウォーム済みパーサープロセス数（既定の 0 はプロセス内パース）
+# 有効にすると uvicorn ワーカーごとに「方言数 x POOL_WORKERS + HEAVY_WORKERS」個のプロセスを起動する
+#   例: SQL_DFD_POOL_WORKERS=1 SQL_DFD_HEAVY_WORKERS=1 uvicorn main:app
+# 複数コアを使う場合はプールより serve.py（ウォーム済みワーカーのプリフォーク）を推奨
+POOL_WORKERS = int(os.environ.get("SQL_DFD_POOL_WORKERS", "0"))
+# 大きなクエリ専用のパーサープロセス数（方言別プール使用時のみ）
+HEAVY_WORKERS = int(os.environ.get("SQL_DFD_HEAVY_WORKERS", "1"))
+# クライアントごとのレート制限（1秒あたりのリクエスト数 / バースト、0 で無効）
+RATE_LIMIT = float(os.environ.get("SQL_DFD_RATE_LIMIT", "0"))
+RATE_BURST = float(os.environ.get("SQL_DFD_RATE_BURST", str(max(RATE_LIMIT * 2, 1))))
+
+# SELECT * 展開用のスキーマスナップショット（INFORMATION_SCHEMA.COLUMNS の CSV/JSON）
+CATALOG_PATH = os.environ.get("SQL_DFD_CATALOG")
+CATALOG_RELOAD_SECONDS = float(os.environ.get("SQL_DFD_CATALOG_RELOAD_SECONDS", "2"))
+
+# パース結果キャッシュ（キー: 方言 + SQLのハッシュ）
+parse_cache: LRUCache[ParsedSQL] = LRUCache(int(os.environ.get("SQL_DFD_PARSE_CACHE_SIZE", "256")))
+# Digdag ステップのパース結果キャッシュ（キー: 方言 + スクリプトのハッシュ）
+step_cache: LRUCache[StepResult] = LRUCache(int(os.environ.get("SQL_DFD_STEP_CACHE_SIZE", "256")))
+dialect_pools = DialectPools(workers_per_dialect=POOL_WORKERS, heavy_workers=HEAVY_WORKERS)
+admission = AdmissionController()
+rate_limiter = RateLimiter(RATE_LIMIT, RATE_BURST)
+catalog: SchemaCatalog | None = None
+
+
+async def watch_catalog(catalog: SchemaCatalog) -> None:
+    """Reload the schema snapshot in a worker thread whenever the file changes."""
+    while True:
+        await asyncio.sleep(max(catalog.reload_interval, 0.1))
+        try:
+            # 読み込み中も handler は直前のスナップショットを使う（変更テーブル分のみ無効化）
+            await asyncio.to_thread(catalog.maybe_reload)
+        except Exception:
+            pass  # 書き込み途中などで読めなければ次の周期で再試行
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Load the schema catalog and start warm parser pools; stop them on shutdown."""
+    global catalog
+    watcher = None
+    if CATALOG_PATH:
+        catalog = await asyncio.to_thread(SchemaCatalog, CATALOG_PATH, CATALOG_RELOAD_SECONDS)
+        watcher = asyncio.create_task(watch_catalog(catalog))
+    await asyncio.to_thread(dialect_pools.start)
+    if TRACE_MEMORY and not dialect_pools.enabled:
+        start_memory_tracing()
+    registry.mark_startup("ready")
+    yield
+    if watcher is not None:
+        watcher.cancel()
+    dialect_pools.shutdown()
+
 
 app = FastAPI(
     title="SQL DFD API",
     description="API for generating Data Flow Diagrams from dbt SQL",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # CORS設定（開発時）
@@ -34,6 +110,20 @@ class SQLRequest(BaseModel):
     """SQL parse request."""
     sql: str
     separate_logic_nodes: bool = True  # JOIN/WHERE/GROUP BYを別ノードにするか
+    dialect: str = "auto"  # 'auto' / 'snowflake' / 'postgres' / 'bigquery'
+
+
+class DigdagRequest(BaseModel):
+    """Digdag workflow lineage request."""
+    dig: str  # .dig ファイルの内容
+    files: dict[str, str] = {}  # プロジェクト相対パス -> 内容（SQLスクリプト / !include 先）
+
+
+class DiffRequest(BaseModel):
+    """Semantic diff request (two versions of one model)."""
+    old_sql: str
+    new_sql: str
+    dialect: str = "auto"  # 'auto' は新しい版のSQLから判定し、両方に同じ方言を使う
 
 
 class DFDResponse(BaseModel):
@@ -54,7 +144,125 @@ async def health():
     return {"status": "ok"}
 
 
-@app.post("/api/parse", response_model=DFDResponse)
+@app.get("/metrics")
+async def metrics():
+    """Per-endpoint request metrics (latency and peak memory)."""
+    return {
+        **registry.snapshot(),
+        "parse_cache": parse_cache.stats(),
+        "step_cache": step_cache.stats(),
+        "catalog": catalog.stats() if catalog else None,
+        "admission": admission.stats(),
+        "rate_limit": rate_limiter.stats(),
+        "process": registry.process_snapshot(),
+    }
+
+
+async def parse_cached(sql: str, dialect: str, sample=None, lane: str = "fast") -> ParsedSQL:
+    """Parse SQL via the cache, then the warm pool for its dialect.
+
+    Args:
+        sql: SQL string
+        dialect: Concrete dialect name (already resolved)
+        sample: Optional metrics sample to receive the worker's peak memory
+        lane: Admission lane from admission.lane(); 'heavy' parses wait in
+            the bounded heavy queue and run on the heavy pool
+
+    Returns:
+        ParsedSQL (shared with the cache; treat as read-only)
+
+    Raises:
+        AdmissionRejected: If the heavy queue is full
+    """
+    key = cache_key(sql, dialect)
+    parsed = parse_cache.get(key)
+    if parsed is not None:
+        return parsed
+
+    async with admission.admit(lane):
+        if dialect_pools.enabled:
+            future = dialect_pools.submit(
+                sql, dialect, limits=PARSE_LIMITS, trace_memory=TRACE_MEMORY, heavy=lane == "heavy"
+            )
+            parsed, peak = await asyncio.wrap_future(future)
+            if sample is not None and peak is not None:
+                sample.peak_memory_bytes = peak
+        elif lane == "heavy":
+            # 大きなクエリはスレッドで処理し、イベントループを他のリクエストに空ける
+            parsed = await asyncio.to_thread(
+                parse_sql, sql, limits=PARSE_LIMITS, memory_conscious=True, dialect=dialect, recover=True
+            )
+        else:
+            parsed = parse_sql(sql, limits=PARSE_LIMITS, memory_conscious=True, dialect=dialect, recover=True)
+
+    parse_cache.put(key, parsed)
+    return parsed
+
+
+async def parse_expanded(sql: str, dialect: str, sample=None, lane: str = "fast") -> ParsedSQL:
+    """parse_cached(), then expand SELECT * from the schema snapshot if configured."""
+    parsed = await parse_cached(sql, dialect, sample, lane)
+    if catalog is not None:
+        # 再読み込みは watch_catalog() が行い、ここでは現在のスナップショットを読むだけ
+        parsed = catalog.expand(parsed)
+    return parsed
+
+
+def rejected(e: AdmissionRejected) -> HTTPException:
+    """HTTP error for a request turned away by admission control."""
+    headers = {"Retry-After": str(math.ceil(e.retry_after))} if e.status_code == 503 else None
+    return HTTPException(status_code=e.status_code, detail=str(e), headers=headers)
+
+
+async def rate_limit(request: Request) -> None:
+    """Per-client token bucket (client = X-Client-Id header, else remote address)."""
+    client = request.headers.get("x-client-id") or (request.client.host if request.client else "unknown")
+    wait = rate_limiter.acquire(client)
+    if wait:
+        raise HTTPException(
+            status_code=429, detail="Rate limit exceeded", headers={"Retry-After": str(math.ceil(wait))}
+        )
+
+
+async def build_dfd(request: SQLRequest, endpoint: str) -> DFDData:
+    """Validate, parse (cached) and generate the DFD for a request.
+
+    Raises:
+        HTTPException: 400 for bad input, 413/422 for limit violations,
+            503 when the heavy queue is full, 500 for unexpected failures
+    """
+    if not request.sql.strip():
+        raise HTTPException(status_code=400, detail="SQL cannot be empty")
+
+    try:
+        dialect = resolve_dialect(request.sql, request.dialect)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    # パース前の複雑度推定でレーンを決める（上限超過はここで拒否）
+    try:
+        lane = admission.lane(estimate_complexity(request.sql).score)
+    except AdmissionRejected as e:
+        raise rejected(e)
+
+    try:
+        trace_in_process = TRACE_MEMORY and not dialect_pools.enabled
+        with track_request(endpoint, trace_memory=trace_in_process) as sample:
+            # Parse SQL (AST is released before DFD generation)
+            parsed = await parse_expanded(request.sql, dialect, sample, lane)
+
+            # Generate DFD
+            return generate_dfd(parsed, separate_logic_nodes=request.separate_logic_nodes)
+
+    except AdmissionRejected as e:
+        raise rejected(e)
+    except SQLLimitExceeded as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to parse SQL: {str(e)}")
+
+
+@app.post("/api/parse", response_model=DFDResponse, dependencies=[Depends(rate_limit)])
 async def parse_sql_endpoint(request: SQLRequest):
     """Parse SQL and generate DFD data.
 
@@ -64,23 +272,132 @@ async def parse_sql_endpoint(request: SQLRequest):
     Returns:
         DFDResponse with nodes and edges for the diagram
     """
-    if not request.sql.strip():
+    dfd_data = await build_dfd(request, "/api/parse")
+
+    # Convert to dict
+    return to_dict(dfd_data)
+
+
+@app.post("/api/export/{fmt}", dependencies=[Depends(rate_limit)])
+async def export_endpoint(fmt: str, request: SQLRequest):
+    """Stream the DFD as a Mermaid flowchart or Graphviz DOT document.
+
+    Args:
+        fmt: 'mermaid' or 'dot'
+        request: SQLRequest with SQL string and options
+
+    Returns:
+        StreamingResponse that sends the document in chunks as it is rendered
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Unknown export format '{fmt}'. Use one of: {', '.join(EXPORT_FORMATS)}"
+        )
+    render, media_type = EXPORT_FORMATS[fmt]
+
+    # パースはストリーム開始前に行う（エラーを通常のHTTPステータスで返すため）
+    dfd_data = await build_dfd(request, f"/api/export/{fmt}")
+    return StreamingResponse(iter_chunks(render(dfd_data)), media_type=media_type)
+
+
+@app.post("/api/diff", dependencies=[Depends(rate_limit)])
+async def diff_endpoint(request: DiffRequest):
+    """Semantic diff between two versions of a model.
+
+    Both versions go through the parse cache (a version that only parses
+    CTE by CTE reuses unchanged fragments from the fragment cache), and
+    CTEs are aligned by their stable DFD node ids.
+
+    Args:
+        request: DiffRequest with the old and new SQL
+
+    Returns:
+        Added/removed CTEs and, per changed CTE, the added/removed/changed
+        sources, columns, joins, predicates and GROUP BY items
+    """
+    if not request.old_sql.strip() and not request.new_sql.strip():
         raise HTTPException(status_code=400, detail="SQL cannot be empty")
 
     try:
-        # Parse SQL
-        parsed = parse_sql(request.sql)
+        dialect = resolve_dialect(request.new_sql or request.old_sql, request.dialect)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    try:
+        old_lane = admission.lane(estimate_complexity(request.old_sql).score)
+        new_lane = admission.lane(estimate_complexity(request.new_sql).score)
+    except AdmissionRejected as e:
+        raise rejected(e)
 
-        # Generate DFD
-        dfd_data = generate_dfd(parsed, separate_logic_nodes=request.separate_logic_nodes)
+    try:
+        with track_request("/api/diff"):
+            old, new = await asyncio.gather(
+                parse_expanded(request.old_sql, dialect, lane=old_lane),
+                parse_expanded(request.new_sql, dialect, lane=new_lane),
+            )
+            return {"dialect": dialect, **diff_parsed(old, new)}
+    except AdmissionRejected as e:
+        raise rejected(e)
+    except SQLLimitExceeded as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to diff SQL: {str(e)}")
 
-        # Convert to dict
-        result = to_dict(dfd_data)
 
+async def parse_step_cached(task: DigTask, files: dict[str, str]) -> StepResult:
+    """Parse one SQL task's script via the step cache and the warm pools."""
+    sql = files.get(task.command)
+    if sql is None:
+        return StepResult(error=f"Missing file: {task.command}")
+
+    key = cache_key(sql, task.dialect)
+    result = step_cache.get(key)
+    if result is not None:
         return result
 
+    if dialect_pools.enabled:
+        future = dialect_pools.submit_call(task.dialect, parse_step, sql, task.dialect, PARSE_LIMITS)
+        result = await asyncio.wrap_future(future)
+    else:
+        result = await asyncio.to_thread(parse_step, sql, task.dialect, PARSE_LIMITS)
+
+    step_cache.put(key, result)
+    return result
+
+
+@app.post("/api/digdag", response_model=DFDResponse, dependencies=[Depends(rate_limit)])
+async def digdag_endpoint(request: DigdagRequest):
+    """Generate workflow-level lineage for a Digdag workflow.
+
+    Args:
+        request: DigdagRequest with the .dig text and the files it refers to
+
+    Returns:
+        DFDResponse with task, table and ordering nodes/edges
+    """
+    def read_text(path: str) -> str:
+        if path not in request.files:
+            raise ValueError(f"Missing file: {path}")
+        return request.files[path]
+
+    try:
+        tasks = load_workflow(request.dig, read_text)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    try:
+        with track_request("/api/digdag"):
+            sql_tasks = [task for task in tasks if task.dialect]
+            # 各ステップのSQLは並列にパースする
+            results = await asyncio.gather(*(parse_step_cached(task, request.files) for task in sql_tasks))
+            dfd_data = workflow_dfd(tasks, {task.name: result for task, result in zip(sql_tasks, results)})
+    except SQLLimitExceeded as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to parse SQL: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to parse workflow: {str(e)}")
+
+    return to_dict(dfd_data)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,132 @@
+"""In-process request metrics for the SQL DFD API."""
+
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+
+
+@dataclass
+class RequestSample:
+    """Measurements for a single request."""
+    duration_ms: float
+    peak_memory_bytes: int | None = None
+
+
+@dataclass
+class EndpointMetrics:
+    """Aggregated metrics for one endpoint."""
+    count: int = 0
+    errors: int = 0
+    total_ms: float = 0.0
+    max_ms: float = 0.0
+    max_peak_memory_bytes: int = 0
+    last: RequestSample | None = None
+
+
+@dataclass
+class MetricsRegistry:
+    """Thread-safe registry of per-endpoint metrics."""
+    endpoints: dict[str, EndpointMetrics] = field(default_factory=dict)
+    # プロセス起動からの経過（ms）: preload_ms / ready_ms など
+    startup: dict[str, float] = field(default_factory=dict)
+    first_request_ms: float | None = None
+    process_started: float = field(default_factory=time.perf_counter)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def reset(self) -> None:
+        """Forget all samples and restart the process clock (e.g. after fork)."""
+        with self._lock:
+            self.endpoints.clear()
+            self.startup.clear()
+            self.first_request_ms = None
+            self.process_started = time.perf_counter()
+
+    def mark_startup(self, phase: str) -> None:
+        """Record the time from process start to ``phase`` (e.g. 'ready')."""
+        with self._lock:
+            self.startup[f"{phase}_ms"] = round((time.perf_counter() - self.process_started) * 1000, 3)
+
+    def record(self, endpoint: str, sample: RequestSample, error: bool = False) -> None:
+        """Record one request sample for an endpoint."""
+        with self._lock:
+            if self.first_request_ms is None:
+                self.first_request_ms = round(sample.duration_ms, 3)
+            m = self.endpoints.setdefault(endpoint, EndpointMetrics())
+            m.count += 1
+            if error:
+                m.errors += 1
+            m.total_ms += sample.duration_ms
+            m.max_ms = max(m.max_ms, sample.duration_ms)
+            if sample.peak_memory_bytes is not None:
+                m.max_peak_memory_bytes = max(m.max_peak_memory_bytes, sample.peak_memory_bytes)
+            m.last = sample
+
+    def process_snapshot(self) -> dict:
+        """Return cold-start and first-request latency for this process."""
+        with self._lock:
+            return {
+                "pid": os.getpid(),
+                "startup": dict(self.startup),
+                "first_request_ms": self.first_request_ms,
+            }
+
+    def snapshot(self) -> dict:
+        """Return metrics as a JSON-serializable dict."""
+        with self._lock:
+            return {
+                name: {
+                    "count": m.count,
+                    "errors": m.errors,
+                    "avg_ms": round(m.total_ms / m.count, 3) if m.count else 0.0,
+                    "max_ms": round(m.max_ms, 3),
+                    "max_peak_memory_bytes": m.max_peak_memory_bytes,
+                    "last_duration_ms": round(m.last.duration_ms, 3) if m.last else None,
+                    "last_peak_memory_bytes": m.last.peak_memory_bytes if m.last else None,
+                }
+                for name, m in self.endpoints.items()
+            }
+
+
+registry = MetricsRegistry()
+
+
+def start_memory_tracing() -> None:
+    """Start tracemalloc ahead of time so the first request does not pay for it."""
+    if not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+@contextmanager
+def track_request(endpoint: str, trace_memory: bool = False):
+    """Time a request and optionally record its peak traced memory.
+
+    Peak memory comes from tracemalloc, which is process-wide, so the value is
+    approximate when several requests are in flight at once.
+
+    Usage:
+        with track_request("/api/parse", trace_memory=True) as sample:
+            ...
+    """
+    if trace_memory:
+        # Tracing stays on once started; toggling it per request would race
+        start_memory_tracing()
+        tracemalloc.reset_peak()
+        baseline, _ = tracemalloc.get_traced_memory()
+
+    sample = RequestSample(duration_ms=0.0)
+    start = time.perf_counter()
+    error = False
+    try:
+        yield sample
+    except BaseException:
+        error = True
+        raise
+    finally:
+        sample.duration_ms = (time.perf_counter() - start) * 1000
+        if trace_memory:
+            _, peak = tracemalloc.get_traced_memory()
+            sample.peak_memory_bytes = max(peak - baseline, 0)
+        registry.record(endpoint, sample, error=error)
@@ -0,0 +1,106 @@
+"""Content-hash keyed caches (in-memory LRU and on-disk) for parse results."""
+
+import hashlib
+import os
+import pickle
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Generic, Hashable, Optional, TypeVar
+
+V = TypeVar("V")
+
+
+def content_hash(text: str) -> str:
+    """Return the SHA-256 hex digest of a text body."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def cache_key(sql: str, dialect: str) -> tuple[str, str]:
+    """Build the parse cache key for a SQL body in a given dialect."""
+    return (dialect, content_hash(sql))
+
+
+class LRUCache(Generic[V]):
+    """Small thread-safe LRU cache."""
+
+    def __init__(self, maxsize: int = 256):
+        self.maxsize = maxsize
+        self._data: OrderedDict[Hashable, V] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Optional[V]:
+        """Return the cached value (marking it recently used) or None."""
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return None
+
+    def put(self, key: Hashable, value: V) -> None:
+        """Store a value, evicting the least recently used entry if full."""
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        """Drop every entry and reset the hit/miss counters."""
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> dict:
+        """Return hit/miss counters and current size."""
+        return {"size": len(self._data), "maxsize": self.maxsize, "hits": self.hits, "misses": self.misses}
+
+
+class DiskCache:
+    """On-disk cache of pickled values keyed by ``cache_key`` tuples.
+
+    Entries live at ``<root>/v<VERSION>/<dialect>/<hash[:2]>/<hash>.pkl`` and are
+    written atomically, so concurrent CLI workers can share one directory.
+    Bump VERSION whenever the cached dataclasses change shape.
+    """
+
+    VERSION = 2
+
+    def __init__(self, root: str | Path):
+        self.root = Path(root) / f"v{self.VERSION}"
+
+    def _path(self, key: tuple[str, str]) -> Path:
+        namespace, digest = key
+        return self.root / namespace / digest[:2] / f"{digest}.pkl"
+
+    def get(self, key: tuple[str, str]) -> Optional[Any]:
+        """Return the cached value or None (also on unreadable entries)."""
+        try:
+            with open(self._path(key), "rb") as f:
+                return pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError):
+            return None
+
+    def put(self, key: tuple[str, str], value: Any) -> None:
+        """Store a value atomically (write to a temp file, then rename)."""
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, path)
+        except BaseException:
+            Path(tmp).unlink(missing_ok=True)
+            raise
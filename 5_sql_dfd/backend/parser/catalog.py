@@ -0,0 +1,273 @@
+"""Schema catalog snapshot for expanding ``SELECT *``.
+
+The snapshot is a dump of ``INFORMATION_SCHEMA.COLUMNS`` as CSV or JSON
+(a list of rows, or ``{"table": ["col", ...]}``). Only TABLE_NAME,
+COLUMN_NAME and, when present, TABLE_SCHEMA / TABLE_CATALOG /
+ORDINAL_POSITION are used; header names are case-insensitive.
+
+Expansion runs on an already-parsed ParsedSQL, so the parse cache stays
+valid across catalog reloads. Expanded column lists are memoized per CTE
+together with the catalog tables they were built from; reloading a changed
+snapshot drops only the entries that used a table whose columns changed.
+"""
+
+import csv
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import replace
+from pathlib import Path
+from typing import Hashable, Optional
+
+from .cache import content_hash
+from .sql_parser import Column, CTEInfo, ParsedSQL
+
+
+def _normalize(name: str) -> str:
+    """Catalog lookup key: unquoted, upper-cased (Snowflake folding)."""
+    return name.strip().strip('"`').upper()
+
+
+def _read_rows(path: Path) -> list[dict]:
+    """Read snapshot rows from CSV or JSON, with upper-cased keys."""
+    with open(path, encoding="utf-8", newline="") as f:
+        if path.suffix.lower() == ".csv":
+            rows = list(csv.DictReader(f))
+        else:
+            data = json.load(f)
+            if isinstance(data, dict):
+                rows = [
+                    {"TABLE_NAME": table, "COLUMN_NAME": column, "ORDINAL_POSITION": i}
+                    for table, columns in data.items()
+                    for i, column in enumerate(columns, 1)
+                ]
+            else:
+                rows = data
+    return [{str(k).upper(): v for k, v in row.items()} for row in rows]
+
+
+def build_index(rows: list[dict]) -> dict[str, tuple[str, ...]]:
+    """Map table name (bare, schema.table and db.schema.table) -> columns.
+
+    A bare table name present in several schemas resolves to the first one
+    in the snapshot; qualified names are always exact.
+    """
+    tables: dict[tuple[str, ...], list[tuple[int, str]]] = {}
+    for row in rows:
+        if not row.get("TABLE_NAME") or not row.get("COLUMN_NAME"):
+            continue
+        qualified = tuple(
+            _normalize(str(row[part])) for part in ("TABLE_CATALOG", "TABLE_SCHEMA", "TABLE_NAME") if row.get(part)
+        )
+        position = int(row.get("ORDINAL_POSITION") or 0) or len(tables.get(qualified, ())) + 1
+        tables.setdefault(qualified, []).append((position, str(row["COLUMN_NAME"])))
+
+    index: dict[str, tuple[str, ...]] = {}
+    for qualified, columns in tables.items():
+        ordered = tuple(name for _, name in sorted(columns))
+        for i in range(len(qualified)):
+            index.setdefault(".".join(qualified[i:]), ordered)
+    return index
+
+
+class SchemaCatalog:
+    """In-memory column index loaded from a snapshot file, with hot reload.
+
+    Args:
+        path: Snapshot file (.csv or .json)
+        reload_interval: Minimum seconds between mtime checks in maybe_reload()
+        memo_size: Maximum number of memoized CTE expansions
+    """
+
+    def __init__(self, path: str | Path, reload_interval: float = 2.0, memo_size: int = 4096):
+        self.path = Path(path)
+        self.reload_interval = reload_interval
+        self.memo_size = memo_size
+        self.tables: dict[str, tuple[str, ...]] = {}
+        self.mtime: Optional[float] = None
+        self.reloads = 0
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        # CTE定義 -> (展開後カラム, 参照したカタログテーブル)
+        self._memo: OrderedDict[Hashable, tuple[list[Column], frozenset[str]]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.load()
+
+    def load(self) -> set[str]:
+        """(Re)load the snapshot and drop memo entries for changed tables.
+
+        Returns:
+            Lookup keys of tables that were added, removed or changed
+        """
+        mtime = self.path.stat().st_mtime
+        tables = build_index(_read_rows(self.path))
+        with self._lock:
+            if self.mtime is not None:
+                self.reloads += 1
+            changed = {
+                name for name in self.tables.keys() | tables.keys()
+                if self.tables.get(name) != tables.get(name)
+            }
+            self.tables = tables
+            self.mtime = mtime
+            self._memo = OrderedDict(
+                (key, entry) for key, entry in self._memo.items() if not entry[1] & changed
+            )
+        return changed
+
+    def maybe_reload(self) -> Optional[set[str]]:
+        """Reload if the file changed (checked at most every reload_interval).
+
+        Returns:
+            Changed table keys if a reload happened, else None
+        """
+        now = time.monotonic()
+        if now - self._checked_at < self.reload_interval:
+            return None
+        self._checked_at = now
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except OSError:
+            return None  # 一時的に消えていても直前のスナップショットを使い続ける
+        if mtime == self.mtime:
+            return None
+        return self.load()
+
+    def columns(self, table: str) -> Optional[tuple[str, ...]]:
+        """Columns of a table in ordinal order, or None if unknown."""
+        return self.tables.get(_normalize(table))
+
+    def _memo_get(self, key: Hashable):
+        with self._lock:
+            entry = self._memo.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._memo.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def _memo_put(self, key: Hashable, entry) -> None:
+        if self.memo_size <= 0:
+            return
+        with self._lock:
+            self._memo[key] = entry
+            while len(self._memo) > self.memo_size:
+                self._memo.popitem(last=False)
+
+    def stats(self) -> dict:
+        """Snapshot size and memo hit/miss counters."""
+        return {
+            "path": str(self.path),
+            "tables": len(self.tables),
+            "reloads": self.reloads,
+            "memo_size": len(self._memo),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+    def _expand_cte(
+        self,
+        cte: CTEInfo,
+        outputs: dict[str, tuple[list[str], frozenset[str]]]
+    ) -> tuple[list[Column], frozenset[str]]:
+        """Expand the ``*`` columns of one CTE.
+
+        Args:
+            outputs: Already expanded CTE name -> (output column names, catalog deps)
+
+        Returns:
+            (columns, catalog tables the expansion depends on)
+        """
+        sources = list(cte.source_tables) + [join.right_table for join in cte.joins]
+        aliases = {join.right_table_alias: join.right_table for join in cte.joins if join.right_table_alias}
+        upstream = {name: outputs[name] for name in sources if name in outputs}
+        # 上流CTEは展開後のカラム名でキーに含める（依存テーブル集合は値側で保持）
+        upstream_names = sorted((name, names) for name, (names, _) in upstream.items())
+        key = content_hash(repr((cte.columns, sources, aliases, upstream_names)))
+        cached = self._memo_get(key)
+        if cached is not None:
+            return cached
+
+        deps: set[str] = set()
+        columns: list[Column] = []
+
+        def source_columns(table: str) -> Optional[list[str]]:
+            if table in upstream:
+                names, upstream_deps = upstream[table]
+                deps.update(upstream_deps)
+                return names
+            deps.add(_normalize(table))
+            found = self.columns(table)
+            return list(found) if found is not None else None
+
+        for column in cte.columns:
+            if column.name != "*":
+                columns.append(column)
+                continue
+            if column.source_table:
+                table = aliases.get(column.source_table, column.source_table)
+                if table not in sources and len(cte.source_tables) == 1:
+                    table = cte.source_tables[0]  # FROM 句のエイリアス（t.*）
+                targets = [table] if table in sources else []
+            else:
+                targets = sources
+            expanded = []
+            for table in targets:
+                names = source_columns(table)
+                if names is None:
+                    expanded = None
+                    break
+                expanded.extend(Column(name=name, source_table=table) for name in names)
+            # 解決できないテーブルを含む * は展開しない
+            columns.extend(expanded if expanded else [column])
+
+        entry = (columns, frozenset(deps))
+        self._memo_put(key, entry)
+        return entry
+
+    def expand(self, parsed: ParsedSQL) -> ParsedSQL:
+        """Return a copy of ``parsed`` with ``*`` expanded where resolvable.
+
+        CTEs are expanded in definition order so a ``*`` over an earlier CTE
+        uses that CTE's expanded output. ``parsed`` itself is not modified
+        (it may be shared with the parse cache).
+        """
+        outputs: dict[str, tuple[list[str], frozenset[str]]] = {}
+        changed = False
+
+        def expand_one(cte: Optional[CTEInfo]) -> Optional[CTEInfo]:
+            nonlocal changed
+            if cte is None or cte.error:
+                return cte
+            if not any(column.name == "*" for column in cte.columns):
+                result = cte
+                deps = frozenset()
+            else:
+                columns, deps = self._expand_cte(cte, outputs)
+                result = replace(cte, columns=columns)
+                changed = True
+            outputs[cte.name] = ([column.alias or column.name for column in result.columns], deps)
+            return result
+
+        ctes = [expand_one(cte) for cte in parsed.ctes]
+        final_select = expand_one(parsed.final_select)
+        if not changed:
+            return parsed
+        return replace(parsed, ctes=ctes, final_select=final_select)
+
+
+_catalogs: dict[str, SchemaCatalog] = {}
+
+
+def get_catalog(path: str) -> SchemaCatalog:
+    """Process-wide catalog for a snapshot path (reloaded if the file changed)."""
+    catalog = _catalogs.get(path)
+    if catalog is None:
+        catalog = _catalogs[path] = SchemaCatalog(path, reload_interval=0)
+    else:
+        catalog.maybe_reload()
+    return catalog
@@ -0,0 +1,68 @@
+"""Cheap pre-parse complexity estimate for admission control.
+
+Everything here is a handful of C-level regex scans over the raw text, so
+it costs a small fraction of a parse and can run before a query is queued.
+"""
+
+import os
+import re
+from dataclasses import dataclass
+
+_TOKEN = re.compile(r"\w+|[^\s\w]")
+_UNION = re.compile(r"\b(?:union|intersect|except)\b", re.IGNORECASE)
+_JOIN = re.compile(r"\bjoin\b", re.IGNORECASE)
+_PAREN = re.compile(r"[()]")
+
+# スコアの重み（1トークン = 1）。UNION分岐とJOINはパース後の処理も重いため加点
+UNION_WEIGHT = int(os.environ.get("SQL_DFD_UNION_WEIGHT", 200))
+JOIN_WEIGHT = int(os.environ.get("SQL_DFD_JOIN_WEIGHT", 50))
+DEPTH_WEIGHT = int(os.environ.get("SQL_DFD_DEPTH_WEIGHT", 100))
+
+
+@dataclass(frozen=True)
+class Complexity:
+    """Size/shape estimate of a SQL body."""
+    tokens: int
+    unions: int
+    joins: int
+    max_depth: int  # 括弧のネストの深さ（サブクエリ・CTE本体）
+
+    @property
+    def score(self) -> int:
+        """Weighted cost used to pick a lane (roughly proportional to parse time)."""
+        return (
+            self.tokens
+            + self.unions * UNION_WEIGHT
+            + self.joins * JOIN_WEIGHT
+            + self.max_depth * DEPTH_WEIGHT
+        )
+
+    def to_dict(self) -> dict:
+        return {
+            "tokens": self.tokens,
+            "unions": self.unions,
+            "joins": self.joins,
+            "max_depth": self.max_depth,
+            "score": self.score,
+        }
+
+
+def estimate_complexity(sql: str) -> Complexity:
+    """Estimate how expensive ``sql`` is to parse, without parsing it.
+
+    Keywords inside strings or comments are counted too; the estimate only
+    has to rank queries, not be exact.
+    """
+    depth = max_depth = 0
+    for m in _PAREN.finditer(sql):
+        if m.group(0) == "(":
+            depth += 1
+            max_depth = max(max_depth, depth)
+        elif depth:
+            depth -= 1
+    return Complexity(
+        tokens=len(_TOKEN.findall(sql)),
+        unions=len(_UNION.findall(sql)),
+        joins=len(_JOIN.findall(sql)),
+        max_depth=max_depth,
+    )
@@ -0,0 +1,256 @@
+"""Streaming reader for dbt ``target/manifest.json``.
+
+dbt already writes each model's compiled SQL (``compiled_code``) and its
+dependencies (``depends_on.nodes``) into the manifest, so lineage can be
+built from that file alone: no Jinja preprocessing, and ``ref()`` /
+``source()`` are resolved through the manifest's ``relation_name`` values
+instead of regexes.
+
+The reader walks the top-level JSON object incrementally and decodes one
+node at a time; sections it does not need (macros, docs, ...) are skipped
+without being materialized, scanning a chunk at a time with C-level
+string operations, so reading a manifest is faster than ``json.load``.
+"""
+
+import json
+import re
+from dataclasses import dataclass, field
+from itertools import accumulate
+from typing import Iterator, Optional, TextIO
+
+from .dfd_generator import DFDData, DFDEdge, DFDNode
+
+# 入力SQLとして扱うリソース種別
+SQL_RESOURCE_TYPES = ("model", "snapshot", "analysis")
+
+_WHITESPACE = " \t\r\n"
+# チャンク末尾で切れた数値の続き（"1." / "1e" など）
+_NUMBER_TAIL = re.compile(r"[0-9.eE+-]*")
+_NON_BRACKET = re.compile(r"[^{}\[\]]+")
+_BRACKET_DEPTH = {"{": 1, "[": 1, "}": -1, "]": -1}
+
+
+class _JSONStream:
+    """Minimal pull reader over a JSON text file."""
+
+    def __init__(self, f: TextIO, chunk_size: int = 1 << 20):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def _fill(self, size: Optional[int] = None) -> bool:
+        """Append more text to the buffer; False at end of file."""
+        if self.eof:
+            return False
+        chunk = self.f.read(size or self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        # 消費済みの部分は捨てる
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        """Return the next non-whitespace character (without consuming it)."""
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                raise ValueError("Unexpected end of manifest")
+
+    def expect(self, char: str) -> None:
+        if self.peek() != char:
+            raise ValueError(f"Expected '{char}' in manifest, got '{self.buf[self.pos]}'")
+        self.pos += 1
+
+    def read_value(self):
+        """Decode and return the next complete JSON value."""
+        self.peek()
+        size = self.chunk_size
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                value, end = None, -1
+            # 数値は途中で切れていてもデコードできてしまうため、後ろに数値の続きしか無ければ読み足す
+            if end >= 0 and (self.eof or not _NUMBER_TAIL.fullmatch(self.buf, end)):
+                self.pos = end
+                return value
+            if not self._fill(size):
+                raise ValueError("Truncated value in manifest")
+            size *= 2  # 大きな値で再デコードが二乗時間にならないよう倍々で読む
+
+    def skip_value(self) -> None:
+        """Skip the next JSON value without building it.
+
+        Works a chunk at a time with C-level string operations: escapes are
+        blanked out (keeping offsets), so every remaining '"' delimits a
+        string, and only the text between strings is checked for brackets.
+        """
+        if self.peek() not in "{[":
+            self.read_value()
+            return
+        depth = 0
+        size = self.chunk_size
+        while True:
+            text = self.buf[self.pos:].replace("\\\\", "__").replace('\\"', "__")
+            # 偶数番目が文字列の外、奇数番目が文字列の中身
+            parts = text.split('"')
+            if len(parts) % 2 == 0:
+                parts.pop()  # チャンク末尾で切れた文字列は次のチャンクと合わせて読み直す
+            brackets = _NON_BRACKET.sub("", "".join(parts[0::2]))
+            deltas = [_BRACKET_DEPTH[c] for c in brackets]
+            if deltas and depth + min(accumulate(deltas)) <= 0:
+                # このチャンク内で値が閉じる: 閉じ括弧の位置を探す
+                offset = self.pos
+                for i, part in enumerate(parts):
+                    if i % 2 == 0:
+                        for j, c in enumerate(part):
+                            if c in "{[":
+                                depth += 1
+                            elif c in "}]":
+                                depth -= 1
+                                if depth == 0:
+                                    self.pos = offset + j + 1
+                                    return
+                    offset += len(part) + 1
+            depth += sum(deltas)
+            consumed = sum(map(len, parts)) + len(parts) - 1
+            self.pos += consumed
+            # 1つの文字列がチャンクより長い場合は倍々で読む（読み直しで二乗時間にならないように）
+            size = size * 2 if consumed == 0 else self.chunk_size
+            if not self._fill(size):
+                raise ValueError("Truncated value in manifest")
+
+    def iter_object(self) -> Iterator[str]:
+        """Iterate the keys of the object at the cursor.
+
+        After each key is yielded the caller must consume its value with
+        read_value() or skip_value().
+        """
+        self.expect("{")
+        if self.peek() == "}":
+            self.pos += 1
+            return
+        while True:
+            key = self.read_value()
+            self.expect(":")
+            yield key
+            if self.peek() == ",":
+                self.pos += 1
+                continue
+            self.expect("}")
+            return
+
+
+def iter_manifest(f: TextIO, sections: tuple[str, ...] = ("nodes", "sources")) -> Iterator[tuple[str, str, dict]]:
+    """Stream entries from a dbt manifest.
+
+    Yields:
+        ("metadata", "", metadata) first if present, then
+        (section, unique_id, entry) for every entry of the requested sections
+    """
+    stream = _JSONStream(f)
+    for key in stream.iter_object():
+        if key == "metadata":
+            yield "metadata", "", stream.read_value()
+        elif key in sections:
+            for unique_id in stream.iter_object():
+                yield key, unique_id, stream.read_value()
+        else:
+            stream.skip_value()
+
+
+def _relation_label(entry: dict) -> str:
+    """Display name for a model/source (what ref()/source() would show)."""
+    if entry.get("resource_type") == "source":
+        return entry.get("identifier") or entry.get("name", "")
+    return entry.get("alias") or entry.get("name", "")
+
+
+@dataclass
+class ManifestModel:
+    """A SQL node from the manifest, ready for the parser stage."""
+    unique_id: str
+    name: str
+    path: str  # original_file_path（出力ファイル名に使う）
+    compiled_code: str
+    depends_on: list[str] = field(default_factory=list)
+
+
+@dataclass
+class ManifestIndex:
+    """What the lineage step needs from the manifest besides the SQL."""
+    adapter_type: Optional[str] = None
+    relations: dict[str, str] = field(default_factory=dict)  # unique_id -> relation_name
+    labels: dict[str, str] = field(default_factory=dict)  # unique_id -> display name
+    depends_on: dict[str, list[str]] = field(default_factory=dict)  # unique_id -> upstream ids
+
+    def relations_for(self, model: ManifestModel) -> dict[str, str]:
+        """relation_name -> display name for a model's direct dependencies."""
+        return {
+            self.relations[dep]: self.labels.get(dep, dep)
+            for dep in model.depends_on
+            if self.relations.get(dep)
+        }
+
+
+def read_manifest(f: TextIO, index: ManifestIndex) -> Iterator[ManifestModel]:
+    """Stream SQL models out of a manifest while filling ``index``.
+
+    Models are yielded as soon as they are read so parsing can start before
+    the whole file has been consumed. A model's relations can be resolved
+    once all of its ``depends_on`` ids are in ``index.labels``; sources
+    usually come after the nodes section, so some models have to wait until
+    the generator is exhausted.
+    """
+    for section, unique_id, entry in iter_manifest(f):
+        if section == "metadata":
+            index.adapter_type = entry.get("adapter_type")
+            continue
+        index.labels[unique_id] = _relation_label(entry)
+        if entry.get("relation_name"):
+            index.relations[unique_id] = entry["relation_name"]
+        depends_on = (entry.get("depends_on") or {}).get("nodes") or []
+        index.depends_on[unique_id] = list(depends_on)
+
+        if section != "nodes" or entry.get("resource_type") not in SQL_RESOURCE_TYPES:
+            continue
+        # dbt 1.5 以降は compiled_code、それ以前は compiled_sql
+        compiled = entry.get("compiled_code") or entry.get("compiled_sql")
+        if not compiled:
+            continue
+        yield ManifestModel(
+            unique_id=unique_id,
+            name=entry.get("name", unique_id),
+            path=entry.get("original_file_path") or f"{entry.get('name', unique_id)}.sql",
+            compiled_code=compiled,
+            depends_on=list(depends_on),
+        )
+
+
+def project_lineage(index: ManifestIndex) -> DFDData:
+    """Model/source-level lineage graph built from ``depends_on``."""
+    known = set(index.labels)
+    nodes = []
+    edges = []
+    for unique_id in sorted(index.depends_on):
+        resource_type = unique_id.split(".", 1)[0]
+        if resource_type not in SQL_RESOURCE_TYPES + ("source", "seed"):
+            continue
+        nodes.append(DFDNode(
+            id=unique_id,
+            type="table",
+            label=index.labels.get(unique_id, unique_id),
+            columns=[f"({resource_type})"]
+        ))
+        for upstream in index.depends_on[unique_id]:
+            if upstream in known:
+                edges.append(DFDEdge(id=f"{upstream}->{unique_id}", source=upstream, target=unique_id))
+    return DFDData(nodes=nodes, edges=edges)
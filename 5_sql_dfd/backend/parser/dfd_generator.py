@@ -14,6 +14,8 @@ class DFDNode:
     label: str
     columns: list[str] = field(default_factory=list)
     logic_type: str | None = None  # 'where', 'join', 'groupby'
+    error: str | None = None  # パースに失敗したCTEのエラーメッセージ
+    error_span: tuple[int, int] | None = None  # 入力SQL内の失敗箇所（文字オフセット）
 
 
 @dataclass
@@ -99,6 +101,19 @@ def generate_dfd(parsed: ParsedSQL, separate_logic_nodes: bool = True) -> DFDDat
         base_id = "output" if is_output else f"cte-{cte.name}"
         current_node_id = base_id
 
+        # Placeholder for a CTE that failed to parse (recovery mode)
+        if cte.error:
+            nodes.append(DFDNode(
+                id=base_id,
+                type="table",
+                label="OUTPUT" if is_output else cte.name,
+                columns=["(parse error)"],
+                error=cte.error,
+                error_span=cte.error_span
+            ))
+            node_map[cte.name] = base_id
+            return current_node_id
+
         # Column names
         column_names = [
             col.alias or col.name for col in cte.columns
@@ -364,7 +379,9 @@ def to_dict(dfd_data: DFDData) -> dict:
                 "type": node.type,
                 "label": node.label,
                 "columns": node.columns,
-                "logicType": node.logic_type
+                "logicType": node.logic_type,
+                "error": node.error,
+                "errorSpan": list(node.error_span) if node.error_span else None
             }
             for node in dfd_data.nodes
         ],
@@ -0,0 +1,81 @@
+"""SQL dialect selection and cheap token-based auto-detection."""
+
+import re
+
+DEFAULT_DIALECT = "snowflake"
+SUPPORTED_DIALECTS = ("snowflake", "postgres", "bigquery")
+
+# 方言ごとの特徴的なトークン/関数（重み付き）
+# `::` キャストや ILIKE のように複数方言にあるものは含めない
+_DIALECT_MARKERS: dict[str, list[tuple[re.Pattern, int]]] = {
+    "snowflake": [
+        (re.compile(r"\bQUALIFY\b", re.IGNORECASE), 3),
+        (re.compile(r"\bIFF\s*\(", re.IGNORECASE), 3),
+        (re.compile(r"\bLATERAL\s+FLATTEN\b|\bFLATTEN\s*\(", re.IGNORECASE), 3),
+        (re.compile(r"\bTRY_TO_\w+\s*\(", re.IGNORECASE), 2),
+        (re.compile(r"\b(?:ZEROIFNULL|NVL2|DIV0)\s*\(", re.IGNORECASE), 2),
+        (re.compile(r"\bTIMESTAMP_(?:NTZ|LTZ|TZ)\b", re.IGNORECASE), 2),
+        (re.compile(r"\{\{\s*(?:ref|source)\s*\(", re.IGNORECASE), 1),  # dbt on Snowflake が既定
+    ],
+    "postgres": [
+        (re.compile(r"\b(?:BIG)?SERIAL\b", re.IGNORECASE), 3),
+        (re.compile(r"\bDISTINCT\s+ON\s*\(", re.IGNORECASE), 3),
+        (re.compile(r"\bRETURNING\b", re.IGNORECASE), 2),
+        (re.compile(r"\b(?:GENERATE_SERIES|STRING_AGG|JSONB_\w+)\s*\(", re.IGNORECASE), 2),
+        (re.compile(r"\bJSONB\b|\bBYTEA\b|\bTIMESTAMPTZ\b", re.IGNORECASE), 2),
+        (re.compile(r"\$\$"), 2),
+        (re.compile(r"\bON\s+CONFLICT\b", re.IGNORECASE), 3),
+    ],
+    "bigquery": [
+        (re.compile(r"`[\w-]+\.[\w-]+(?:\.[\w-]+)?`"), 3),
+        (re.compile(r"\bSAFE_(?:CAST|DIVIDE)\s*\(|\bSAFE\.\w+\s*\(", re.IGNORECASE), 3),
+        (re.compile(r"\b(?:STRUCT|ARRAY)\s*<", re.IGNORECASE), 3),
+        (re.compile(r"\bUNNEST\s*\(", re.IGNORECASE), 2),
+        (re.compile(r"\b_TABLE_SUFFIX\b", re.IGNORECASE), 3),
+        (re.compile(r"\bSELECT\s+\*\s+EXCEPT\s*\(", re.IGNORECASE), 3),
+        (re.compile(r"\b(?:FORMAT_DATE|PARSE_DATE|TIMESTAMP_TRUNC|DATE_DIFF)\s*\(", re.IGNORECASE), 2),
+    ],
+}
+
+
+def normalize_dialect(dialect: str | None) -> str:
+    """Normalize a requested dialect name.
+
+    Returns "auto" for auto-detection, otherwise a supported dialect name.
+
+    Raises:
+        ValueError: If the dialect is not supported
+    """
+    if not dialect:
+        return "auto"
+    name = dialect.strip().lower()
+    if name in ("postgresql", "pg"):
+        name = "postgres"
+    if name == "auto" or name in SUPPORTED_DIALECTS:
+        return name
+    raise ValueError(
+        f"Unsupported dialect '{dialect}'. Use 'auto' or one of: {', '.join(SUPPORTED_DIALECTS)}"
+    )
+
+
+def detect_dialect(sql: str) -> str:
+    """Guess the SQL dialect from distinctive tokens and functions.
+
+    This is a regex pass over the raw text, so it costs far less than a parse.
+    Falls back to DEFAULT_DIALECT when no dialect scores above the others.
+    """
+    scores = {
+        dialect: sum(weight for pattern, weight in markers if pattern.search(sql))
+        for dialect, markers in _DIALECT_MARKERS.items()
+    }
+    best = max(scores, key=lambda d: scores[d])
+    top = scores[best]
+    if top == 0 or list(scores.values()).count(top) > 1:
+        return DEFAULT_DIALECT
+    return best
+
+
+def resolve_dialect(sql: str, dialect: str | None) -> str:
+    """Resolve a requested dialect ("auto" or a name) to a concrete dialect."""
+    name = normalize_dialect(dialect)
+    return detect_dialect(sql) if name == "auto" else name
@@ -0,0 +1,106 @@
+"""Semantic diff of two parsed versions of a model.
+
+CTEs are aligned by name (DFD node id ``cte-<name>``, ``output`` for the
+final SELECT), joins by their right-hand table and alias, columns by output
+name (``name#2``, ``name#3``... for repeated names), and WHERE predicates / GROUP BY items by their normalized SQL text,
+so the result does not depend on the ``edge-N`` numbering of the DFD or on
+the order in which ``ref()`` placeholders were assigned.
+"""
+
+import re
+from typing import Optional
+
+from .sql_parser import CTEInfo, ParsedSQL
+
+_PLACEHOLDER = re.compile(r"__REF_\d+__")
+
+
+def _restore(text: str, refs: dict[str, str]) -> str:
+    """Replace ``__REF_N__`` placeholders in SQL text with the original names."""
+    return _PLACEHOLDER.sub(lambda m: refs.get(m.group(0), m.group(0)), text)
+
+
+def _node_id(name: str) -> str:
+    """DFD node id of a CTE (matches dfd_generator)."""
+    return "output" if name == "OUTPUT" else f"cte-{name}"
+
+
+def _ctes(parsed: ParsedSQL) -> dict[str, CTEInfo]:
+    """CTE name -> CTEInfo, including the final SELECT as OUTPUT."""
+    ctes = {cte.name: cte for cte in parsed.ctes}
+    if parsed.final_select:
+        ctes["OUTPUT"] = parsed.final_select
+    return ctes
+
+
+def _describe(cte: CTEInfo, refs: dict[str, str]) -> dict[str, dict[str, str]]:
+    """Comparable parts of a CTE: kind -> {stable key: normalized value}."""
+    columns = {}
+    seen: dict[str, int] = {}
+    for column in cte.columns:
+        name = _restore(column.alias or column.name, refs)
+        source = f"{column.source_table}." if column.source_table else ""
+        # SELECT a.id, b.id のように同じ出力名が並ぶ場合は出現順の番号で区別する
+        seen[name] = seen.get(name, 0) + 1
+        key = name if seen[name] == 1 else f"{name}#{seen[name]}"
+        columns[key] = _restore(f"{source}{column.name}", refs)
+    joins = {}
+    for join in cte.joins:
+        key = join.right_table if not join.right_table_alias else f"{join.right_table} AS {join.right_table_alias}"
+        joins[key] = _restore(f"{join.join_type} JOIN ON {join.on_condition}".rstrip(), refs)
+    return {
+        "sources": {name: name for name in cte.source_tables + cte.union_sources},
+        "columns": columns,
+        "joins": joins,
+        "predicates": {p: p for p in (_restore(c, refs) for c in cte.where_conditions)},
+        "group_by": {g: g for g in (_restore(c, refs) for c in cte.group_by_columns)},
+    }
+
+
+def _diff_parts(old: dict[str, str], new: dict[str, str]) -> Optional[dict]:
+    """added / removed / changed entries between two keyed parts, or None if equal."""
+    if old == new:
+        return None
+    result = {
+        "added": [key for key in new if key not in old],
+        "removed": [key for key in old if key not in new],
+        "changed": [
+            {"key": key, "old": old[key], "new": new[key]}
+            for key in new if key in old and old[key] != new[key]
+        ],
+    }
+    return {kind: items for kind, items in result.items() if items}
+
+
+def diff_parsed(old: ParsedSQL, new: ParsedSQL) -> dict:
+    """Compare two parsed versions of a model.
+
+    Returns:
+        {"added": [...], "removed": [...], "changed": [...]} where added and
+        removed list CTEs as {"id", "name"} and changed lists each CTE whose
+        sources, columns, joins, predicates or GROUP BY differ, with only the
+        differing parts
+    """
+    old_ctes, new_ctes = _ctes(old), _ctes(new)
+    added = [{"id": _node_id(name), "name": name} for name in new_ctes if name not in old_ctes]
+    removed = [{"id": _node_id(name), "name": name} for name in old_ctes if name not in new_ctes]
+
+    changed = []
+    for name, new_cte in new_ctes.items():
+        old_cte = old_ctes.get(name)
+        if old_cte is None:
+            continue
+        entry: dict = {"id": _node_id(name), "name": name}
+        if (old_cte.error or None) != (new_cte.error or None):
+            entry["error"] = {"old": old_cte.error, "new": new_cte.error}
+        # プレースホルダーの番号は版ごとに違い得るため、CTEInfo 同士ではなく ref 名に戻した内容で比べる
+        old_parts = _describe(old_cte, old.source_refs)
+        new_parts = _describe(new_cte, new.source_refs)
+        for kind in new_parts:
+            delta = _diff_parts(old_parts[kind], new_parts[kind])
+            if delta:
+                entry[kind] = delta
+        if len(entry) > 2:
+            changed.append(entry)
+
+    return {"added": added, "removed": removed, "changed": changed}
@@ -0,0 +1,188 @@
+"""Workflow-level lineage for Digdag ``.dig`` files.
+
+A ``.dig`` file is YAML: keys starting with ``+`` are tasks, run in order
+unless their group sets ``_parallel: true``. Tasks using a SQL operator
+(``pg>``, ``redshift>``, ``bq>``, ``snowflake>``) point at a script file; each
+script is parsed into per-statement reads/writes, and the workflow graph
+links the tables a step writes to the later steps that read them.
+
+Task nodes are connected by ``then`` edges following the execution order,
+so the graph shows both the schedule and the data flow.
+"""
+
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+
+import yaml
+
+from .dfd_generator import DFDData, DFDEdge, DFDNode
+from .sql_parser import ParseLimits, StatementInfo, parse_statements
+
+# SQL を実行するオペレーター -> sqlglot 方言
+SQL_OPERATORS = {
+    "pg>": "postgres",
+    "redshift>": "postgres",
+    "bq>": "bigquery",
+    "snowflake>": "snowflake",
+}
+
+
+class _Include:
+    """Placeholder for a ``!include`` key (Digdag's file inclusion)."""
+
+
+class _DigLoader(yaml.SafeLoader):
+    """SafeLoader that understands Digdag's ``!include`` tag."""
+
+
+_DigLoader.add_constructor("!include", lambda loader, node: _Include())
+
+
+@dataclass
+class DigTask:
+    """A leaf task of a workflow, in execution order."""
+    name: str  # "+group+task" 形式の完全名
+    operator: str = ""  # "pg>" / "sh>" ...（オペレーターなしは空）
+    command: str = ""  # オペレーターの引数（SQLオペレーターならプロジェクト相対のスクリプトパス）
+    after: list[str] = field(default_factory=list)  # 直前に完了している必要があるタスク
+
+    @property
+    def dialect(self) -> Optional[str]:
+        return SQL_OPERATORS.get(self.operator)
+
+
+@dataclass
+class StepResult:
+    """Parsed script of one SQL task (or why it could not be parsed)."""
+    statements: list[StatementInfo] = field(default_factory=list)
+    error: Optional[str] = None
+
+
+def load_workflow(text: str, read_text: Callable[[str], str]) -> list[DigTask]:
+    """Parse ``.dig`` text into leaf tasks with their predecessors.
+
+    Args:
+        text: Contents of the .dig file
+        read_text: Returns the contents of a project-relative path
+            (used for ``!include``)
+
+    Raises:
+        ValueError: If the file is not a Digdag workflow mapping
+    """
+    try:
+        workflow = yaml.load(text, Loader=_DigLoader)
+    except yaml.YAMLError as e:
+        raise ValueError(f"Invalid .dig file: {e}")
+    if not isinstance(workflow, dict):
+        raise ValueError("Invalid .dig file: expected a mapping of tasks")
+    tasks: list[DigTask] = []
+    _flatten(workflow, "", [], read_text, tasks)
+    return tasks
+
+
+def _flatten(
+    group: dict,
+    prefix: str,
+    after: list[str],
+    read_text: Callable[[str], str],
+    tasks: list[DigTask]
+) -> list[str]:
+    """Append the leaf tasks of ``group`` to ``tasks``.
+
+    Returns:
+        Names of the tasks that finish the group (what the next task waits for)
+    """
+    parallel = bool(group.get("_parallel"))
+    exits: list[str] = []
+    previous = after
+
+    for key, value in group.items():
+        if isinstance(key, _Include):
+            included = yaml.load(read_text(str(value)), Loader=_DigLoader) or {}
+            if not isinstance(included, dict):
+                raise ValueError(f"Invalid included file: {value}")
+            ends = _flatten(included, prefix, after if parallel else previous, read_text, tasks)
+        elif isinstance(key, str) and key.startswith("+"):
+            name = prefix + key
+            body = value if isinstance(value, dict) else {}
+            operator = next((k for k in body if isinstance(k, str) and k.endswith(">")), "")
+            if operator:
+                ends = [name]
+                tasks.append(DigTask(
+                    name=name,
+                    operator=operator,
+                    command=str(body[operator]),
+                    after=list(after if parallel else previous),
+                ))
+            else:
+                ends = _flatten(body, name, after if parallel else previous, read_text, tasks)
+        else:
+            continue  # timezone / _export / _error などタスク以外のキー
+
+        if parallel:
+            exits.extend(ends)
+        elif ends:
+            previous = ends
+    return exits if parallel else previous
+
+
+def parse_step(sql: str, dialect: str, limits: Optional[ParseLimits] = None) -> StepResult:
+    """Parse one task's script (runs in a worker process)."""
+    return StepResult(statements=parse_statements(sql, limits=limits, dialect=dialect))
+
+
+def workflow_dfd(tasks: list[DigTask], results: dict[str, StepResult]) -> DFDData:
+    """Build one DFD for the whole workflow.
+
+    Args:
+        tasks: Leaf tasks from load_workflow()
+        results: Task name -> StepResult for SQL tasks
+
+    Returns:
+        DFDData with a logic node per task, a table node per table, and
+        read (table -> task), write (task -> table) and ``then`` edges
+    """
+    nodes: list[DFDNode] = []
+    edges: list[DFDEdge] = []
+    tables: dict[str, DFDNode] = {}
+    edge_ids: set[str] = set()
+
+    def add_edge(source: str, target: str, label: Optional[str] = None) -> None:
+        # ID は両端から決まるため、同じワークフローなら常に同じID
+        edge_id = f"{source}->{target}"
+        if edge_id not in edge_ids:
+            edge_ids.add(edge_id)
+            edges.append(DFDEdge(id=edge_id, source=source, target=target, label=label))
+
+    def table_node(name: str) -> str:
+        if name not in tables:
+            tables[name] = DFDNode(id=f"table:{name}", type="table", label=name)
+            nodes.append(tables[name])
+        return tables[name].id
+
+    for task in tasks:
+        task_id = f"task:{task.name}"
+        result = results.get(task.name)
+        task_node = DFDNode(
+            id=task_id,
+            type="logic",
+            label=f"{task.name}\n{task.operator} {task.command}".rstrip(),
+            logic_type="task",
+            error=result.error if result else None,
+        )
+        nodes.append(task_node)
+        for previous in task.after:
+            add_edge(f"task:{previous}", task_id, "then")
+        if not result:
+            continue
+
+        for statement in result.statements:
+            if statement.error:
+                task_node.error = task_node.error or statement.error
+            for source in statement.source_tables:
+                add_edge(table_node(source), task_id)
+            # DROP は書き込みではない（後続の CREATE が同じテーブルを作り直す）
+            if statement.target and statement.kind != "DROP":
+                add_edge(task_id, table_node(statement.target), statement.kind.lower())
+
+    return DFDData(nodes=nodes, edges=edges)
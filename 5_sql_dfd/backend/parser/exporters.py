@@ -0,0 +1,113 @@
+"""Mermaid flowchart and Graphviz DOT exporters for DFD data.
+
+The exporters are generators that yield the document one line at a time,
+so callers can stream large graphs without building one big string.
+"""
+
+from typing import Callable, Iterable, Iterator
+
+from .dfd_generator import DFDData, DFDNode
+
+
+def _node_text(node: DFDNode) -> str:
+    """Full text shown for a node: label plus its columns for tables."""
+    text = node.label
+    if node.type == "table" and node.columns:
+        text += "\n---\n" + "\n".join(node.columns)
+    if node.error:
+        text += f"\n{node.error}"
+    return text
+
+
+def escape_mermaid(text: str) -> str:
+    """Escape text for a quoted Mermaid label (newlines become <br/>)."""
+    # '#' を最初に置換（エンティティコード自体が '#' を含むため）
+    text = text.replace("#", "#35;")
+    text = (
+        text.replace('"', "#quot;")
+        .replace("<", "#lt;")
+        .replace(">", "#gt;")
+        .replace("|", "#124;")
+        .replace("`", "#96;")
+    )
+    return "<br/>".join(text.splitlines() or [""])
+
+
+def escape_dot(text: str) -> str:
+    """Escape text for a double-quoted Graphviz label (newlines become \\n)."""
+    text = text.replace("\\", "\\\\").replace('"', '\\"')
+    return "\\n".join(text.splitlines() or [""])
+
+
+def iter_mermaid(dfd_data: DFDData) -> Iterator[str]:
+    """Yield a Mermaid flowchart for the DFD, one line per chunk."""
+    # DFDノードIDには '-' や '.' が含まれるため、Mermaid 用に連番IDへ置き換える
+    ids: dict[str, str] = {}
+
+    yield "flowchart LR\n"
+    for node in dfd_data.nodes:
+        mermaid_id = ids.setdefault(node.id, f"n{len(ids)}")
+        label = escape_mermaid(_node_text(node))
+        if node.type == "logic":
+            yield f'    {mermaid_id}("{label}")\n'
+        else:
+            yield f'    {mermaid_id}["{label}"]\n'
+
+    for edge in dfd_data.edges:
+        source = ids.setdefault(edge.source, f"n{len(ids)}")
+        target = ids.setdefault(edge.target, f"n{len(ids)}")
+        if edge.label:
+            yield f'    {source} -->|"{escape_mermaid(edge.label)}"| {target}\n'
+        else:
+            yield f"    {source} --> {target}\n"
+
+
+def iter_dot(dfd_data: DFDData) -> Iterator[str]:
+    """Yield a Graphviz DOT digraph for the DFD, one line per chunk."""
+    yield "digraph dfd {\n"
+    yield "    rankdir=LR;\n"
+    yield '    node [fontname="Helvetica", fontsize=10];\n'
+    for node in dfd_data.nodes:
+        style = 'shape=box, style="rounded,filled", fillcolor="#fff4d6"' if node.type == "logic" else "shape=box"
+        yield f'    "{escape_dot(node.id)}" [{style}, label="{escape_dot(_node_text(node))}"];\n'
+
+    for edge in dfd_data.edges:
+        attrs = f' [label="{escape_dot(edge.label)}"]' if edge.label else ""
+        yield f'    "{escape_dot(edge.source)}" -> "{escape_dot(edge.target)}"{attrs};\n'
+    yield "}\n"
+
+
+def iter_chunks(lines: Iterable[str], chunk_size: int = 16 * 1024) -> Iterator[str]:
+    """Group small text pieces into chunks of roughly ``chunk_size`` characters.
+
+    Keeps streaming responses from sending one tiny write per line while
+    still never holding more than one chunk in memory.
+    """
+    buffer: list[str] = []
+    size = 0
+    for line in lines:
+        buffer.append(line)
+        size += len(line)
+        if size >= chunk_size:
+            yield "".join(buffer)
+            buffer.clear()
+            size = 0
+    if buffer:
+        yield "".join(buffer)
+
+
+def to_mermaid(dfd_data: DFDData) -> str:
+    """Render the DFD as a Mermaid flowchart string."""
+    return "".join(iter_mermaid(dfd_data))
+
+
+def to_dot(dfd_data: DFDData) -> str:
+    """Render the DFD as a Graphviz DOT string."""
+    return "".join(iter_dot(dfd_data))
+
+
+# 形式名 -> (行ジェネレータ, MIMEタイプ)
+EXPORT_FORMATS: dict[str, tuple[Callable[[DFDData], Iterator[str]], str]] = {
+    "mermaid": (iter_mermaid, "text/vnd.mermaid; charset=utf-8"),
+    "dot": (iter_dot, "text/vnd.graphviz; charset=utf-8"),
+}
@@ -0,0 +1,133 @@
+"""Pre-warmed per-dialect worker pools for SQL parsing."""
+
+import tracemalloc
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Optional
+
+from .dialects import SUPPORTED_DIALECTS
+from .sql_parser import ParsedSQL, ParseLimits, parse_sql
+
+# 各方言のウォームアップ用SQL（方言別のトークナイザ/パーサ初期化を済ませる）
+WARMUP_SQL: dict[str, str] = {
+    "snowflake": """
+        with src as (select id, iff(flag, 1, 0) as f from {{ ref('warmup') }} where id > 0 and f is not null),
+        unioned as (select id from src union all select id from {{ ref('extra') }})
+        select s.id, count(*) as cnt from src s left join unioned u on s.id = u.id and u.id > 0 group by s.id
+        qualify row_number() over (partition by s.id order by s.id) = 1
+    """,
+    "postgres": """
+        with src as (select distinct on (id) id, name::text from warmup where id > 0)
+        select s.id, string_agg(o.name, ',') from src s left join other o on s.id = o.id group by s.id
+    """,
+    "bigquery": """
+        with src as (select id, safe_cast(x as int64) as f from `proj.ds.warmup` where id > 0)
+        select s.id, count(*) from src s left join unnest(s.items) as item group by s.id
+    """,
+}
+
+
+def warm_parser(dialect: str) -> None:
+    """Parse a representative model so lazy sqlglot setup is done up front."""
+    parse_sql(WARMUP_SQL.get(dialect, WARMUP_SQL["snowflake"]), dialect=dialect)
+
+
+def warm_all() -> None:
+    """Warm every dialect (initializer for the shared heavy-query pool)."""
+    for dialect in SUPPORTED_DIALECTS:
+        warm_parser(dialect)
+
+
+def _parse_task(
+    sql: str,
+    dialect: str,
+    limits: Optional[ParseLimits],
+    trace_memory: bool
+) -> tuple[ParsedSQL, Optional[int]]:
+    """Worker-side parse; returns the result and the peak traced memory."""
+    if trace_memory:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        baseline, _ = tracemalloc.get_traced_memory()
+    parsed = parse_sql(sql, limits=limits, memory_conscious=True, dialect=dialect, recover=True)
+    peak = None
+    if trace_memory:
+        peak = max(tracemalloc.get_traced_memory()[1] - baseline, 0)
+    return parsed, peak
+
+
+class DialectPools:
+    """One warm ProcessPoolExecutor per dialect.
+
+    Each worker runs warm_parser() in its initializer, and start() waits for
+    every worker to come up, so the first real request in any dialect is
+    served at steady-state latency.
+
+    Large queries (admission control's heavy lane) go to a separate pool of
+    ``heavy_workers`` processes warmed for all dialects, so they never hold
+    the per-dialect workers that serve ordinary requests.
+    """
+
+    def __init__(
+        self,
+        workers_per_dialect: int = 1,
+        dialects: tuple[str, ...] = SUPPORTED_DIALECTS,
+        heavy_workers: int = 0
+    ):
+        self.workers_per_dialect = workers_per_dialect
+        self.dialects = dialects
+        self.heavy_workers = heavy_workers
+        self._pools: dict[str, ProcessPoolExecutor] = {}
+        self._heavy: Optional[ProcessPoolExecutor] = None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self._pools)
+
+    def start(self) -> None:
+        """Create the pools and block until all workers are warm."""
+        if self.workers_per_dialect <= 0:
+            return
+        warmups = []
+        for dialect in self.dialects:
+            pool = ProcessPoolExecutor(
+                max_workers=self.workers_per_dialect,
+                initializer=warm_parser,
+                initargs=(dialect,)
+            )
+            self._pools[dialect] = pool
+            # ワーカーを全て起動させる（ProcessPoolExecutor は遅延起動のため）
+            warmups.extend(pool.submit(int) for _ in range(self.workers_per_dialect))
+        if self.heavy_workers > 0:
+            self._heavy = ProcessPoolExecutor(max_workers=self.heavy_workers, initializer=warm_all)
+            warmups.extend(self._heavy.submit(int) for _ in range(self.heavy_workers))
+        for future in warmups:
+            future.result()
+
+    def submit(
+        self,
+        sql: str,
+        dialect: str,
+        limits: Optional[ParseLimits] = None,
+        trace_memory: bool = False,
+        heavy: bool = False
+    ) -> Future:
+        """Submit a parse to the pool for ``dialect`` (or the heavy pool).
+
+        The future resolves to ``(ParsedSQL, peak_memory_bytes | None)``.
+        """
+        pool = self._heavy if heavy and self._heavy else self._pools[dialect]
+        return pool.submit(_parse_task, sql, dialect, limits, trace_memory)
+
+    def submit_call(self, dialect: str, fn, *args) -> Future:
+        """Run any picklable ``fn(*args)`` on the warm pool for ``dialect``."""
+        return self._pools[dialect].submit(fn, *args)
+
+    def shutdown(self) -> None:
+        """Stop every pool."""
+        for pool in self._pools.values():
+            pool.shutdown(wait=True, cancel_futures=True)
+        self._pools.clear()
+        if self._heavy:
+            self._heavy.shutdown(wait=True, cancel_futures=True)
+            self._heavy = None
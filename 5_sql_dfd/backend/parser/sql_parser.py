@@ -1,12 +1,17 @@
 """SQL Parser using sqlglot for DFD generation."""
 
+import os
 import re
-from dataclasses import dataclass, field
+import threading
+from dataclasses import dataclass, field, fields, is_dataclass, replace
 from typing import Optional
 
 import sqlglot
 from sqlglot import exp
 
+from .cache import LRUCache, content_hash
+from .dialects import DEFAULT_DIALECT
+
 
 @dataclass
 class Column:
@@ -36,6 +41,8 @@ class CTEInfo:
     group_by_columns: list[str] = field(default_factory=list)
     union_sources: list[str] = field(default_factory=list)  # UNION元のテーブル/CTE名
     union_type: Optional[str] = None  # 'UNION' or 'UNION ALL'
+    error: Optional[str] = None  # 部分パースで失敗したCTEのエラーメッセージ
+    error_span: Optional[tuple[int, int]] = None  # 失敗箇所（入力SQL内の文字オフセット）
 
 
 @dataclass
@@ -46,14 +53,277 @@ class ParsedSQL:
     source_refs: dict[str, str] = field(default_factory=dict)  # placeholder -> original ref
 
 
+@dataclass
+class StatementInfo:
+    """Table-level reads/writes of one statement in a multi-statement script."""
+    kind: str  # CREATE / INSERT / DROP / SELECT / MERGE ...
+    target: Optional[str] = None  # 書き込み先（CREATE/INSERT/MERGE/UPDATE/DELETE/DROP）
+    source_tables: list[str] = field(default_factory=list)  # 読み取り元（CTE名は除く）
+    error: Optional[str] = None  # スクリプト全体のパースに失敗した場合のエラーメッセージ
+
+
+# 書き込み先を持つ文の種類
+_WRITE_STATEMENTS = (exp.Create, exp.Insert, exp.Merge, exp.Update, exp.Delete, exp.Drop)
+
+
+class SQLLimitExceeded(Exception):
+    """Raised when a SQL body exceeds the configured parse limits."""
+    status_code = 422
+
+
+class SQLTooLargeError(SQLLimitExceeded):
+    """SQL input is larger than ParseLimits.max_sql_bytes."""
+    status_code = 413
+
+
+class SQLTooComplexError(SQLLimitExceeded):
+    """Parsed AST has more nodes than ParseLimits.max_ast_nodes."""
+    status_code = 422
+
+
+@dataclass(frozen=True)
+class ParseLimits:
+    """Per-request resource limits for the parser (0 disables a limit)."""
+    max_sql_bytes: int = int(os.environ.get("SQL_DFD_MAX_SQL_BYTES", 1_000_000))
+    max_ast_nodes: int = int(os.environ.get("SQL_DFD_MAX_AST_NODES", 200_000))
+
+
+def _release_tree(tree: exp.Expression) -> None:
+    """Break parent links so the AST is freed by refcounting, not the cyclic GC."""
+    for node in list(tree.walk()):
+        node.parent = None
+
+
+# 部分パースで成功したCTE断片のキャッシュ: (dialect, hash) -> (CTEInfo一覧, 参照したref名)
+# CTEInfo 内のプレースホルダーは断片内で __REF_0__ から振った番号（使うときに通し番号へずらす）
+_fragment_cache: LRUCache[tuple[list[CTEInfo], list[str]]] = LRUCache(
+    int(os.environ.get("SQL_DFD_FRAGMENT_CACHE_SIZE", 4096))
+)
+
+
+def clear_fragment_cache() -> None:
+    """Drop every cached CTE fragment."""
+    _fragment_cache.clear()
+
+
+_REF_PLACEHOLDER = re.compile(r"__REF_(\d+)__")
+
+
+def _shift_refs(value, offset: int):
+    """Copy CTEInfo (or lists/strings inside it) with every __REF_N__ renumbered to N + offset."""
+    if isinstance(value, str):
+        return _REF_PLACEHOLDER.sub(lambda m: f"__REF_{int(m.group(1)) + offset}__", value)
+    if isinstance(value, list):
+        return [_shift_refs(item, offset) for item in value]
+    if is_dataclass(value):
+        return replace(value, **{f.name: _shift_refs(getattr(value, f.name), offset) for f in fields(value)})
+    return value
+
+
+def _sub_tracked(pattern: str, repl, text: str, origin: Optional[list[int]]) -> str:
+    """re.sub that also keeps ``origin`` (output offset -> input offset) in step.
+
+    ``origin`` has len(text) + 1 entries and is rewritten in place; characters
+    of a replacement map to the start of the text they replaced.
+    """
+    if origin is None:
+        return re.sub(pattern, repl, text)
+    parts: list[str] = []
+    new_origin: list[int] = []
+    last = 0
+    for m in re.finditer(pattern, text):
+        replacement = repl(m)
+        parts += [text[last:m.start()], replacement]
+        new_origin += origin[last:m.start()] + [origin[m.start()]] * len(replacement)
+        last = m.end()
+    parts.append(text[last:])
+    new_origin += origin[last:]
+    origin[:] = new_origin
+    return "".join(parts)
+
+
+_IDENTIFIER = re.compile(r'[A-Za-z_][\w$]*|"(?:[^"]|"")+"|`[^`]+`')
+_OPAQUE = (("--", "\n"), ("/*", "*/"), ("{#", "#}"), ("{%", "%}"), ("{{", "}}"))
+_PAREN_SCAN = re.compile(r"[()'\"]|--|/\*|\{[#%{]")
+
+
+def _skip_opaque(sql: str, i: int) -> int:
+    """If sql[i:] starts a comment, string or Jinja block, return the index after it."""
+    for opener, closer in _OPAQUE:
+        if sql.startswith(opener, i):
+            end = sql.find(closer, i + len(opener))
+            return len(sql) if end < 0 else end + len(closer)
+    if sql[i] in "'\"":
+        quote = sql[i]
+        j = i + 1
+        while j < len(sql):
+            if sql[j] == "\\":
+                j += 2
+                continue
+            if sql[j] == quote:
+                if sql.startswith(quote * 2, j):
+                    j += 2
+                    continue
+                return j + 1
+            j += 1
+        return len(sql)
+    return i
+
+
+def _skip_trivia(sql: str, i: int, skip_jinja_exprs: bool = False) -> int:
+    """Skip whitespace, comments and Jinja statements/comments."""
+    while i < len(sql):
+        if sql[i].isspace():
+            i += 1
+        elif sql.startswith(("--", "/*", "{#", "{%"), i) or (skip_jinja_exprs and sql.startswith("{{", i)):
+            i = _skip_opaque(sql, i)
+        else:
+            break
+    return i
+
+
+def _match_paren(sql: str, i: int) -> int:
+    """Return the index of the ')' matching the '(' at sql[i], or -1."""
+    depth = 0
+    while True:
+        # 括弧・文字列・コメント・Jinja の開始位置まで一気に進める
+        m = _PAREN_SCAN.search(sql, i)
+        if not m:
+            return -1
+        i = m.start()
+        j = _skip_opaque(sql, i)
+        if j != i:
+            i = j
+            continue
+        if sql[i] == "(":
+            depth += 1
+        else:
+            depth -= 1
+            if depth == 0:
+                return i
+        i += 1
+
+
+def _match_keyword(sql: str, i: int, keyword: str) -> int:
+    """Return the index after ``keyword`` at sql[i] (case-insensitive, whole word), or -1."""
+    end = i + len(keyword)
+    if sql[i:end].upper() == keyword and (end >= len(sql) or not (sql[end].isalnum() or sql[end] == "_")):
+        return end
+    return -1
+
+
+def split_cte_fragments(sql: str) -> Optional[tuple[list[tuple[str, int, int]], tuple[int, int]]]:
+    """Locate top-level CTE bodies and the final query without parsing.
+
+    Works on the raw (Jinja-containing) SQL, skipping strings, comments and
+    Jinja blocks, so offsets refer to the text the user submitted.
+
+    Returns:
+        ([(cte_name, body_start, body_end), ...], (final_start, final_end)),
+        or None if the text does not look like ``WITH ... SELECT``
+    """
+    i = _skip_trivia(sql, 0, skip_jinja_exprs=True)
+    i = _match_keyword(sql, i, "WITH")
+    if i < 0:
+        return None
+    i = _skip_trivia(sql, i)
+    after = _match_keyword(sql, i, "RECURSIVE")
+    if after >= 0:
+        i = after
+
+    fragments = []
+    while True:
+        i = _skip_trivia(sql, i)
+        m = _IDENTIFIER.match(sql, i)
+        if not m:
+            return None
+        name = m.group(0).strip('"`')
+        i = _skip_trivia(sql, m.end())
+        if i < len(sql) and sql[i] == "(":  # カラムリスト
+            close = _match_paren(sql, i)
+            if close < 0:
+                return None
+            i = _skip_trivia(sql, close + 1)
+        i = _match_keyword(sql, i, "AS")
+        if i < 0:
+            return None
+        i = _skip_trivia(sql, i)
+        for keyword in ("NOT", "MATERIALIZED"):
+            after = _match_keyword(sql, i, keyword)
+            if after >= 0:
+                i = _skip_trivia(sql, after)
+        if i >= len(sql) or sql[i] != "(":
+            return None
+        close = _match_paren(sql, i)
+        if close < 0:
+            return None
+        fragments.append((name, i + 1, close))
+        i = _skip_trivia(sql, close + 1)
+        if i < len(sql) and sql[i] == ",":
+            i += 1
+            continue
+        break
+
+    final_end = len(sql.rstrip().rstrip(";"))
+    if i >= final_end:
+        return None
+    return fragments, (i, final_end)
+
+
 class SQLParser:
     """SQL Parser with Jinja2 template handling."""
 
-    def __init__(self):
+    def __init__(
+        self,
+        limits: Optional[ParseLimits] = None,
+        memory_conscious: bool = False,
+        dialect: str = DEFAULT_DIALECT,
+        recover: bool = False,
+        relations: Optional[dict[str, str]] = None
+    ):
         self.ref_counter = 0
         self.source_refs: dict[str, str] = {}  # placeholder -> original ref/source
+        self.limits = limits
+        self.memory_conscious = memory_conscious
+        self.dialect = dialect
+        self.recover = recover
+        # コンパイル済みSQL用: relation_name -> 表示名（dbt manifest 由来）
+        self.relations = relations
+        self._node_count = 0
+
+    def _replace_relations(self, sql: str, origin: Optional[list[int]] = None) -> str:
+        """Replace compiled relation names (from a dbt manifest) with placeholders."""
+        if not self.relations:
+            return sql
+
+        def replace(match: re.Match) -> str:
+            placeholder = f"__REF_{self.ref_counter}__"
+            self.source_refs[placeholder] = self.relations[match.group(0)]
+            self.ref_counter += 1
+            return placeholder
+
+        # 長い名前を優先（"DB"."S"."T" が "DB"."S"."T_2" の一部にマッチしないように）
+        pattern = "|".join(re.escape(name) for name in sorted(self.relations, key=len, reverse=True))
+        return _sub_tracked(rf"(?<![\w\".`])(?:{pattern})(?![\w\".`])", replace, sql, origin)
 
-    def _replace_jinja_refs(self, sql: str) -> str:
+    def _preprocess(self, sql: str, origin: Optional[list[int]] = None) -> str:
+        """Turn raw input into sqlglot-parsable SQL with __REF_N__ placeholders.
+
+        dbt model text gets its Jinja comments removed and ref()/source()
+        replaced; compiled SQL (``self.relations`` set) only has its relation
+        names replaced. If ``origin`` is given (``list(range(len(sql) + 1))``),
+        it is rewritten to map each output offset back to ``sql``.
+        """
+        if self.relations is not None:
+            return self._replace_relations(sql, origin)
+
+        # Remove dbt comments {# ... #}
+        clean_sql = _sub_tracked(r"\{#[\s\S]*?#\}", lambda m: "", sql, origin)
+
+        # Replace Jinja2 refs with placeholders
+        return self._replace_jinja_refs(clean_sql, origin)
+
+    def _replace_jinja_refs(self, sql: str, origin: Optional[list[int]] = None) -> str:
         """Replace Jinja2 ref/source with placeholders for sqlglot parsing."""
         result = sql
 
@@ -65,10 +335,11 @@ class SQLParser:
             self.ref_counter += 1
             return placeholder
 
-        result = re.sub(
+        result = _sub_tracked(
             r"\{\{\s*ref\s*\(\s*['\"]([^'\"]+)['\"]\s*\)\s*\}\}",
             replace_ref,
-            result
+            result,
+            origin
         )
 
         # Replace {{ source('schema', 'TABLE_NAME') }} with __REF_N__
@@ -79,10 +350,11 @@ class SQLParser:
             self.ref_counter += 1
             return placeholder
 
-        result = re.sub(
+        result = _sub_tracked(
             r"\{\{\s*source\s*\(\s*['\"][^'\"]+['\"]\s*,\s*['\"]([^'\"]+)['\"]\s*\)\s*\}\}",
             replace_source,
-            result
+            result,
+            origin
         )
 
         return result
@@ -273,23 +545,190 @@ class SQLParser:
             union_type=union_type
         )
 
+    def _check_input_size(self, sql: str) -> None:
+        """Reject SQL bodies larger than the configured byte limit."""
+        if not self.limits or not self.limits.max_sql_bytes:
+            return
+        size = len(sql.encode("utf-8"))
+        if size > self.limits.max_sql_bytes:
+            raise SQLTooLargeError(
+                f"SQL is {size} bytes, limit is {self.limits.max_sql_bytes} bytes"
+            )
+
+    def _check_node_count(self, tree: exp.Expression) -> None:
+        """Reject ASTs with more nodes than the configured limit.
+
+        Counts accumulate across calls within one parse(), so fragment-wise
+        parsing is held to the same budget as a single full parse.
+        """
+        if not self.limits or not self.limits.max_ast_nodes:
+            return
+        for _ in tree.walk():
+            self._node_count += 1
+            if self._node_count > self.limits.max_ast_nodes:
+                raise SQLTooComplexError(
+                    f"SQL has more than {self.limits.max_ast_nodes} syntax nodes"
+                )
+
+    def _parse_cte_body(self, node: exp.Expression, cte_name: str) -> Optional[CTEInfo]:
+        """Build CTEInfo for a CTE (or a standalone CTE body)."""
+        # Check if this CTE contains UNION
+        union_expr = node.find(exp.Union)
+        if union_expr:
+            # This CTE is a UNION of multiple SELECTs
+            return self._parse_union(union_expr, cte_name)
+        select_expr = node.find(exp.Select)
+        if select_expr:
+            return self._parse_select(select_expr, cte_name)
+        return None
+
+    def _find_main_select(self, parsed: exp.Expression) -> Optional[exp.Select]:
+        """Return the main SELECT of a statement (the first one outside any CTE)."""
+        # The main query is the direct Select under the parsed statement
+        if isinstance(parsed, exp.Select):
+            return parsed
+        # Find the main SELECT that's not inside a CTE
+        for select in parsed.find_all(exp.Select):
+            # Check if this select is not inside a CTE
+            parent = select.parent
+            is_in_cte = False
+            while parent:
+                if isinstance(parent, exp.CTE):
+                    is_in_cte = True
+                    break
+                parent = parent.parent
+            if not is_in_cte:
+                return select
+        return None
+
+    def _parse_fragment(self, text: str) -> exp.Expression:
+        """Preprocess and parse one SQL fragment, enforcing the node limit."""
+        tree = sqlglot.parse_one(self._preprocess(text), dialect=self.dialect)
+        self._check_node_count(tree)
+        return tree
+
+    def _parse_cte_fragment(self, name: str, text: str) -> list[CTEInfo]:
+        """Parse one CTE body, using the fragment cache when possible.
+
+        Nested CTEs inside the body are returned ahead of the CTE itself.
+        """
+        relations = sorted(self.relations.items()) if self.relations else ""
+        key = (self.dialect, content_hash(f"{name}\0{text}\0{relations}"))
+        cached = _fragment_cache.get(key)
+        if cached is None:
+            # 断片内では __REF_0__ から振る（キャッシュした結果が断片の位置に依存しないように）
+            counter, source_refs = self.ref_counter, self.source_refs
+            self.ref_counter, self.source_refs = 0, {}
+            try:
+                tree = self._parse_fragment(text)
+                try:
+                    infos = [
+                        info for cte in tree.find_all(exp.CTE) if cte.alias
+                        for info in [self._parse_cte_body(cte, cte.alias)] if info
+                    ]
+                    own = self._parse_cte_body(tree, name)
+                    if own:
+                        infos.append(own)
+                finally:
+                    if self.memory_conscious:
+                        _release_tree(tree)
+                refs = list(self.source_refs.values())
+            finally:
+                self.ref_counter, self.source_refs = counter, source_refs
+            cached = (infos, refs)
+            _fragment_cache.put(key, cached)
+
+        infos, refs = cached
+        base = self.ref_counter
+        for i, ref in enumerate(refs):
+            self.source_refs[f"__REF_{base + i}__"] = ref
+        self.ref_counter = base + len(refs)
+        # キャッシュ内のオブジェクトは渡さず、通し番号に振り直したコピーを返す
+        return _shift_refs(infos, base)
+
+    def _fragment_error(self, error: Exception, sql: str, start: int, end: int, ref_counter: int) -> str:
+        """Error message for a failed fragment, with Line/Col pointing into ``sql``.
+
+        sqlglot reports positions in the preprocessed fragment; the fragment is
+        preprocessed again (with the same placeholder numbering) to map them back.
+        """
+        details = getattr(error, "errors", None) or [{}]
+        line, col = details[0].get("line"), details[0].get("col")
+        if not line or not col:
+            return _error_message(error)
+
+        counter, source_refs = self.ref_counter, self.source_refs
+        self.ref_counter, self.source_refs = ref_counter, {}
+        origin = list(range(end - start + 1))
+        try:
+            processed = self._preprocess(sql[start:end], origin)
+        finally:
+            self.ref_counter, self.source_refs = counter, source_refs
+
+        offset = sum(len(text) + 1 for text in processed.split("\n")[:line - 1]) + col - 1
+        position = start + origin[min(max(offset, 0), len(processed))]
+        line = sql.count("\n", 0, position) + 1
+        col = position - sql.rfind("\n", 0, position)
+        return f"{details[0].get('description') or _error_message(error)}. Line {line}, Col: {col}."
+
+    def _parse_recovering(self, sql: str, split) -> ParsedSQL:
+        """Parse CTE bodies independently; failing ones become error placeholders."""
+        fragments, (final_start, final_end) = split
+        ctes: list[CTEInfo] = []
+        self.ref_counter = 0
+        self.source_refs = {}
+        self._node_count = 0
+
+        for name, start, end in fragments:
+            try:
+                ctes.extend(self._parse_cte_fragment(name, sql[start:end]))
+            except SQLLimitExceeded:
+                raise
+            except Exception as e:
+                error = self._fragment_error(e, sql, start, end, 0)
+                ctes.append(CTEInfo(name=name, error=error, error_span=(start, end)))
+
+        final_select = None
+        tree = None
+        counter = self.ref_counter
+        try:
+            tree = self._parse_fragment(sql[final_start:final_end])
+            main_select = self._find_main_select(tree)
+            if main_select:
+                final_select = self._parse_select(main_select, "OUTPUT")
+        except SQLLimitExceeded:
+            raise
+        except Exception as e:
+            error = self._fragment_error(e, sql, final_start, final_end, counter)
+            final_select = CTEInfo(name="OUTPUT", error=error, error_span=(final_start, final_end))
+        finally:
+            if self.memory_conscious and tree is not None:
+                _release_tree(tree)
+
+        return ParsedSQL(ctes=ctes, final_select=final_select, source_refs=self.source_refs.copy())
+
     def parse(self, sql: str) -> ParsedSQL:
-        """Parse SQL and extract structure."""
+        """Parse SQL and extract structure.
+
+        Raises:
+            SQLLimitExceeded: If the input or its AST exceeds ``self.limits``
+        """
         # Reset state
         self.ref_counter = 0
         self.source_refs = {}
+        self._node_count = 0
 
-        # Remove dbt comments {# ... #}
-        clean_sql = re.sub(r"\{#[\s\S]*?#\}", "", sql)
+        self._check_input_size(sql)
 
-        # Replace Jinja2 refs with placeholders
-        processed_sql = self._replace_jinja_refs(clean_sql)
+        processed_sql = self._preprocess(sql)
 
         result = ParsedSQL(source_refs=self.source_refs.copy())
 
+        parsed = None
         try:
-            # Parse SQL using sqlglot (Snowflake dialect)
-            parsed = sqlglot.parse_one(processed_sql, dialect="snowflake")
+            # Parse SQL using sqlglot
+            parsed = sqlglot.parse_one(processed_sql, dialect=self.dialect)
+            self._check_node_count(parsed)
 
             # Extract CTEs
             if parsed.find(exp.With):
@@ -298,49 +737,151 @@ class SQLParser:
                     if not cte_name:
                         continue
 
-                    # Check if this CTE contains UNION
-                    union_expr = cte.find(exp.Union)
-                    if union_expr:
-                        # This CTE is a UNION of multiple SELECTs
-                        cte_info = self._parse_union(union_expr, cte_name)
+                    cte_info = self._parse_cte_body(cte, cte_name)
+                    if cte_info:
                         result.ctes.append(cte_info)
-                    else:
-                        select_expr = cte.find(exp.Select)
-                        if select_expr:
-                            cte_info = self._parse_select(select_expr, cte_name)
-                            result.ctes.append(cte_info)
 
             # Extract final SELECT (outside CTEs)
-            # The main query is the direct Select under the parsed statement
-            main_select = None
-            if isinstance(parsed, exp.Select):
-                main_select = parsed
-            else:
-                # Find the main SELECT that's not inside a CTE
-                for select in parsed.find_all(exp.Select):
-                    # Check if this select is not inside a CTE
-                    parent = select.parent
-                    is_in_cte = False
-                    while parent:
-                        if isinstance(parent, exp.CTE):
-                            is_in_cte = True
-                            break
-                        parent = parent.parent
-                    if not is_in_cte:
-                        main_select = select
-                        break
-
+            main_select = self._find_main_select(parsed)
             if main_select:
                 result.final_select = self._parse_select(main_select, "OUTPUT")
 
+        except SQLLimitExceeded:
+            raise
         except Exception as e:
+            # Recovery mode: parse each CTE on its own (cached per fragment) so
+            # one broken CTE does not discard the rest; valid SQL never gets here
+            if self.recover:
+                split = split_cte_fragments(sql)
+                if split is not None:
+                    return self._parse_recovering(sql, split)
             # If sqlglot fails, return empty result with error info
             print(f"SQL parsing error: {e}")
+        finally:
+            # ParsedSQL only holds plain strings, so the tree can go right away
+            if self.memory_conscious and parsed is not None:
+                _release_tree(parsed)
+            del parsed
 
         return result
 
+    def _statement_target(self, statement: exp.Expression) -> Optional[exp.Table]:
+        """Return the table a statement writes to (None for plain queries)."""
+        if not isinstance(statement, _WRITE_STATEMENTS):
+            return None
+        # DROP は複数テーブルを取り得る（バージョンにより this / tables）
+        target = statement.this or (statement.args.get("tables") or [None])[0]
+        # CREATE TABLE t (col ...) / INSERT INTO t (col ...) は Schema で包まれる
+        if isinstance(target, exp.Schema):
+            target = target.this
+        return target if isinstance(target, exp.Table) else None
+
+    def _describe_statement(self, statement: exp.Expression) -> StatementInfo:
+        """Build StatementInfo (write target and read tables) for one statement."""
+        target = self._statement_target(statement)
+        cte_names = {cte.alias for cte in statement.find_all(exp.CTE) if cte.alias}
+        sources: list[str] = []
+        if not isinstance(statement, exp.Drop):
+            for table in statement.find_all(exp.Table):
+                # 書き込み先自身と、外部キー制約 (REFERENCES) の参照先は読み取りではない
+                if table is target or table.find_ancestor(exp.Reference) or table.name in cte_names:
+                    continue
+                name, _ = self._restore_table_name(table.name)
+                if name and name not in sources:
+                    sources.append(name)
+        return StatementInfo(
+            kind=statement.key.upper(),
+            target=self._restore_table_name(target.name)[0] if target is not None else None,
+            source_tables=sources
+        )
+
+    def parse_statements(self, sql: str) -> list[StatementInfo]:
+        """Parse a multi-statement script into per-statement reads/writes.
 
-def parse_sql(sql: str) -> ParsedSQL:
-    """Parse SQL string and return structured result."""
-    parser = SQLParser()
+        Used for workflow steps (e.g. Digdag ``pg>`` tasks) where a file
+        holds DDL/DML rather than a single SELECT.
+
+        Raises:
+            SQLLimitExceeded: If the input or its AST exceeds ``self.limits``
+        """
+        self.ref_counter = 0
+        self.source_refs = {}
+        self._node_count = 0
+
+        self._check_input_size(sql)
+        try:
+            trees = [tree for tree in sqlglot.parse(self._preprocess(sql), dialect=self.dialect) if tree]
+        except Exception as e:
+            return [StatementInfo(kind="ERROR", error=_error_message(e))]
+
+        try:
+            for tree in trees:
+                self._check_node_count(tree)
+            return [self._describe_statement(tree) for tree in trees]
+        finally:
+            if self.memory_conscious:
+                for tree in trees:
+                    _release_tree(tree)
+
+
+def _error_message(error: Exception) -> str:
+    """First line of a parse error, for display on a placeholder node."""
+    lines = str(error).strip().splitlines()
+    return lines[0] if lines else type(error).__name__
+
+
+_local = threading.local()
+
+
+def parse_sql(
+    sql: str,
+    limits: Optional[ParseLimits] = None,
+    memory_conscious: bool = False,
+    dialect: str = DEFAULT_DIALECT,
+    recover: bool = False,
+    relations: Optional[dict[str, str]] = None
+) -> ParsedSQL:
+    """Parse SQL string and return structured result.
+
+    Args:
+        sql: SQL string (dbt Jinja refs/sources allowed)
+        limits: Input size / AST node limits to enforce, or None for no limits
+        memory_conscious: If True, release the sqlglot AST before returning
+        dialect: sqlglot dialect name (see parser.dialects)
+        recover: If True and the full parse fails, parse CTE bodies
+            independently so one broken CTE does not discard the rest
+            (failures become error placeholders)
+        relations: For already-compiled SQL (e.g. from a dbt manifest), a map of
+            relation_name -> display name; skips Jinja preprocessing entirely
+
+    Returns:
+        ParsedSQL with CTEs, final SELECT and source refs
+    """
+    parser = getattr(_local, "parser", None)
+    if parser is None:
+        parser = _local.parser = SQLParser()
+    parser.limits = limits
+    parser.memory_conscious = memory_conscious
+    parser.dialect = dialect
+    parser.recover = recover
+    parser.relations = relations
     return parser.parse(sql)
+
+
+def parse_statements(
+    sql: str,
+    limits: Optional[ParseLimits] = None,
+    dialect: str = DEFAULT_DIALECT
+) -> list[StatementInfo]:
+    """Parse a multi-statement script into per-statement table reads/writes.
+
+    Args:
+        sql: SQL script (DDL/DML, ``;``-separated; dbt Jinja refs allowed)
+        limits: Input size / AST node limits to enforce, or None for no limits
+        dialect: sqlglot dialect name (see parser.dialects)
+
+    Returns:
+        One StatementInfo per statement, in script order
+    """
+    parser = SQLParser(limits=limits, memory_conscious=True, dialect=dialect)
+    return parser.parse_statements(sql)
@@ -0,0 +1,184 @@
+"""Prefork production launcher for the SQL DFD API.
+
+The parent process imports FastAPI/sqlglot and warms the parser by parsing
+a representative model in every dialect, then forks N uvicorn workers that
+share one listening socket. Workers inherit the warm interpreter state
+(copy-on-write), so a freshly started or restarted worker serves its first
+request at steady-state latency. Dead workers are re-forked from the warm
+parent, with a growing delay when workers keep dying soon after start.
+
+Usage:
+    python serve.py --workers 4 --port 8000
+
+Cold-start numbers (preload_ms in the parent, fork-to-ready ready_ms per
+worker) and each worker's first_request_ms are reported under "process"
+in GET /metrics.
+"""
+
+import argparse
+import asyncio
+import gc
+import json
+import os
+import signal
+import socket
+import sys
+import time
+
+# プリフォーク時はワーカー自体がウォーム済みのため、方言別プールは既定で使わない
+os.environ.setdefault("SQL_DFD_POOL_WORKERS", "0")
+
+_preload_started = time.perf_counter()
+
+import uvicorn  # noqa: E402
+
+import main  # noqa: E402
+from asgi_transport import ASGITransport  # noqa: E402
+from metrics import registry  # noqa: E402
+from parser.dialects import SUPPORTED_DIALECTS  # noqa: E402
+from parser.pool import WARMUP_SQL  # noqa: E402
+from parser.sql_parser import clear_fragment_cache  # noqa: E402
+
+
+async def _warm_requests() -> None:
+    """Send one /api/parse and one export request per dialect through the app."""
+    transport = ASGITransport(main.app)
+    for dialect in SUPPORTED_DIALECTS:
+        body = json.dumps({"sql": WARMUP_SQL[dialect], "dialect": dialect}).encode()
+        for path in ("/api/parse", "/api/export/mermaid"):
+            status, _ = await transport.post(path, body)
+            if status != 200:
+                raise RuntimeError(f"Warm-up request {path} ({dialect}) failed with {status}")
+
+
+def preload() -> float:
+    """Warm every dialect through the same path a request takes.
+
+    Returns:
+        Milliseconds spent importing and warming
+    """
+    asyncio.run(_warm_requests())
+    # ウォームアップ結果はキャッシュ・計測に残さない
+    main.parse_cache.clear()
+    main.step_cache.clear()
+    clear_fragment_cache()
+    main.admission.reset_stats()
+    main.rate_limiter.reset()
+    registry.reset()
+    return (time.perf_counter() - _preload_started) * 1000
+
+
+def bind_socket(host: str, port: int) -> socket.socket:
+    """Create the listening socket shared by all workers."""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def run_worker(sock: socket.socket, preload_ms: float, log_level: str) -> None:
+    """Worker body (runs in the forked child, never returns)."""
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    registry.reset()
+    registry.startup["preload_ms"] = round(preload_ms, 3)
+    config = uvicorn.Config(main.app, lifespan="on", log_level=log_level, access_log=False)
+    server = uvicorn.Server(config)
+    code = 0
+    try:
+        server.run(sockets=[sock])
+    except BaseException:
+        code = 1
+    os._exit(code)
+
+
+# 起動直後に落ちたワーカーの再フォーク待ち（連続するたびに倍、上限あり）
+RESPAWN_MIN_UPTIME = 10.0
+RESPAWN_BACKOFF_BASE = 0.5
+RESPAWN_BACKOFF_MAX = 30.0
+
+
+def respawn_delay(failures: int) -> float:
+    """Seconds to wait before re-forking after ``failures`` consecutive early exits."""
+    if failures <= 0:
+        return 0.0
+    return min(RESPAWN_BACKOFF_BASE * 2 ** (failures - 1), RESPAWN_BACKOFF_MAX)
+
+
+def spawn(sock: socket.socket, preload_ms: float, log_level: str) -> int:
+    """Fork one worker and return its pid."""
+    pid = os.fork()
+    if pid == 0:
+        run_worker(sock, preload_ms, log_level)
+    return pid
+
+
+def main_loop(args) -> int:
+    """Preload, fork the workers and supervise them until signalled."""
+    preload_ms = preload()
+    print(f"[serve] preloaded in {preload_ms:.1f} ms (pid {os.getpid()})", flush=True)
+
+    sock = bind_socket(args.host, args.port)
+    # フォーク後に GC が共有ページへ書き込まないよう、既存オブジェクトを凍結
+    gc.freeze()
+
+    # pid -> フォークした時刻
+    workers = {spawn(sock, preload_ms, args.log_level): time.monotonic() for _ in range(args.workers)}
+    print(f"[serve] {len(workers)} workers on http://{args.host}:{args.port}", flush=True)
+
+    stopping = False
+    failures = 0
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    while workers:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        started = workers.pop(pid, None)
+        if stopping:
+            continue
+        # 起動直後に落ち続けるワーカーをすぐに再フォークし続けないよう待つ
+        if started is not None and time.monotonic() - started < RESPAWN_MIN_UPTIME:
+            failures += 1
+        else:
+            failures = 0
+        delay = respawn_delay(failures)
+        print(f"[serve] worker {pid} exited ({status}), re-forking in {delay:.1f}s", flush=True)
+        deadline = time.monotonic() + delay
+        while not stopping and time.monotonic() < deadline:
+            time.sleep(0.1)
+        if not stopping:
+            workers[spawn(sock, preload_ms, args.log_level)] = time.monotonic()
+
+    sock.close()
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """Build the argument parser."""
+    ap = argparse.ArgumentParser(description="Prefork launcher for the SQL DFD API")
+    ap.add_argument("--host", default="0.0.0.0")
+    ap.add_argument("--port", type=int, default=8000)
+    ap.add_argument("--workers", "-w", type=int, default=os.cpu_count() or 1)
+    ap.add_argument("--log-level", default="info")
+    return ap
+
+
+if __name__ == "__main__":
+    sys.exit(main_loop(build_parser().parse_args()))
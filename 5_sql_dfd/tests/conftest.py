@@ -0,0 +1,6 @@
+"""Make the backend package importable for the tests (run: pytest tests)."""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
@@ -0,0 +1,29 @@
+"""Tests for the streaming dbt manifest reader."""
+
+import io
+import json
+
+import pytest
+
+from parser.dbt_manifest import _JSONStream
+
+VALUES = {
+    "macros": {"m": {"sql": 'select \'{[\' , "}]" \\" \\\\', "args": [[], {}, [1.5e-3]]}},
+    "docs": ["a\\\\", "\\\"{", {"x": "]]]"}],
+    "count": -12.5e3,
+    "nodes": {"n": {"compiled_code": "select [1]", "tags": []}},
+}
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 7, 64, 1 << 20])
+@pytest.mark.parametrize("indent", [None, 2])
+def test_skip_and_read_across_chunk_boundaries(chunk_size, indent):
+    text = json.dumps(VALUES, indent=indent)
+    stream = _JSONStream(io.StringIO(text), chunk_size=chunk_size)
+    read = {}
+    for key in stream.iter_object():
+        if key in ("macros", "docs"):
+            stream.skip_value()
+        else:
+            read[key] = stream.read_value()
+    assert read == {"count": VALUES["count"], "nodes": VALUES["nodes"]}
@@ -0,0 +1,53 @@
+"""Tests for the semantic model diff."""
+
+import pytest
+
+from parser.diff import diff_parsed
+from parser.sql_parser import clear_fragment_cache, parse_sql
+
+JOINED = (
+    "select {{ ref('y') }}.id from {{ ref('y') }} "
+    "inner join {{ ref('z') }} on {{ ref('y') }}.id = {{ ref('z') }}.id"
+)
+# 壊れた CTE を含むため、どちらの版も CTE ごとの部分パースになる
+OLD = (
+    "with a as (select * from {{ ref('x') }}),\n"
+    f"b as ({JOINED}),\n"
+    "c as (select from)\n"
+    "select * from b"
+)
+NEW = OLD.replace(f"b as ({JOINED})", f"b as ({JOINED} where {{{{ ref('y') }}}}.active)")
+
+
+@pytest.fixture(autouse=True)
+def empty_fragment_cache():
+    clear_fragment_cache()
+    yield
+    clear_fragment_cache()
+
+
+def _diff():
+    return diff_parsed(parse_sql(OLD, recover=True), parse_sql(NEW, recover=True))
+
+
+def test_diff_reports_only_the_added_predicate():
+    assert _diff()["changed"] == [
+        {"id": "cte-b", "name": "b", "predicates": {"added": ["y.active"]}}
+    ]
+
+
+def test_diff_does_not_depend_on_fragment_cache():
+    cold = _diff()
+    clear_fragment_cache()
+    # b の断片を別の位置（ref の番号が違う状態）でキャッシュに載せておく
+    parse_sql(f"with b as ({JOINED})\nselect * from b where", recover=True)
+    assert _diff() == cold
+    assert _diff() == cold
+
+
+def test_diff_keeps_columns_with_the_same_output_name():
+    old = "with j as (select a.id, b.id from a join b on a.k = b.k)\nselect * from j"
+    new = old.replace("b.id from a join b on a.k = b.k", "c.id from a join b on a.k = b.k join c on a.k = c.k")
+    changed = diff_parsed(parse_sql(old), parse_sql(new))["changed"]
+    columns = next(entry for entry in changed if entry["name"] == "j")["columns"]
+    assert columns == {"changed": [{"key": "id#2", "old": "b.id", "new": "c.id"}]}
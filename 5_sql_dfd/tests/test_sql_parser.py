@@ -0,0 +1,73 @@
+"""Tests for parse recovery and the CTE fragment cache."""
+
+import re
+
+import pytest
+
+from parser.sql_parser import clear_fragment_cache, parse_sql
+
+JOINED = (
+    "select {{ ref('y') }}.id from {{ ref('y') }} "
+    "inner join {{ ref('z') }} on {{ ref('y') }}.id = {{ ref('z') }}.id"
+)
+# b だけの壊れたモデル（b の断片をキャッシュに載せる）
+WARM_UP = f"with b as ({JOINED})\nselect * from b where"
+# b が ref('x') を使う CTE の後ろにある壊れたモデル
+MODEL = (
+    "with a as (select * from {{ ref('x') }}),\n"
+    f"b as ({JOINED}),\n"
+    "c as (select from)\n"
+    "select * from b"
+)
+
+
+@pytest.fixture(autouse=True)
+def empty_fragment_cache():
+    clear_fragment_cache()
+    yield
+    clear_fragment_cache()
+
+
+def _restore(parsed, text):
+    return re.sub(r"__REF_\d+__", lambda m: parsed.source_refs[m.group(0)], text)
+
+
+def _cte(parsed, name):
+    return next(cte for cte in parsed.ctes if cte.name == name)
+
+
+def test_cached_fragment_refs_follow_position():
+    cold = parse_sql(MODEL, recover=True)
+    clear_fragment_cache()
+    parse_sql(WARM_UP, recover=True)
+    warm = parse_sql(MODEL, recover=True)
+
+    for parsed in (cold, warm):
+        b = _cte(parsed, "b")
+        assert b.source_tables == ["y"]
+        assert _restore(parsed, b.joins[0].on_condition) == "y.id = z.id"
+        assert _restore(parsed, b.columns[0].source_table) == "y"
+    assert _cte(warm, "c").error
+
+
+def test_valid_sql_is_not_split_into_fragments():
+    sql = (
+        "with a as (select * from t where x in (with q as (select 1 as x) select x from q))\n"
+        "select * from a"
+    )
+    assert [cte.name for cte in parse_sql(sql, recover=True).ctes] == \
+        [cte.name for cte in parse_sql(sql).ctes] == ["a", "q"]
+
+
+def test_error_position_refers_to_submitted_sql():
+    sql = (
+        "with a as (select 1),\n"
+        "b as (\n"
+        "  select {{ ref('long_model_name') }}.x from {{ ref('long_model_name') }} where\n"
+        ")\n"
+        "select * from a"
+    )
+    b = _cte(parse_sql(sql, recover=True), "b")
+    line = sql.splitlines()[2]
+    assert b.error.endswith(f"Line 3, Col: {len(line)}.")
+    assert sql[b.error_span[0]:b.error_span[1]].strip().startswith("select")